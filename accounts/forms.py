@@ -5,10 +5,9 @@ from django.contrib.auth.forms import (
     AuthenticationForm,
     PasswordChangeForm,
 )
+from django.core.files.uploadedfile import UploadedFile
 from .models import Profile
-from PIL import Image
-from io import BytesIO
-from django.core.files.base import ContentFile
+from myblog.image_utils import ImageTooLarge, check_image_limits, crop_image
 
 class CustomAuthenticationForm(AuthenticationForm):
     """自定义登录表单，为字段添加样式"""
@@ -116,6 +115,15 @@ class ProfileUpdateForm(forms.ModelForm):
             },
         }
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            try:
+                check_image_limits(image)
+            except ImageTooLarge as e:
+                raise forms.ValidationError(str(e))
+        return image
+
     def save(self, commit=True):
         profile = super().save(commit=False)
         image_changed = 'image' in self.changed_data
@@ -126,14 +134,10 @@ class ProfileUpdateForm(forms.ModelForm):
 
         if image_changed and all(coord is not None for coord in [x, y, width, height]):
             image_file = self.cleaned_data.get('image')
-            image = Image.open(image_file)
-            cropped_image = image.crop((x, y, x + width, y + height))
-            resized_image = cropped_image.resize((300, 300), Image.Resampling.LANCZOS)
-            buffer = BytesIO()
-            image_format = 'PNG' if image.format == 'PNG' else 'JPEG'
-            resized_image.save(buffer, format=image_format, quality=90)
+            # 按裁剪后的输出尺寸降低分辨率解码，不解出全尺寸的原图
+            _, cropped = crop_image(image_file, (x, y, width, height), 300)
             original_file_name = image_file.name
-            profile.image.save(original_file_name, ContentFile(buffer.getvalue()), save=False)
+            profile.image.save(original_file_name, cropped, save=False)
 
         if commit:
             profile.save()
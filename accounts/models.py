@@ -1,8 +1,9 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
 from django.db.models.signals import post_save
 from django.dispatch import receiver
-from PIL import Image
+from myblog.image_utils import AVATAR_WIDTHS, delete_variants, generate_variants, variant_name
 
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -26,21 +27,56 @@ class Profile(models.Model):
     def __str__(self):
         return f'{self.user.username} 的资料'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 记下从数据库读出的头像，保存时据此判断头像是否更换过
+        if 'image' in field_names:
+            instance._loaded_image = values[field_names.index('image')]
+        return instance
+
     def save(self, *args, **kwargs):
+        previous = getattr(self, '_loaded_image', self.image.field.default)
+        image_changed = self.image.name != previous
         super().save(*args, **kwargs)
+        # 新上传的文件在保存时才写入存储、确定最终的路径
+        name = self._loaded_image = self.image.name
+        # 只在头像更换后生成各尺寸的变体；默认头像和旧头像缺少的变体在首次请求时生成
+        if image_changed:
+            transaction.on_commit(lambda: self._replace_variants(previous, name))
+
+    @staticmethod
+    def _replace_variants(previous, name):
+        default = Profile._meta.get_field('image').default
+        # 旧头像文件由 django_cleanup 删除，它的变体也不再需要（默认头像为所有人共用，保留）
+        if previous and previous != default:
+            delete_variants(previous)
+        if name and name != default:
+            # 头像文件名沿用上传时的文件名，旧文件删除后新头像可能得到同一个路径，先清掉该路径下遗留的变体
+            delete_variants(name)
+            generate_variants(name, AVATAR_WIDTHS, ['jpg'])
+
+    def avatar_url(self, width):
+        """宽度为 width（AVATAR_WIDTHS 之一）的头像变体的地址。"""
+        return default_storage.url(variant_name(self.image.name, width, 'jpg'))
+
+    @property
+    def avatar_32(self):
+        return self.avatar_url(32)
+
+    @property
+    def avatar_60(self):
+        return self.avatar_url(60)
 
-        img = Image.open(self.image.path)
-        if img.height > 300 or img.width > 300:
-            output_size = (300, 300)
-            img.thumbnail(output_size)
-            img.save(self.image.path)
+    @property
+    def avatar_300(self):
+        return self.avatar_url(300)
 
 @receiver(post_save, sender=User)
-def create_or_update_user_profile(sender, instance, created, **kwargs):
+def create_user_profile(sender, instance, created, raw=False, **kwargs):
     """
-    当 User 对象被创建时，自动创建对应的 Profile；
-    当 User 对象被保存时，确保其 Profile 也被保存。
+    当 User 对象被创建时，自动创建对应的 Profile。
+    之后保存 User（如登录时更新 last_login）不再连带保存 Profile。
     """
-    if created:
+    if created and not raw:
         Profile.objects.create(user=instance)
-    instance.profile.save()
\ No newline at end of file
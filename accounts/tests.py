@@ -1,3 +1,77 @@
+from unittest import mock
+
+from PIL import Image
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase
+from django.urls import reverse
+
+from blog.models import Category
+from blog.tests.base import QueryBudgetTestCase, make_png, make_user, seed_blog, use_temp_media
+from myblog.image_utils import AVATAR_WIDTHS, image_size, variant_name
+
+
+class AccountsQueryBudgetTests(QueryBudgetTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user()
+        cls.category = Category.objects.create(name='资料', slug='profile')
+        seed_blog([cls.user], [cls.category], 3, comments_per_post=3)
+
+    def grow(self):
+        seed_blog([self.user, make_user()], [self.category], 5, comments_per_post=5)
+
+    def test_profile(self):
+        self.assertQueryBudget(8, reverse('accounts:profile'), self.grow, user=self.user)
+
+
+class AvatarTests(TestCase):
+    """头像更换后才生成各尺寸的变体；新头像沿用旧路径时不会继续使用旧图的变体。"""
+
+    def setUp(self):
+        self.profile = make_user().profile
+        use_temp_media(self, PERFORMANCE_INSTRUMENTATION=False)
+        # 原图尺寸按文件名缓存，各测试的临时目录中可能出现同名文件
+        cache.clear()
+
+    def change_avatar(self, filename, size):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.profile.image = SimpleUploadedFile(filename, make_png(size))
+            self.profile.save()
+        return self.profile.image.name
+
+    def variant_size(self, name, width):
+        with default_storage.open(variant_name(name, width, 'jpg')) as f:
+            return Image.open(f).size
+
+    def test_avatar_properties(self):
+        name = self.profile.image.name
+        self.assertEqual(self.profile.avatar_32, default_storage.url(variant_name(name, 32, 'jpg')))
+        self.assertEqual(self.profile.avatar_60, default_storage.url(variant_name(name, 60, 'jpg')))
+        self.assertEqual(self.profile.avatar_300, default_storage.url(variant_name(name, 300, 'jpg')))
+
+    def test_variants_are_generated_only_when_the_image_changes(self):
+        with mock.patch('accounts.models.generate_variants') as generate:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.profile.bio = '简介'
+                self.profile.save()
+            generate.assert_not_called()
+            name = self.change_avatar('me.png', (400, 300))
+            generate.assert_called_once_with(name, AVATAR_WIDTHS, ['jpg'])
+
+    def test_reused_filename_gets_fresh_variants(self):
+        first = self.change_avatar('me.png', (400, 300))
+        self.assertEqual(self.variant_size(first, 300), (300, 225))
+        # 换成另一张头像后，旧文件和它的变体都被删除
+        other = self.change_avatar('other.png', (100, 100))
+        self.assertFalse(default_storage.exists(first))
+        self.assertFalse(default_storage.exists(variant_name(first, 300, 'jpg')))
 
-# Create your tests here.
+        # 再上传同名文件会得到与第一张相同的路径
+        again = self.change_avatar('me.png', (200, 500))
+        self.assertEqual(again, first)
+        self.assertEqual(image_size(again), (200, 500))
+        self.assertEqual(self.variant_size(again, 300), (200, 500))
+        self.assertFalse(default_storage.exists(variant_name(other, 60, 'jpg')))
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Post, Category, Comment
+from .models import Post, Category, Comment, ImageJob, MediaBlob
 
 @admin.register(Post)
 class PostAdmin(admin.ModelAdmin):
@@ -19,4 +19,16 @@ class CategoryAdmin(admin.ModelAdmin):
 class CommentAdmin(admin.ModelAdmin):
     list_display = ('user', 'post', 'created_on', 'active')
     list_filter = ('active', 'created_on')
-    search_fields = ('user__username', 'post__title', 'content')
\ No newline at end of file
+    search_fields = ('user__username', 'post__title', 'content')
+@admin.register(ImageJob)
+class ImageJobAdmin(admin.ModelAdmin):
+    list_display = ('source', 'kind', 'status', 'attempts', 'created', 'updated')
+    list_filter = ('status', 'kind')
+    search_fields = ('source', 'result')
+    readonly_fields = ('created', 'updated')
+
+@admin.register(MediaBlob)
+class MediaBlobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'refcount', 'created', 'last_used')
+    search_fields = ('name', 'digest', 'source_digest')
+    readonly_fields = ('digest', 'source_digest', 'name', 'refcount', 'created', 'last_used')
@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class BlogConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "blog"
+
+    def ready(self):
+        import blog.signals
+        from .search import create_index
+        # 全文索引是 FTS5 虚拟表，无法由模型迁移创建，在 migrate 之后补建
+        post_migrate.connect(create_index, sender=self)
@@ -0,0 +1,184 @@
+"""
+RSS / Atom 订阅源（全站、按分类、按作者）。
+
+订阅器会频繁轮询，因此：
+- 响应带有基于最新 `Post.updated` 的 ETag 与 Last-Modified，内容未变化时只需一次
+  `MAX(updated)` 查询即可返回 304；
+- 生成好的订阅源正文按“最后修改时间 + 代数”缓存。文章发布或修改会改变最后修改时间，
+  自然换用新的缓存键；文章被删除、撤回发布或移出分类时不一定改变最后修改时间，
+  由 `blog.signals` 递增代数使旧缓存失效。
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.syndication.views import Feed
+from django.core.cache import cache
+from django.db.models import Max
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed
+from django.views.decorators.http import condition
+
+from .models import Post, Category
+
+GENERATION_KEY = 'blog:feed:generation'
+FEED_ITEMS = 20
+
+
+def _timeout():
+    return getattr(settings, 'FEED_CACHE_TIMEOUT', 3600)
+
+
+def get_generation():
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, int(time.time() * 1000), timeout=None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def bump_generation():
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, int(time.time() * 1000), timeout=None)
+
+
+class LatestPostsFeed(Feed):
+    title = "Jiewen's Blog"
+    description = '最新发布的文章'
+
+    def link(self, obj=None):
+        return reverse('blog:post_list')
+
+    def scope(self, **kwargs):
+        """订阅源包含的文章范围（不含排序与数量限制）。"""
+        return Post.objects.filter(status='published')
+
+    def get_object(self, request, **kwargs):
+        return None
+
+    def items(self, obj=None):
+        return self.latest(self.scope())
+
+    def latest(self, posts):
+        posts = posts.select_related('author__profile').order_by('-publish')
+        if not getattr(settings, 'FEED_FULL_CONTENT', False):
+            posts = posts.defer('content')
+        return posts[:FEED_ITEMS]
+
+    def item_title(self, item):
+        return item.title
+
+    def item_description(self, item):
+        if getattr(settings, 'FEED_FULL_CONTENT', False):
+            return item.content
+        return item.excerpt
+
+    def item_author_name(self, item):
+        return item.author.profile.nickname or item.author.username
+
+    def item_pubdate(self, item):
+        return item.publish
+
+    def item_updateddate(self, item):
+        return item.updated
+
+
+class CategoryPostsFeed(LatestPostsFeed):
+    def scope(self, slug):
+        return Post.objects.filter(status='published', category__slug=slug)
+
+    def get_object(self, request, slug):
+        return get_object_or_404(Category, slug=slug)
+
+    def items(self, obj):
+        return self.latest(self.scope(slug=obj.slug))
+
+    def title(self, obj):
+        return f"{obj.name} - Jiewen's Blog"
+
+    def description(self, obj):
+        return f'分类“{obj.name}”下最新发布的文章'
+
+    def link(self, obj):
+        return obj.get_absolute_url()
+
+
+class AuthorPostsFeed(LatestPostsFeed):
+    def scope(self, username):
+        return Post.objects.filter(status='published', author__username=username)
+
+    def get_object(self, request, username):
+        return get_object_or_404(User.objects.select_related('profile'), username=username)
+
+    def items(self, obj):
+        return self.latest(self.scope(username=obj.username))
+
+    def title(self, obj):
+        return f"{obj.profile.nickname or obj.username} - Jiewen's Blog"
+
+    def description(self, obj):
+        return f'{obj.profile.nickname or obj.username} 最新发布的文章'
+
+    def link(self, obj):
+        return reverse('blog:author_posts', args=[obj.username])
+
+
+class LatestPostsAtomFeed(LatestPostsFeed):
+    feed_type = Atom1Feed
+    subtitle = LatestPostsFeed.description
+
+
+class CategoryPostsAtomFeed(CategoryPostsFeed):
+    feed_type = Atom1Feed
+
+    def subtitle(self, obj):
+        return self.description(obj)
+
+
+class AuthorPostsAtomFeed(AuthorPostsFeed):
+    feed_type = Atom1Feed
+
+    def subtitle(self, obj):
+        return self.description(obj)
+
+
+def cached_feed(feed_class):
+    """把订阅源包装成支持条件请求、并缓存正文的视图。"""
+    feed = feed_class()
+
+    def last_modified(request, **kwargs):
+        # condition 装饰器和视图本身都会用到，在请求上记住结果，只查询一次
+        if not hasattr(request, '_feed_last_modified'):
+            request._feed_last_modified = feed.scope(**kwargs).aggregate(latest=Max('updated'))['latest']
+        return request._feed_last_modified
+
+    def etag(request, **kwargs):
+        latest = last_modified(request, **kwargs)
+        if latest is None:
+            return None
+        return f'{get_generation()}-{latest.timestamp():.6f}'
+
+    @condition(etag_func=etag, last_modified_func=last_modified)
+    def view(request, **kwargs):
+        latest = last_modified(request, **kwargs)
+        digest = hashlib.md5(request.path.encode()).hexdigest()
+        stamp = f'{latest.timestamp():.6f}' if latest else 'empty'
+        key = f'blog:feed:{digest}:{get_generation()}:{stamp}'
+
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type = cached
+            return HttpResponse(content, content_type=content_type)
+
+        response = feed(request, **kwargs)
+        # Feed 按条目时间设置的 Last-Modified 以整个范围的最后修改时间为准
+        del response['Last-Modified']
+        cache.set(key, (response.content, response['Content-Type']), _timeout())
+        return response
+
+    return view
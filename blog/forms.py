@@ -1,6 +1,8 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 from .models import Comment, Post, Category
 from django_ckeditor_5.widgets import CKEditor5Widget
+from myblog.image_utils import ImageTooLarge, check_image_limits
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -44,4 +46,13 @@ class PostForm(forms.ModelForm):
             ),
             'category': forms.Select(attrs={'class': 'form-select'}),
             'image': forms.ClearableFileInput(attrs={'class': 'form-control'}),
-        }
\ No newline at end of file
+        }
+
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            try:
+                check_image_limits(image)
+            except ImageTooLarge as e:
+                raise forms.ValidationError(str(e))
+        return image
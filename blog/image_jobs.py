@@ -0,0 +1,313 @@
+"""
+上传图片的后台处理流水线。
+
+上传时只保存原图并登记一个 `ImageJob`，请求立即返回；压缩和重新编码在后台完成，
+完成后正文中引用原图的地址会被换成处理后的地址，特色图片字段也会随之更新。
+处理方式由 IMAGE_PIPELINE_MODE 决定：
+- thread：在本进程的有界线程池中处理（默认）；
+- queue：只登记任务，由 `process_image_jobs` 管理命令处理（可以运行多个进程）；
+- sync：在请求中就地处理，与原先的行为相同。
+
+未完成的任务超过 IMAGE_PIPELINE_MAX_PENDING 时拒绝新的上传（背压）；
+失败的任务按指数退避重试，超过 IMAGE_PIPELINE_MAX_ATTEMPTS 次后标记为失败，正文继续使用原图。
+
+thread 模式下等待重试的定时器和排队中的任务只存在于进程内，进程重启后会丢失，但任务状态都在数据库中：
+每次登记任务或查询处理状态时（每个进程至多每 IMAGE_PIPELINE_RECOVER_INTERVAL 秒一次），
+都会把已到重试时间的任务和处理者已失联的任务重新交给本进程的线程池。
+重启后一直没有新的上传时，这些任务要等到下一次上传，或由 `process_image_jobs --once` 补处理。
+"""
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from myblog.image_utils import ImageTooLarge, compress_image, generate_variants
+from . import media_store
+
+logger = logging.getLogger(__name__)
+
+# 原图保存在各上传目录下的这个子目录中，处理结果放在上一级目录
+ORIGINALS_DIR = 'originals'
+
+_executor = None
+_executor_lock = threading.Lock()
+_last_recovery = None
+
+
+def _mode():
+    return getattr(settings, 'IMAGE_PIPELINE_MODE', 'thread')
+
+
+def _workers():
+    return getattr(settings, 'IMAGE_PIPELINE_WORKERS', 2)
+
+
+def _max_pending():
+    return getattr(settings, 'IMAGE_PIPELINE_MAX_PENDING', 50)
+
+
+def _max_attempts():
+    return getattr(settings, 'IMAGE_PIPELINE_MAX_ATTEMPTS', 3)
+
+
+def _retry_delay(attempts):
+    return getattr(settings, 'IMAGE_PIPELINE_RETRY_DELAY', 5) * 2 ** (attempts - 1)
+
+
+def _stale_after():
+    return timedelta(seconds=getattr(settings, 'IMAGE_PIPELINE_STALE_SECONDS', 300))
+
+
+def _recover_interval():
+    return getattr(settings, 'IMAGE_PIPELINE_RECOVER_INTERVAL', 60)
+
+
+def is_async():
+    return _mode() != 'sync'
+
+
+def is_saturated():
+    """未完成的任务是否已达上限。"""
+    from .models import ImageJob
+    return ImageJob.objects.filter(status__in=('pending', 'processing')).count() >= _max_pending()
+
+
+def should_defer():
+    """新上传的图片是否交给后台处理（同步模式或积压过多时就地处理）。"""
+    return is_async() and not is_saturated()
+
+
+def original_path(directory, filename):
+    ext = os.path.splitext(filename)[1].lower()
+    return os.path.join(directory, ORIGINALS_DIR, f'{uuid.uuid4().hex}{ext}')
+
+
+def result_path(source):
+    """posts/originals/abc.png -> posts/abc.jpg；不在 originals 目录中的原图直接换扩展名。"""
+    directory, filename = os.path.split(source)
+    if os.path.basename(directory) == ORIGINALS_DIR:
+        directory = os.path.dirname(directory)
+    return os.path.join(directory, f'{os.path.splitext(filename)[0]}.jpg')
+
+
+def source_from_url(url):
+    """把媒体文件的 URL（可带域名）还原为存储中的路径，不是媒体文件时返回 None。"""
+    path = re.sub(r'^[a-z]+://[^/]+', '', url or '')
+    if not path.startswith(settings.MEDIA_URL):
+        return None
+    return path[len(settings.MEDIA_URL):]
+
+
+# --- 登记任务 ---
+
+def submit_inline(uploaded_file):
+    """
+    保存 CKEditor 上传的原图并登记任务，返回任务。启用去重且同样的图片已经处理过时，
+    不保存原图，直接返回一个指向已有文件的已完成任务（不写入数据库）。
+    """
+    from .models import ImageJob
+    if media_store.enabled():
+        blob = media_store.find_processed(uploaded_file)[0]
+        if blob is not None:
+            return ImageJob(kind='inline', source=blob.name, result=blob.name, status='done')
+    source = default_storage.save(original_path('posts', uploaded_file.name), uploaded_file)
+    job = ImageJob.objects.create(kind='inline', source=source)
+    enqueue(job)
+    return job
+
+
+def _register_post_image(post):
+    from .models import ImageJob
+    job, _ = ImageJob.objects.update_or_create(
+        source=post.image.name,
+        defaults={'kind': 'post_image', 'post': post, 'status': 'pending', 'attempts': 0, 'error': ''},
+    )
+    return job
+
+
+def submit_post_image(post):
+    """特色图片的原图已随文章保存，登记压缩任务。"""
+    job = _register_post_image(post)
+    enqueue(job)
+    return job
+
+
+def process_post_image(post):
+    """登记特色图片的任务并在当前进程中立即执行（供批量导入等离线场景使用），返回执行后的状态。"""
+    return run_job(_register_post_image(post).pk)
+
+
+def enqueue(job):
+    mode = _mode()
+    if mode == 'sync':
+        run_job(job.pk)
+    elif mode == 'thread':
+        # 提交后再交给线程池，保证工作线程能读到任务
+        transaction.on_commit(lambda: _submit(job.pk))
+        recover_due_jobs(exclude=job.pk)
+
+
+def recover_due_jobs(exclude=None):
+    """
+    thread 模式下把数据库中已到期（重试时间已到、或处理者已失联）的任务交给本进程的线程池，
+    接管重启前丢失的定时器和排队任务。每个进程至多每 IMAGE_PIPELINE_RECOVER_INTERVAL 秒执行一次。
+    """
+    global _last_recovery
+    if _mode() != 'thread':
+        return
+    now = time.monotonic()
+    with _executor_lock:
+        if _last_recovery is not None and now - _last_recovery < _recover_interval():
+            return
+        _last_recovery = now
+    job_ids = [job_id for job_id in claim_pending(_max_pending()) if job_id != exclude]
+    if job_ids:
+        # 重复提交无妨：run_job 用条件更新领取任务，已被领取的任务直接跳过
+        transaction.on_commit(lambda: [_submit(job_id) for job_id in job_ids])
+
+
+# --- 执行任务 ---
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=_workers(), thread_name_prefix='image-jobs')
+        return _executor
+
+
+def _submit(job_id):
+    _get_executor().submit(_run_in_thread, job_id)
+
+
+def _run_in_thread(job_id):
+    close_old_connections()
+    try:
+        status = run_job(job_id)
+    finally:
+        close_old_connections()
+    if status == 'pending':
+        # 等到退避时间后再次提交，等待期间不占用工作线程
+        from .models import ImageJob
+        attempts = ImageJob.objects.filter(pk=job_id).values_list('attempts', flat=True).first() or 1
+        close_old_connections()
+        timer = threading.Timer(_retry_delay(attempts), _submit, [job_id])
+        timer.daemon = True
+        timer.start()
+
+
+def claim_pending(limit):
+    """取出可执行的任务 ID；顺带把处理者已失联（长时间停在处理中）的任务放回队列。"""
+    from .models import ImageJob
+    now = timezone.now()
+    ImageJob.objects.filter(status='processing', updated__lt=now - _stale_after()).update(status='pending', updated=now)
+    return list(
+        ImageJob.objects.filter(status='pending', run_after__lte=now)
+        .order_by('run_after', 'pk')
+        .values_list('pk', flat=True)[:limit]
+    )
+
+
+def run_job(job_id):
+    """
+    执行一次任务，返回执行后的状态；任务已被其他工作者领取或已完成时返回 None。
+    """
+    from .models import ImageJob
+    now = timezone.now()
+    # 用条件更新领取任务，多个线程/进程同时处理队列时不会重复执行
+    claimed = ImageJob.objects.filter(pk=job_id, status='pending').update(
+        status='processing', attempts=F('attempts') + 1, updated=now
+    )
+    if not claimed:
+        return None
+    job = ImageJob.objects.get(pk=job_id)
+    try:
+        _process(job)
+    except Exception as e:
+        logger.exception('图片处理失败：%s', job.source)
+        # 超出大小上限的图片重试也不会成功
+        if job.attempts < _max_attempts() and not isinstance(e, ImageTooLarge):
+            status, run_after = 'pending', timezone.now() + timedelta(seconds=_retry_delay(job.attempts))
+        else:
+            status, run_after = 'failed', job.run_after
+        ImageJob.objects.filter(pk=job.pk).update(
+            status=status, error=str(e)[:1000], run_after=run_after, updated=timezone.now()
+        )
+        return status
+    return 'done'
+
+
+def _process(job):
+    from .models import ImageJob
+    with default_storage.open(job.source) as f:
+        if media_store.enabled():
+            result = media_store.store_processed(f)
+        else:
+            _, compressed = compress_image(f)
+            result = default_storage.save(result_path(job.source), compressed)
+    # 顺带生成各档宽度的 JPEG/WebP 变体，页面首次引用时不必再现场生成
+    generate_variants(result)
+    try:
+        with transaction.atomic():
+            ImageJob.objects.filter(pk=job.pk).update(status='done', result=result, error='', updated=timezone.now())
+            job.result = result
+            swap_into_posts(job)
+    except Exception:
+        # 按内容保存的文件可能已被其他文章引用，留给 cleanup_files 按引用数清理
+        if not media_store.is_managed(result):
+            default_storage.delete(result)
+        raise
+    # 所有引用都已换成处理结果，原图不再需要
+    transaction.on_commit(lambda: default_storage.delete(job.source))
+
+
+# --- 把原图地址换成处理结果 ---
+
+def swap_into_posts(job):
+    from .models import Post
+    if job.kind == 'post_image':
+        if job.post_id is None:
+            return
+        post = Post.objects.filter(pk=job.post_id, image=job.source).first()
+        if post is not None:
+            post.image.name = job.result
+            post.save(update_fields=['image'])
+        return
+
+    source_url = default_storage.url(job.source)
+    for post in Post.objects.filter(content__contains=source_url):
+        post.content = post.content.replace(source_url, default_storage.url(job.result))
+        post.save(update_fields=['content'])
+
+
+_ORIGINAL_URL = re.compile(r'src="([^"]*/' + ORIGINALS_DIR + r'/[^"]+)"')
+
+
+def swap_finished_urls(html):
+    """
+    正文中仍引用原图、但任务已经完成的图片（编辑器未等到处理完成就保存了文章），
+    换成处理后的地址。
+    """
+    from .models import ImageJob
+    urls = {url: source_from_url(url) for url in _ORIGINAL_URL.findall(html or '')}
+    sources = {source: url for url, source in urls.items() if source}
+    if not sources:
+        return html
+    for source, result in ImageJob.objects.filter(source__in=sources, status='done').values_list('source', 'result'):
+        html = html.replace(sources[source], default_storage.url(result))
+    return html
+
+
+def job_status(job):
+    url = default_storage.url(job.result if job.status == 'done' else job.source)
+    return {'status': job.status, 'url': url, 'attempts': job.attempts}
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from blog.models import Post
+from blog import slugs
+
+
+class Command(BaseCommand):
+    help = '为已有文章回填派生字段（摘要、字数、阅读时长、本地发布日期）。'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='每批读取并更新的文章数量。'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        fields = ['excerpt', 'word_count', 'reading_time', 'publish_date']
+
+        queryset = Post.objects.order_by().only('pk', 'content', 'publish')
+        total = 0
+        batch = []
+        for post in queryset.iterator(chunk_size=batch_size):
+            post.update_derived_fields()
+            post.publish_date = slugs.publish_date(post)
+            batch.append(post)
+            if len(batch) >= batch_size:
+                total += self._write(batch, fields)
+                batch = []
+        if batch:
+            total += self._write(batch, fields)
+
+        self.stdout.write(self.style.SUCCESS(f'回填完成，共更新了 {total} 篇文章。'))
+
+    def _write(self, batch, fields):
+        with transaction.atomic():
+            Post.objects.bulk_update(batch, fields)
+        self.stdout.write(f'已处理 {len(batch)} 篇...')
+        return len(batch)
@@ -0,0 +1,296 @@
+import json
+import logging
+import statistics
+import subprocess
+import time
+
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.auth.tokens import default_token_generator
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from blog import search, view_counter
+from blog.models import Post, Comment
+
+# 参与基准测试的 URL 命名空间
+NAMESPACES = ('blog', 'accounts', 'notifications')
+
+# 浏览量只记在本进程内（不启动后台写回线程、不写共享缓存），最后随事务回滚
+BENCHMARK_SETTINGS = {
+    'VIEW_COUNTER_USE_CACHE': False,
+    'VIEW_COUNTER_FLUSH_INTERVAL': 0,
+}
+
+# 冷缓存模式换用独立的本地内存缓存，每次请求前清空，不会清掉站点实际使用的缓存
+COLD_CACHE_SETTINGS = {
+    'CACHES': {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'benchmark-cold'}},
+}
+
+
+class Rollback(Exception):
+    pass
+
+
+def percentile(sorted_values, pct):
+    """最近秩法求百分位数（输入须已排序）。"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def iter_patterns(resolver, namespace=None):
+    for entry in resolver.url_patterns:
+        if isinstance(entry, URLResolver):
+            yield from iter_patterns(entry, entry.namespace or namespace)
+        elif isinstance(entry, URLPattern) and entry.name and namespace in NAMESPACES:
+            yield f'{namespace}:{entry.name}', list(entry.pattern.converters) or _route_params(entry)
+
+
+def _route_params(entry):
+    # 正则形式的路由没有 converters，从分组名取参数
+    return list(entry.pattern.regex.groupindex)
+
+
+class Command(BaseCommand):
+    help = (
+        '通过测试客户端依次请求 blog、accounts、notifications 中的全部 URL，'
+        '统计每个端点的 p50/p95/p99 延迟和查询次数，并保存为 JSON 以便在不同提交之间对比。'
+        '请在已填充数据（如 seed_data）的数据库上运行。'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=30, help='每个端点的计时请求次数。')
+        parser.add_argument('--warmup', type=int, default=3, help='每个端点计时前的预热请求次数。')
+        parser.add_argument('--output', default='benchmark-results.json', help='结果 JSON 文件的路径。')
+        parser.add_argument('--compare', help='与之前保存的结果 JSON 对比 p50/p95。')
+        parser.add_argument('--filter', help='只测试名称包含该字符串的端点。')
+        parser.add_argument(
+            '--cache',
+            choices=['warm', 'cold'],
+            default='warm',
+            help='warm：沿用预热后的缓存（侧边栏、分页计数、页面缓存等），测量常态延迟；'
+                 'cold：每次请求前清空缓存，测量缓存未命中时的延迟和查询数。'
+        )
+
+    def handle(self, *args, **options):
+        self.context = self.sample_objects()
+        endpoints = []
+        for name, params in iter_patterns(get_resolver()):
+            if options['filter'] and options['filter'] not in name:
+                continue
+            path = self.build_path(name, params)
+            if path is None:
+                self.stdout.write(self.style.WARNING(f'跳过 {name}：缺少可用的示例数据。'))
+                continue
+            endpoints.extend(self.variants(name, path))
+        if not endpoints:
+            raise CommandError('没有可测试的端点。')
+
+        # 基准测试期间不输出每个请求的性能日志和探测请求的错误日志（出错的端点会在结果中标出）
+        loggers = [logging.getLogger(name) for name in ('myblog.performance', 'django.request')]
+        was_disabled = [logger.disabled for logger in loggers]
+        for logger in loggers:
+            logger.disabled = True
+        # 所有请求都在一个最终回滚的事务里进行，浏览量、热门分桶、通知已读等写操作不会保留，
+        # 多次运行测量的是同一份数据
+        self.cold_cache = options['cache'] == 'cold'
+        overrides = {**BENCHMARK_SETTINGS, **(COLD_CACHE_SETTINGS if self.cold_cache else {})}
+        try:
+            with override_settings(
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'], **overrides
+            ), transaction.atomic():
+                results = [self.run_endpoint(name, path, options) for name, path in endpoints]
+                view_counter.flush()
+                raise Rollback
+        except Rollback:
+            pass
+        finally:
+            for logger, disabled in zip(loggers, was_disabled):
+                logger.disabled = disabled
+
+        report = {
+            'created': timezone.now().isoformat(),
+            'commit': self.git_commit(),
+            'iterations': options['iterations'],
+            'cache': options['cache'],
+            'settings': {
+                'PAGE_CACHE_ENABLED': getattr(settings, 'PAGE_CACHE_ENABLED', False),
+                'DATABASE': connection.vendor,
+            },
+            'data': {
+                'posts': Post.objects.count(),
+                'comments': Comment.objects.count(),
+                'users': User.objects.count(),
+            },
+            'results': results,
+        }
+        with open(options['output'], 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+        previous = self.load_previous(options['compare'], options['cache'])
+        self.print_table(results, previous)
+        self.stdout.write(self.style.SUCCESS(f'结果已保存到 {options["output"]}。'))
+
+    # --- 示例数据与 URL 参数 ---
+
+    def sample_objects(self):
+        post = Post.objects.filter(status='published').select_related('author', 'category').order_by('-publish').first()
+        if post is None:
+            raise CommandError('数据库中没有已发布的文章，请先运行 seed_data 填充数据。')
+        user = post.author
+        comment = Comment.objects.filter(user=user).first() or Comment.objects.filter(post=post).first()
+        return {'post': post, 'user': user, 'comment': comment}
+
+    def build_path(self, name, params):
+        post, user, comment = self.context['post'], self.context['user'], self.context['comment']
+        local = timezone.localtime(post.publish)
+        values = {
+            'year': local.year,
+            'month': local.month,
+            'day': local.day,
+            'post': post.slug,
+            'username': user.username,
+            'uidb64': urlsafe_base64_encode(force_bytes(user.pk)),
+            'token': default_token_generator.make_token(user),
+        }
+        if 'slug' in params:
+            if post.category is None:
+                return None
+            values['slug'] = post.category.slug
+        if 'pk' in params:
+            if name == 'blog:delete_comment':
+                if comment is None:
+                    return None
+                values['pk'] = comment.pk
+            else:
+                values['pk'] = post.pk
+        try:
+            return reverse(name, kwargs={param: values[param] for param in params})
+        except KeyError:
+            return None
+
+    def variants(self, name, path):
+        """需要查询参数才有意义的端点：搜索页分别测试走 trigram 索引的长词和走两字词索引的中文短词。"""
+        if name != 'blog:search':
+            return [(name, path)]
+        long_term, short_term = search.sample_terms(self.context['post'])
+        endpoints = []
+        if long_term:
+            endpoints.append((name, f"{path}?{urlencode({'query': long_term})}"))
+        if short_term:
+            endpoints.append((f'{name}[short]', f"{path}?{urlencode({'query': short_term})}"))
+        return endpoints or [(name, path)]
+
+    # --- 计时 ---
+
+    def request(self, client, path):
+        if self.cold_cache:
+            cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = client.get(path)
+            elapsed = (time.perf_counter() - start) * 1000
+        return response, elapsed, len(queries)
+
+    def client_for(self, path):
+        """先以匿名身份请求；需要登录的页面改用已登录的客户端。"""
+        anonymous = Client()
+        try:
+            response = anonymous.get(path)
+            login_url = str(getattr(settings, 'LOGIN_URL', ''))
+            if not (response.status_code in (301, 302) and login_url and login_url in response.get('Location', '')):
+                return anonymous, False
+        except Exception:
+            pass
+        client = Client()
+        client.force_login(self.context['user'])
+        return client, True
+
+    def run_endpoint(self, name, path, options):
+        client, authenticated = self.client_for(path)
+        result = {'name': name, 'path': path, 'authenticated': authenticated}
+        latencies, query_counts, statuses = [], [], set()
+        try:
+            for _ in range(options['warmup']):
+                self.request(client, path)
+            for _ in range(options['iterations']):
+                response, elapsed, queries = self.request(client, path)
+                latencies.append(elapsed)
+                query_counts.append(queries)
+                statuses.add(response.status_code)
+        except Exception as e:
+            # 视图抛出异常时记录下来，继续测试其余端点
+            result['error'] = f'{type(e).__name__}: {e}'
+            return result
+        latencies.sort()
+        return {
+            **result,
+            'status': sorted(statuses),
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p95_ms': round(percentile(latencies, 95), 3),
+            'p99_ms': round(percentile(latencies, 99), 3),
+            'mean_ms': round(statistics.fmean(latencies), 3),
+            'queries_median': statistics.median(query_counts),
+            'queries_max': max(query_counts),
+        }
+
+    # --- 输出 ---
+
+    def print_table(self, results, previous):
+        header = f'{"端点":<36} {"状态":<8} {"p50":>9} {"p95":>9} {"p99":>9} {"查询":>6}'
+        if previous:
+            header += f' {"Δp50":>9} {"Δp95":>9}'
+        self.stdout.write(header)
+        for result in results:
+            if 'error' in result:
+                self.stdout.write(self.style.ERROR(f'{result["name"]:<36} 出错：{result["error"]}'))
+                continue
+            line = (
+                f'{result["name"]:<36} {",".join(map(str, result["status"])):<8} '
+                f'{result["p50_ms"]:>9.2f} {result["p95_ms"]:>9.2f} {result["p99_ms"]:>9.2f} '
+                f'{result["queries_median"]:>6g}'
+            )
+            before = previous.get(result['name']) if previous else None
+            if before and 'error' not in before:
+                line += f' {self.delta(before["p50_ms"], result["p50_ms"]):>9} {self.delta(before["p95_ms"], result["p95_ms"]):>9}'
+            self.stdout.write(line)
+
+    def delta(self, before, after):
+        if not before:
+            return '-'
+        return f'{(after - before) / before * 100:+.1f}%'
+
+    def load_previous(self, path, cache_mode):
+        if not path:
+            return None
+        try:
+            with open(path, encoding='utf-8') as f:
+                report = json.load(f)
+            previous = {result['name']: result for result in report['results']}
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f'无法读取对比文件 {path}: {e}')
+        if report.get('cache', 'warm') != cache_mode:
+            self.stdout.write(self.style.WARNING(
+                f"对比文件使用的是 {report.get('cache', 'warm')} 缓存模式，与本次（{cache_mode}）不同，差异不可直接比较。"
+            ))
+        return previous
+
+    def git_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'],
+                cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=5,
+            ).stdout.strip() or None
+        except (OSError, subprocess.SubprocessError):
+            return None
@@ -1,9 +1,13 @@
 import os
 import re
+from datetime import timedelta
 from django.core.management.base import BaseCommand
 from django.conf import settings
-from blog.models import Post
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from blog.models import Post, ImageJob, MediaBlob, PostMedia
 from accounts.models import Profile
+from myblog.image_utils import VARIANT_DIR, parse_variant
 
 class Command(BaseCommand):
     help = '扫描并清理 media 文件夹中未被引用的文件。'
@@ -14,6 +18,12 @@ class Command(BaseCommand):
             action='store_true',
             help='列出将要被删除的文件，但实际上不执行删除操作。'
         )
+        parser.add_argument(
+            '--grace-hours',
+            type=float,
+            default=24,
+            help='按内容保存的图片在无人引用后至少保留的小时数（刚上传、文章尚未保存的图片引用数也为 0）。'
+        )
 
     def handle(self, *args, **options):
         dry_run = options['dry_run']
@@ -47,6 +57,28 @@ class Command(BaseCommand):
                 file_path = os.path.join(settings.MEDIA_ROOT, relative_path)
                 referenced_files.add(os.path.normpath(file_path))
 
+        # 尚未处理完的上传图片：原图还要交给后台处理，暂时不能删除
+        for source in ImageJob.objects.filter(status__in=('pending', 'processing')).values_list('source', flat=True):
+            referenced_files.add(os.path.normpath(os.path.join(settings.MEDIA_ROOT, source)))
+
+        # 按内容保存的图片（blog.media_store）：引用数为 0 且超过保留期的才删除，其余全部保留
+        orphans = MediaBlob.objects.filter(
+            refcount=0,
+            last_used__lt=timezone.now() - timedelta(hours=options['grace_hours']),
+        ).exclude(Exists(PostMedia.objects.filter(blob=OuterRef('pk'))))
+        # 引用数与正文不一致时（如直接改过数据库），以正文中实际的引用为准
+        orphan_ids = {
+            pk for pk, name in orphans.values_list('pk', 'name')
+            if os.path.normpath(os.path.join(settings.MEDIA_ROOT, name)) not in referenced_files
+        }
+        for pk, name in MediaBlob.objects.values_list('pk', 'name').iterator():
+            if pk not in orphan_ids:
+                referenced_files.add(os.path.normpath(os.path.join(settings.MEDIA_ROOT, name)))
+        if orphan_ids:
+            self.stdout.write(f'有 {len(orphan_ids)} 个按内容保存的图片已无人引用。')
+            if not dry_run:
+                MediaBlob.objects.filter(pk__in=orphan_ids).delete()
+
         self.stdout.write(f'在数据库中找到了 {len(referenced_files)} 个被引用的文件。')
 
         # 2. 遍历 media 文件夹，获取磁盘上所有的文件路径
@@ -60,7 +92,16 @@ class Command(BaseCommand):
 
         self.stdout.write(f'在 media 文件夹中找到了 {len(files_on_disk)} 个文件。')
 
-        # 3. 计算出未被引用的文件
+        # 3. 计算出未被引用的文件（响应式图片变体随原图一起保留）
+        variants_root = os.path.join(settings.MEDIA_ROOT, VARIANT_DIR)
+        for file_path in list(files_on_disk):
+            if os.path.commonpath([file_path, variants_root]) != os.path.normpath(variants_root):
+                continue
+            # variants/<宽度>/<原图路径>.<格式>
+            parts = os.path.relpath(file_path, variants_root).split(os.sep, 1)
+            parsed = parse_variant(parts[1].replace(os.sep, '/')) if len(parts) == 2 else None
+            if parsed and os.path.normpath(os.path.join(settings.MEDIA_ROOT, parsed[0])) in referenced_files:
+                referenced_files.add(file_path)
         unreferenced_files = files_on_disk - referenced_files
 
         if not unreferenced_files:
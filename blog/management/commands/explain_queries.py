@@ -0,0 +1,178 @@
+import re
+from urllib.parse import urlencode
+
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import resolve, reverse
+
+from blog import search, view_counter
+from blog.models import Post
+
+# 查询计划中出现这些内容即视为未命中索引
+PROBLEM_PATTERNS = [
+    (re.compile(r'\bSCAN (?!CONSTANT ROW)'), '全表扫描'),
+    (re.compile(r'USE TEMP B-TREE'), '临时 B 树排序'),
+]
+
+# 逐条确认过可以接受的查询计划：(查询计划中的一行, 该查询的 SQL 特征)。
+# 只豁免同时符合二者的那一行，查询换了形状或计划退化（例如改用临时排序）时仍会报告
+ACCEPTED_PLANS = [
+    # 侧边栏的分类列表本来就要展示全部分类，沿 blog_category_post_count 索引按展示顺序读取，不需要排序；
+    # 分类由管理员维护，行数很少
+    (
+        re.compile(r'^SCAN blog_category USING (COVERING )?INDEX blog_category_post_count$'),
+        re.compile(r'FROM "blog_category" ORDER BY "blog_category"\."published_post_count" DESC'),
+    ),
+    # 热门文章读取排行表：该表由 update_trending 重建，最多 TRENDING_SIZE 行，沿 rank 的唯一索引按名次读取
+    (
+        re.compile(r'^SCAN blog_trendingpost USING (COVERING )?INDEX \w+$'),
+        re.compile(r'FROM "blog_trendingpost" .*ORDER BY "blog_trendingpost"\."rank" ASC'),
+    ),
+    # FTS5 虚拟表的计划总是写作 SCAN：索引串以 M 开头表示用倒排索引执行 MATCH，= 表示按 rowid 取行，
+    # 都不会读取整张表（真正的全表扫描索引串为空，不在此列）
+    (
+        re.compile(r'^SCAN blog_post_fts(_short)? VIRTUAL TABLE INDEX \d+:[M=]'),
+        re.compile(r'\bMATCH\b'),
+    ),
+    # 搜索结果按 BM25 得分排序：得分只能对命中的文章逐一计算，需要排序的只是命中的行
+    (
+        re.compile(r'^USE TEMP B-TREE FOR ORDER BY$'),
+        re.compile(r'\bMATCH\b.* ORDER BY bm25\('),
+    ),
+]
+
+# 运行期间关闭所有缓存，保证每个页面的查询都真正执行；浏览量只记在本进程内，最后随事务回滚
+EXPLAIN_SETTINGS = {
+    'CACHES': {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+    'PAGE_CACHE_ENABLED': False,
+    'VIEW_COUNTER_USE_CACHE': False,
+    'VIEW_COUNTER_FLUSH_INTERVAL': 0,
+    # RequestFactory 构造的请求主机名为 testserver，订阅源等需要读取主机名的页面要求它在白名单中
+    'ALLOWED_HOSTS': ['testserver'],
+}
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        '依次请求主要页面，对每个页面执行的查询运行 EXPLAIN QUERY PLAN（仅支持 SQLite），'
+        '若有查询退化为全表扫描或临时 B 树排序则以失败退出。请在已填充数据的数据库上运行。'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verbose-plans',
+            action='store_true',
+            help='打印每条查询的完整查询计划。'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('该命令依赖 SQLite 的 EXPLAIN QUERY PLAN，当前数据库不受支持。')
+
+        self.verbose_plans = options['verbose_plans']
+        self.factory = RequestFactory()
+        self.problems = []
+        self.checked = 0
+
+        # 所有请求都在一个最终回滚的事务里进行，页面中的写操作（如标记通知已读）不会保留
+        try:
+            with override_settings(**EXPLAIN_SETTINGS), transaction.atomic():
+                self.run_pages()
+                # 把本次请求记录的浏览量写入后随事务一起丢弃
+                view_counter.flush()
+                raise Rollback
+        except Rollback:
+            pass
+
+        if self.problems:
+            for page, sql, detail, reason in self.problems:
+                self.stdout.write(self.style.ERROR(f'[{page}] {reason}: {detail}'))
+                self.stdout.write(f'    {sql}')
+            raise CommandError(f'共检查 {self.checked} 条查询，其中 {len(self.problems)} 处未命中索引。')
+        self.stdout.write(self.style.SUCCESS(f'共检查 {self.checked} 条查询，全部命中索引。'))
+
+    def run_pages(self):
+        post = (
+            Post.objects.filter(status='published')
+            .annotate(n=Count('comments'))
+            .select_related('author', 'category')
+            .order_by('-n', '-publish')
+            .first()
+        )
+        if post is None:
+            raise CommandError('数据库中没有已发布的文章，请先填充数据。')
+        author = post.author
+        reader = User.objects.annotate(n=Count('notifications')).order_by('-n').first()
+
+        response = self.explain_page('首页', '/')
+        response = self.explain_page('文章列表', reverse('blog:post_list'))
+        page_obj = getattr(response, 'context_data', {}).get('page_obj')
+        if page_obj is not None and page_obj.has_next():
+            self.explain_page('文章列表（游标翻页）', f"{reverse('blog:post_list')}?cursor={page_obj.next_cursor}")
+        self.explain_page('文章列表（页码翻页）', f"{reverse('blog:post_list')}?page=2")
+        self.explain_page('文章详情', post.get_absolute_url())
+        self.explain_page('评论片段', reverse('blog:post_comments', args=[post.pk]))
+        self.explain_page('作者文章', reverse('blog:author_posts', args=[author.username]))
+        if post.category:
+            self.explain_page('分类文章', post.category.get_absolute_url())
+            self.explain_page('分类订阅源', reverse('blog:category_feed', args=[post.category.slug]))
+        self.explain_page('全站订阅源', reverse('blog:latest_feed'))
+        self.explain_page('作者订阅源', reverse('blog:author_feed', args=[author.username]))
+        for name, query in self.search_queries(post):
+            self.explain_page(name, f"{reverse('blog:search')}?{urlencode({'query': query})}")
+        self.explain_page('草稿箱', reverse('blog:draft_list'), user=author)
+        self.explain_page('个人资料', reverse('accounts:profile'), user=author)
+        self.explain_page('通知列表', reverse('notifications:notification_list'), user=reader)
+
+    def search_queries(self, post):
+        """有代表性的搜索：走 trigram 索引的长词、走两字词索引的中文词，以及附带单字的组合。"""
+        long_term, short_term = search.sample_terms(post)
+        queries = []
+        if long_term:
+            queries.append(('搜索（长词）', long_term))
+        if short_term:
+            queries.append(('搜索（两字词）', short_term))
+            queries.append(('搜索（两字词 + 单字）', f'{short_term} {short_term[0]}'))
+        return queries
+
+    def explain_page(self, name, path, user=None):
+        request = self.factory.get(path)
+        request.user = user or AnonymousUser()
+        match = resolve(request.path)
+        with CaptureQueriesContext(connection) as queries:
+            response = match.func(request, *match.args, **match.kwargs)
+            if hasattr(response, 'render') and callable(response.render):
+                response.render()
+        if response.status_code != 200:
+            raise CommandError(f'{name}（{path}）返回了状态码 {response.status_code}。')
+
+        statements = [q['sql'] for q in queries.captured_queries if q['sql'].lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE'))]
+        self.stdout.write(self.style.NOTICE(f'=== {name}：{path}（{len(statements)} 条查询） ==='))
+        for sql in statements:
+            self.explain(name, sql)
+        return response
+
+    def explain(self, page, sql):
+        self.checked += 1
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            rows = cursor.fetchall()
+        if self.verbose_plans:
+            self.stdout.write(sql)
+        for row in rows:
+            detail = row[-1]
+            if self.verbose_plans:
+                self.stdout.write(f'    {detail}')
+            if any(plan.search(detail) and shape.search(sql) for plan, shape in ACCEPTED_PLANS):
+                continue
+            for pattern, reason in PROBLEM_PATTERNS:
+                if pattern.search(detail):
+                    self.problems.append((page, sql, detail, reason))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from blog import view_counter
+
+
+class Command(BaseCommand):
+    help = '将内存/缓存中累积的文章浏览量批量写回数据库。'
+
+    def handle(self, *args, **options):
+        count = view_counter.flush()
+        self.stdout.write(self.style.SUCCESS(f'写回完成，共 {count} 次浏览。'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from blog import page_cache
+
+
+class Command(BaseCommand):
+    help = '查看匿名整页缓存的命中/未命中次数。'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='输出后清零统计数据。'
+        )
+
+    def handle(self, *args, **options):
+        stats = page_cache.get_stats()
+        total = stats['hits'] + stats['misses']
+        ratio = stats['hits'] / total * 100 if total else 0
+        self.stdout.write(f"命中: {stats['hits']}  未命中: {stats['misses']}  命中率: {ratio:.1f}%")
+        if options['reset']:
+            page_cache.reset_stats()
+            self.stdout.write(self.style.SUCCESS('统计数据已清零。'))
@@ -0,0 +1,194 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from blog.models import Post, Category
+
+MANIFEST_NAME = 'manifest.json'
+
+
+def _init_worker():
+    # 以 spawn/forkserver 方式启动的子进程需要重新初始化 Django（fork 时重复调用也无妨）
+    import django
+    django.setup()
+
+
+def page_file(output_dir, path):
+    """网址路径对应的静态文件，例如 /blog/posts/ -> <output>/blog/posts/index.html。"""
+    return os.path.join(output_dir, *[part for part in path.split('/') if part], 'index.html')
+
+
+def render_page(path):
+    """以匿名访客身份直接调用视图渲染页面，不经过页面缓存，也不计浏览量。"""
+    request = RequestFactory().get(path)
+    request.user = AnonymousUser()
+    request.prerender = True
+    match = resolve(path)
+    response = match.func(request, *match.args, **match.kwargs)
+    if hasattr(response, 'render') and callable(response.render):
+        response = response.render()
+    if response.status_code != 200:
+        raise ValueError(f'状态码 {response.status_code}')
+    return response.content
+
+
+def render_pages(output_dir, paths):
+    """渲染一组页面并写入文件，返回 [(path, 错误信息或 None), ...]。"""
+    results = []
+    for path in paths:
+        try:
+            content = render_page(path)
+            target = page_file(output_dir, path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            # 先写临时文件再替换，Web 服务器不会读到写了一半的页面
+            with open(target + '.tmp', 'wb') as f:
+                f.write(content)
+            os.replace(target + '.tmp', target)
+            results.append((path, None))
+        except Exception as e:
+            results.append((path, str(e)))
+    return results
+
+
+class Command(BaseCommand):
+    help = (
+        '把已发布文章的详情页、首页、文章列表首页和分类页预渲染为静态 HTML 文件。'
+        '首次全量生成后，只重新渲染上次生成以来有变动的文章及受影响的列表页，并删除已撤回或删除文章的页面。'
+        '静态页面中的评论区由浏览器加载评论片段获得。'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            default=getattr(settings, 'STATIC_PRERENDER_ROOT', os.path.join(settings.BASE_DIR, 'prerendered')),
+            help='静态文件的输出目录。'
+        )
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='忽略上次生成的记录，全量重新生成。'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='并行渲染的进程数（1 表示在当前进程中渲染）。'
+        )
+
+    def handle(self, *args, **options):
+        output_dir = options['output']
+        manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+        manifest = self.load_manifest(manifest_path)
+        since = None
+        if manifest and not options['full']:
+            since = parse_datetime(manifest['built_at'])
+        old_posts = manifest.get('posts', {}) if manifest else {}
+        old_categories = set(manifest.get('categories', [])) if manifest else set()
+
+        # 在查询之前记下时间，生成过程中发生的修改留给下一次增量生成
+        started = timezone.now()
+
+        published = Post.objects.filter(status='published').order_by()
+        current = {}
+        pages = []
+        affected_categories = set()
+        for pk, publish, slug, updated, category_slug in published.values_list(
+            'pk', 'publish', 'slug', 'updated', 'category__slug'
+        ).iterator(chunk_size=2000):
+            local = timezone.localtime(publish)
+            path = reverse('blog:post_detail', args=[local.year, local.month, local.day, slug])
+            current[str(pk)] = {'path': path, 'category': category_slug}
+            previous = old_posts.get(str(pk))
+            if since is None or updated > since or previous is None or previous['path'] != path:
+                pages.append(path)
+                affected_categories.update({category_slug, previous and previous['category']})
+
+        stale_paths = []
+        for pk, previous in old_posts.items():
+            if pk not in current:
+                stale_paths.append(previous['path'])
+                affected_categories.add(previous['category'])
+            elif current[pk]['path'] != previous['path']:
+                stale_paths.append(previous['path'])
+
+        categories = set(Category.objects.values_list('slug', flat=True))
+        for slug in old_categories - categories:
+            stale_paths.append(reverse('blog:category_posts', args=[slug]))
+        if since is None:
+            affected_categories = categories
+        if pages or stale_paths:
+            pages += ['/', reverse('blog:post_list')]
+            pages += [reverse('blog:category_posts', args=[slug]) for slug in sorted(affected_categories & categories)]
+
+        errors = self.render(output_dir, pages, options['workers'])
+        for path in stale_paths:
+            self.remove_page(output_dir, path)
+
+        # 有页面渲染失败时保留上次的生成时间，下次增量生成会重试这些文章
+        built_at = manifest['built_at'] if errors and manifest else started.isoformat()
+        self.write_manifest(manifest_path, {
+            'built_at': built_at,
+            'posts': current,
+            'categories': sorted(categories),
+        })
+
+        self.stdout.write(self.style.SUCCESS(
+            f'预渲染完成：生成 {len(pages) - len(errors)} 个页面，删除 {len(stale_paths)} 个过期页面。'
+        ))
+        if errors:
+            for path, error in errors:
+                self.stdout.write(self.style.ERROR(f'渲染失败 {path}: {error}'))
+            raise CommandError(f'{len(errors)} 个页面渲染失败。')
+
+    def render(self, output_dir, pages, workers):
+        if not pages:
+            return []
+        workers = max(1, min(workers, len(pages)))
+        if workers == 1:
+            results = render_pages(output_dir, pages)
+        else:
+            chunks = [pages[i::workers] for i in range(workers)]
+            # 子进程不能继承父进程已打开的数据库连接
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+                results = [
+                    result
+                    for chunk_results in executor.map(render_pages, [output_dir] * workers, chunks)
+                    for result in chunk_results
+                ]
+        return [(path, error) for path, error in results if error]
+
+    def remove_page(self, output_dir, path):
+        target = page_file(output_dir, path)
+        if os.path.exists(target):
+            os.remove(target)
+        # 顺带清理空目录，但不越过输出目录
+        directory = os.path.dirname(target)
+        while os.path.abspath(directory) != os.path.abspath(output_dir):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break
+            directory = os.path.dirname(directory)
+
+    def load_manifest(self, manifest_path):
+        try:
+            with open(manifest_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def write_manifest(self, manifest_path, manifest):
+        os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+        with open(manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(manifest_path + '.tmp', manifest_path)
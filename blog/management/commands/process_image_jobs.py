@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from blog import image_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        '处理上传图片的后台任务（压缩、重新编码并替换正文中的地址）。'
+        '在 IMAGE_PIPELINE_MODE = "queue" 时需要常驻运行，可以同时运行多个进程；'
+        '其他模式下也可用于补处理积压或重试的任务。'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='处理完当前可执行的任务后退出，而不是持续等待新任务。'
+        )
+        parser.add_argument('--batch-size', type=int, default=20, help='每次取出的任务数。')
+        parser.add_argument('--sleep', type=float, default=2.0, help='没有任务时等待的秒数。')
+
+    def handle(self, *args, **options):
+        counts = {'done': 0, 'pending': 0, 'failed': 0}
+        try:
+            while True:
+                close_old_connections()
+                job_ids = image_jobs.claim_pending(options['batch_size'])
+                for job_id in job_ids:
+                    status = image_jobs.run_job(job_id)
+                    if status is None:
+                        continue
+                    counts[status] += 1
+                    if status == 'done':
+                        self.stdout.write(f'已处理任务 {job_id}')
+                    else:
+                        self.stdout.write(self.style.WARNING(f'任务 {job_id} 处理失败（{"稍后重试" if status == "pending" else "不再重试"}）'))
+                if not job_ids:
+                    if options['once']:
+                        break
+                    time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(
+            f"完成 {counts['done']} 个任务，{counts['pending']} 个等待重试，{counts['failed']} 个失败。"
+        ))
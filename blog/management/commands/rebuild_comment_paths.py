@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from blog.models import Comment, COMMENT_PATH_WIDTH
+
+
+class Command(BaseCommand):
+    help = '为已有评论重新计算物化路径（path）和层级（depth）。'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='每批写入的评论数量。'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        post_ids = Comment.objects.order_by().values_list('post_id', flat=True).distinct()
+
+        total = 0
+        for post_id in post_ids.iterator():
+            # 一次取出一篇文章下的全部评论，在内存中按父子关系自顶向下计算路径
+            rows = list(
+                Comment.objects.filter(post_id=post_id)
+                .order_by('created_on', 'pk')
+                .values_list('pk', 'parent_id')
+            )
+            children = {}
+            for pk, parent_id in rows:
+                children.setdefault(parent_id, []).append(pk)
+
+            updates = []
+            stack = [(pk, '', -1) for pk in reversed(children.get(None, []))]
+            while stack:
+                pk, parent_path, parent_depth = stack.pop()
+                segment = str(pk).zfill(COMMENT_PATH_WIDTH)
+                path = f'{parent_path}/{segment}' if parent_path else segment
+                updates.append(Comment(pk=pk, path=path, depth=parent_depth + 1))
+                stack.extend((child, path, parent_depth + 1) for child in reversed(children.get(pk, [])))
+
+            with transaction.atomic():
+                Comment.objects.bulk_update(updates, ['path', 'depth'], batch_size=batch_size)
+            total += len(updates)
+
+        self.stdout.write(self.style.SUCCESS(f'完成！共更新了 {total} 条评论的树路径。'))
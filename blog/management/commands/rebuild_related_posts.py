@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from blog import related
+
+
+class Command(BaseCommand):
+    help = '全量重建文章的 TF-IDF 词向量和相关文章列表。'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='每批处理的文章数量。'
+        )
+
+    def handle(self, *args, **options):
+        total = related.rebuild_all(batch_size=options['batch_size'], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f'重建完成，共处理 {total} 篇已发布文章。'))
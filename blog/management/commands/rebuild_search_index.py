@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+from blog import search
+
+
+class Command(BaseCommand):
+    help = '清空并重建文章全文检索索引（SQLite FTS5）。'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='每批写入索引的文章数量。'
+        )
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            raise CommandError('全文检索索引仅支持 SQLite 数据库。')
+        total = search.rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'索引重建完成，共收录 {total} 篇已发布文章。'))
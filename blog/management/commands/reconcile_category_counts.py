@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from blog.models import Category, Post
+from blog import sidebar
+
+
+class Command(BaseCommand):
+    help = '按文章表重新统计每个分类的已发布文章数，校正 Category.published_post_count。'
+
+    def handle(self, *args, **options):
+        counts = dict(
+            Post.objects.filter(status='published', category__isnull=False)
+            .order_by()
+            .values_list('category')
+            .annotate(n=Count('pk'))
+        )
+
+        changed = []
+        for category in Category.objects.only('pk', 'name', 'published_post_count'):
+            actual = counts.get(category.pk, 0)
+            if category.published_post_count != actual:
+                self.stdout.write(f'{category.name}: {category.published_post_count} -> {actual}')
+                category.published_post_count = actual
+                changed.append(category)
+
+        if changed:
+            with transaction.atomic():
+                Category.objects.bulk_update(changed, ['published_post_count'], batch_size=500)
+            sidebar.bump_generation()
+
+        self.stdout.write(self.style.SUCCESS(f'校正完成，共修正了 {len(changed)} 个分类。'))
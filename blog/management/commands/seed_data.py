@@ -0,0 +1,248 @@
+import random
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Max
+from django.utils import timezone
+from django.utils.html import escape
+from django.utils.text import slugify
+
+from accounts.models import Profile
+from blog import page_cache, sidebar, sitemaps, slugs
+from blog.models import Post, Category, Comment, COMMENT_MAX_DEPTH, COMMENT_PATH_WIDTH
+from notifications.models import Notification
+
+LATIN_WORDS = (
+    'django python cache index query latency throughput template render database async queue worker '
+    'request response middleware signal model view form static media image upload search ranking '
+    'feed sitemap pagination cursor session token deploy server nginx gunicorn redis sqlite postgres'
+).split()
+CJK_PHRASES = (
+    '性能优化 数据库 缓存 索引 查询 模板 渲染 部署 服务器 并发 异步 队列 日志 监控 指标 '
+    '前端 后端 接口 分页 搜索 排序 图片 压缩 上传 评论 通知 用户 文章 分类 标签 阅读 体验'
+).split()
+CATEGORY_NAMES = ['技术', '生活', '随笔', '读书', '旅行', '摄影', '音乐', '电影', '编程', '设计']
+COMMENT_SENTENCES = [
+    '写得很好，学到了！', '请问这个方案在高并发下表现如何？', '同意楼上的观点。', '感谢分享，收藏了。',
+    'Great post, thanks!', '有个小问题：第二段的代码似乎少了一个参数。', '期待后续更新。',
+    '我在生产环境也遇到过类似的问题。', 'Could you share the benchmark numbers?', '受益匪浅。',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        '生成用于压测和基准测试的模拟数据：用户（含资料）、分类、带真实 HTML 的文章、多层评论树和通知。'
+        '全部使用批量插入并预先分配主键，百万行级别的数据只需几分钟。'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100, help='用户数量。')
+        parser.add_argument('--categories', type=int, default=10, help='分类数量。')
+        parser.add_argument('--posts', type=int, default=1000, help='文章数量。')
+        parser.add_argument('--comments-per-post', type=int, default=10, help='每篇文章的平均评论数。')
+        parser.add_argument('--max-depth', type=int, default=8, help='评论树的最大层级。')
+        parser.add_argument('--draft-ratio', type=float, default=0.05, help='草稿所占比例。')
+        parser.add_argument('--batch-size', type=int, default=2000, help='每次批量插入的行数。')
+        parser.add_argument('--password', default='password', help='所有模拟用户的密码。')
+        parser.add_argument('--seed', type=int, default=None, help='随机数种子，便于复现同样的数据。')
+        parser.add_argument(
+            '--skip-post-process',
+            action='store_true',
+            help='不重建全文检索索引和相关文章（数据量很大时可稍后手动执行）。'
+        )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.max_depth = min(options['max_depth'], COMMENT_MAX_DEPTH + 1)
+        self.started = time.monotonic()
+
+        user_ids = self.create_users(options['users'], options['password'])
+        category_ids = self.create_categories(options['categories'])
+        self.create_posts_and_comments(
+            options['posts'], user_ids, category_ids, options['comments_per_post'], options['draft_ratio']
+        )
+
+        sidebar.bump_generation()
+        sitemaps.bump_generation()
+        page_cache.purge_all()
+        self.stdout.write(self.style.SUCCESS(f'模拟数据生成完成，用时 {time.monotonic() - self.started:.1f} 秒。'))
+
+        if not options['skip_post_process']:
+            call_command('rebuild_search_index', stdout=self.stdout)
+            call_command('rebuild_related_posts', stdout=self.stdout)
+
+    def next_pk(self, model):
+        return (model.objects.aggregate(m=Max('pk'))['m'] or 0) + 1
+
+    def progress(self, label, count):
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(f'{label}：{count} 行（累计 {elapsed:.1f} 秒）')
+
+    # --- 用户与分类 ---
+
+    def create_users(self, count, password):
+        # 哈希计算很慢，所有模拟用户共用同一个密码哈希
+        password_hash = make_password(password)
+        start = self.next_pk(User)
+        user_ids = list(range(start, start + count))
+        now = timezone.now()
+        for offset in range(0, count, self.batch_size):
+            ids = user_ids[offset:offset + self.batch_size]
+            with transaction.atomic():
+                User.objects.bulk_create(
+                    User(pk=pk, username=f'seed{pk}', email=f'seed{pk}@example.com', password=password_hash, date_joined=now)
+                    for pk in ids
+                )
+                Profile.objects.bulk_create(
+                    Profile(user_id=pk, nickname=f'用户{pk}', bio=self.sentence(8)) for pk in ids
+                )
+        self.progress('用户', count)
+        return user_ids
+
+    def create_categories(self, count):
+        wanted = []
+        for i in range(count):
+            name = CATEGORY_NAMES[i] if i < len(CATEGORY_NAMES) else f'分类{i + 1}'
+            wanted.append(Category(name=name, slug=f'seed-{i + 1}'))
+        Category.objects.bulk_create(wanted, ignore_conflicts=True)
+        category_ids = list(
+            Category.objects.filter(slug__in=[c.slug for c in wanted]).values_list('pk', flat=True)
+        )
+        self.progress('分类', len(category_ids))
+        return category_ids
+
+    # --- 文章、评论与通知 ---
+
+    def create_posts_and_comments(self, count, user_ids, category_ids, comments_per_post, draft_ratio):
+        post_pk = self.next_pk(Post)
+        self.comment_pk = self.next_pk(Comment)
+        self.post_type = ContentType.objects.get_for_model(Post)
+        self.comment_type = ContentType.objects.get_for_model(Comment)
+        published_counts = Counter()
+        totals = Counter()
+        now = timezone.now()
+
+        for offset in range(0, count, self.batch_size):
+            posts = []
+            for pk in range(post_pk + offset, post_pk + min(offset + self.batch_size, count)):
+                title = self.title()
+                post = Post(
+                    pk=pk,
+                    title=title,
+                    slug=f'{slugify(title)[:80]}-{pk}',
+                    author_id=self.random.choice(user_ids),
+                    content=self.html(),
+                    publish=now - timedelta(minutes=self.random.randint(0, 2 * 365 * 24 * 60)),
+                    status='draft' if self.random.random() < draft_ratio else 'published',
+                    category_id=self.random.choice(category_ids) if category_ids else None,
+                    views=int(self.random.paretovariate(1.2) * 10),
+                )
+                post.publish_date = slugs.publish_date(post)
+                post.update_derived_fields()
+                posts.append(post)
+                if post.status == 'published' and post.category_id:
+                    published_counts[post.category_id] += 1
+
+            comments, notifications = [], []
+            for post in posts:
+                if post.status == 'published' and user_ids:
+                    self.build_thread(post, user_ids, comments_per_post, comments, notifications)
+
+            with transaction.atomic():
+                Post.objects.bulk_create(posts)
+                Comment.objects.bulk_create(comments, batch_size=self.batch_size)
+                Notification.objects.bulk_create(notifications, batch_size=self.batch_size)
+            totals.update(posts=len(posts), comments=len(comments), notifications=len(notifications))
+            self.progress('文章 / 评论 / 通知', f"{totals['posts']} / {totals['comments']} / {totals['notifications']}")
+
+        # 批量插入不触发信号，分类文章数统一累加
+        for category_id, n in published_counts.items():
+            Category.objects.filter(pk=category_id).update(published_post_count=F('published_post_count') + n)
+
+    def build_thread(self, post, user_ids, average, comments, notifications):
+        count = self.random.randint(0, average * 2)
+        created = post.publish
+        thread = []
+        for _ in range(count):
+            pk = self.comment_pk
+            self.comment_pk += 1
+            created += timedelta(minutes=self.random.randint(1, 600))
+            # 倾向于回复最近的评论，形成较深的讨论串
+            parent = None
+            if thread and self.random.random() < 0.6:
+                candidates = [c for c in thread[-5:] if c.depth < self.max_depth - 1]
+                parent = self.random.choice(candidates) if candidates else None
+            segment = str(pk).zfill(COMMENT_PATH_WIDTH)
+            comment = Comment(
+                pk=pk,
+                post_id=post.pk,
+                user_id=self.random.choice(user_ids),
+                parent_id=parent.pk if parent else None,
+                content=self.random.choice(COMMENT_SENTENCES),
+                created_on=created,
+                active=self.random.random() > 0.02,
+                path=f'{parent.path}/{segment}' if parent else segment,
+                depth=parent.depth + 1 if parent else 0,
+            )
+            thread.append(comment)
+            comments.append(comment)
+
+            # 与 notifications.signals 的规则一致：评论通知文章作者，回复通知被回复者
+            if parent is None and comment.user_id != post.author_id:
+                recipient, content_type, object_id = post.author_id, self.post_type, post.pk
+                verb = '评论了你的文章'
+            elif parent is not None and comment.user_id != parent.user_id:
+                recipient, content_type, object_id = parent.user_id, self.comment_type, pk
+                verb = '回复了你的评论'
+            else:
+                continue
+            notifications.append(Notification(
+                recipient_id=recipient,
+                actor_id=comment.user_id,
+                verb=verb,
+                content_type=content_type,
+                object_id=object_id,
+                read=self.random.random() < 0.7,
+            ))
+
+    # --- 文本生成 ---
+
+    def sentence(self, words):
+        parts = []
+        for _ in range(words):
+            if self.random.random() < 0.5:
+                parts.append(self.random.choice(CJK_PHRASES))
+            else:
+                parts.append(self.random.choice(LATIN_WORDS))
+        return ' '.join(parts)
+
+    def title(self):
+        return ' '.join(self.random.choice(LATIN_WORDS) for _ in range(self.random.randint(3, 7))).capitalize()
+
+    def html(self):
+        blocks = []
+        for i in range(self.random.randint(4, 12)):
+            kind = self.random.random()
+            if i and kind < 0.15:
+                blocks.append(f'<h2>{escape(self.sentence(4))}</h2>')
+            elif kind < 0.25:
+                items = ''.join(f'<li>{escape(self.sentence(6))}</li>' for _ in range(self.random.randint(2, 5)))
+                blocks.append(f'<ul>{items}</ul>')
+            elif kind < 0.32:
+                code = '\n'.join(
+                    f'{self.random.choice(LATIN_WORDS)} = {self.random.choice(LATIN_WORDS)}({self.random.randint(0, 99)})'
+                    for _ in range(self.random.randint(2, 8))
+                )
+                blocks.append(f'<pre><code class="language-python">{escape(code)}</code></pre>')
+            else:
+                sentences = '。'.join(self.sentence(self.random.randint(6, 16)) for _ in range(self.random.randint(2, 6)))
+                blocks.append(f'<p>{escape(sentences)}。</p>')
+        return '\n'.join(blocks)
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from blog import trending
+
+
+class Command(BaseCommand):
+    help = '合并/清理过期的浏览量分桶，并重新计算热门文章排行（建议每 10~30 分钟定时运行）。'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--skip-compact',
+            action='store_true',
+            help='只重新计算排行，不合并/清理浏览量分桶。'
+        )
+
+    def handle(self, *args, **options):
+        if not options['skip_compact']:
+            merged, expired = trending.compact()
+            self.stdout.write(f'合并了 {merged} 个小时桶，删除了 {expired} 个过期的天桶。')
+        count = trending.update_rankings()
+        self.stdout.write(self.style.SUCCESS(f'热门排行已更新，共 {count} 篇文章上榜。'))
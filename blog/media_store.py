@@ -0,0 +1,146 @@
+"""
+按内容寻址的媒体存储（MEDIA_DEDUP_ENABLED）。
+
+处理后的上传图片以内容的 SHA-256 命名（cas/ab/<摘要>.jpg），内容相同的图片只保存一份，
+由 `MediaBlob` 记录。每篇文章的特色图片和正文引用了哪些文件记录在 `PostMedia` 中，
+`MediaBlob.refcount` 即引用它的文章数，由 blog.signals 在文章保存、删除时维护；
+引用数降为 0 的文件由 cleanup_files 删除。
+
+上传的原图先计算摘要再处理：同样的原图已经处理过时直接复用结果，既不保存原图也不再压缩。
+"""
+import hashlib
+import re
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from myblog.image_utils import compress_image
+
+CAS_DIR = 'cas'
+
+_CHUNK_SIZE = 64 * 1024
+_IMG_SRC = re.compile(r'<img[^>]+src="([^"]+)"')
+
+
+def enabled():
+    return getattr(settings, 'MEDIA_DEDUP_ENABLED', False)
+
+
+def is_managed(name):
+    """路径是否由内容寻址存储管理（这类文件可能被多篇文章共用，不能随某篇文章删除）。"""
+    return bool(name) and name.startswith(f'{CAS_DIR}/')
+
+
+def blob_name(digest):
+    return f'{CAS_DIR}/{digest[:2]}/{digest}.jpg'
+
+
+def file_digest(f):
+    """分块计算文件内容的 SHA-256，不把整个文件读入内存；计算后回到文件开头。"""
+    digest = hashlib.sha256()
+    f.seek(0)
+    for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    f.seek(0)
+    return digest.hexdigest()
+
+
+# --- 保存 ---
+
+def find_processed(f):
+    """
+    返回 (MediaBlob 或 None, 原图摘要)：同样的原图处理过时返回其结果。
+    """
+    from .models import MediaBlob
+    source_digest = file_digest(f)
+    blob = MediaBlob.objects.filter(source_digest=source_digest).first()
+    if blob is not None:
+        MediaBlob.objects.filter(pk=blob.pk).update(last_used=timezone.now())
+    return blob, source_digest
+
+
+def store(content, source_digest=''):
+    """按内容保存处理后的图片，内容相同的文件已存在时不再重复保存；返回存储中的路径。"""
+    from .models import MediaBlob
+    digest = file_digest(content)
+    name = blob_name(digest)
+    blob = MediaBlob.objects.filter(digest=digest).first()
+    if blob is None:
+        if not default_storage.exists(name):
+            saved = default_storage.save(name, content)
+            if saved != name:
+                # 并发的相同上传已经写入了同样的内容，丢弃重复的文件
+                default_storage.delete(saved)
+        try:
+            with transaction.atomic():
+                blob = MediaBlob.objects.create(digest=digest, name=name, source_digest=source_digest)
+        except IntegrityError:
+            blob = MediaBlob.objects.get(digest=digest)
+    updates = {'last_used': timezone.now()}
+    if source_digest and not blob.source_digest:
+        updates['source_digest'] = source_digest
+    MediaBlob.objects.filter(pk=blob.pk).update(**updates)
+    return blob.name
+
+
+def store_processed(f):
+    """压缩原图 f 并按内容保存，返回存储中的路径；同样的原图已经处理过时直接返回之前的结果。"""
+    blob, source_digest = find_processed(f)
+    if blob is not None:
+        return blob.name
+    _, compressed = compress_image(f)
+    return store(compressed, source_digest)
+
+
+# --- 引用计数 ---
+
+def referenced_names(post):
+    """文章的特色图片和正文中引用的、由内容寻址存储管理的文件路径。"""
+    from .image_jobs import source_from_url
+    names = set()
+    if post.image and is_managed(post.image.name):
+        names.add(post.image.name)
+    for url in _IMG_SRC.findall(post.content or ''):
+        name = source_from_url(url)
+        if is_managed(name):
+            names.add(name)
+    return names
+
+
+def blob_ids(post):
+    from .models import PostMedia
+    return list(PostMedia.objects.filter(post=post).values_list('blob_id', flat=True))
+
+
+def recount(ids):
+    """按引用记录重新计算这些文件的引用数（并发修改同一文件的引用时也不会算错）。"""
+    from .models import MediaBlob, PostMedia
+    if not ids:
+        return
+    references = (
+        PostMedia.objects.filter(blob=OuterRef('pk')).values('blob').annotate(n=Count('pk')).values('n')
+    )
+    MediaBlob.objects.filter(pk__in=ids).update(refcount=Coalesce(Subquery(references), Value(0)))
+
+
+def sync_post(post, created=False):
+    """使文章的引用记录与其当前的特色图片和正文一致，并更新受影响文件的引用数。"""
+    from .models import MediaBlob, PostMedia
+    wanted = referenced_names(post)
+    if created and not wanted:
+        return
+    current = dict(PostMedia.objects.filter(post=post).values_list('blob__name', 'blob_id'))
+    removed = [current[name] for name in current.keys() - wanted]
+    added = list(
+        MediaBlob.objects.filter(name__in=wanted - current.keys()).values_list('pk', flat=True)
+    )
+    if removed:
+        PostMedia.objects.filter(post=post, blob_id__in=removed).delete()
+    if added:
+        PostMedia.objects.bulk_create([PostMedia(post=post, blob_id=pk) for pk in added], ignore_conflicts=True)
+        MediaBlob.objects.filter(pk__in=added).update(last_used=timezone.now())
+    recount(removed + added)
@@ -1,13 +1,26 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Exists, F, OuterRef, Value
+from django.db.models.functions import Concat, Substr
+from django.db.models.lookups import StartsWith
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from django.urls import reverse
 from django.utils import timezone
-from django.utils.text import slugify
 from django_ckeditor_5.fields import CKEditor5Field
+from django_cleanup import cleanup
 import os 
 import time 
 import random 
 from myblog.image_utils import compress_image
+from .utils import html_to_text, count_words
+from . import image_jobs, media_store, slugs
+
+# 列表页摘要的最大长度（字符）
+EXCERPT_LENGTH = 200
+# 阅读速度（字/分钟），用于估算阅读时长
+READING_SPEED = 300
+# Slug 冲突（并发发布同名文章）时的最大重试次数
+SLUG_MAX_RETRIES = 5
 
 # 自定义上传路径函数 ====================
 def post_image_path(instance, filename):
@@ -30,11 +43,17 @@ def post_image_path(instance, filename):
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True, verbose_name="分类名称")
     slug = models.SlugField(max_length=100, unique=True, verbose_name="Slug")
+    # 由 blog.signals 维护的已发布文章数，可用 reconcile_category_counts 命令校正
+    published_post_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="已发布文章数")
     
     class Meta:
         verbose_name = "分类"
         verbose_name_plural = verbose_name
         ordering = ['name']
+        # 侧边栏按文章数排序
+        indexes = [
+            models.Index(fields=['-published_post_count', 'name'], name='blog_category_post_count'),
+        ]
 
     def get_absolute_url(self):
         return reverse('blog:category_posts', args=[self.slug])
@@ -42,6 +61,8 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+# 特色图片可能是多篇文章共用的按内容保存的文件，不交给 django_cleanup 删除，由 blog.signals 处理
+@cleanup.ignore
 class Post(models.Model):
     STATUS_CHOICES = (('draft', '草稿'), ('published', '已发布'),)
     title = models.CharField(max_length=200, verbose_name="标题")
@@ -55,11 +76,29 @@ class Post(models.Model):
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, related_name='posts', verbose_name="分类")
     image = models.ImageField(upload_to=post_image_path, blank=True, null=True, verbose_name="特色图片")
     views = models.PositiveIntegerField(default=0, verbose_name="浏览量")
+    # 以下字段由正文在保存时派生，列表页无需再加载和处理完整的 HTML 正文
+    excerpt = models.CharField(max_length=EXCERPT_LENGTH, blank=True, editable=False, verbose_name="摘要")
+    word_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="字数")
+    reading_time = models.PositiveSmallIntegerField(default=1, editable=False, verbose_name="阅读时长（分钟）")
+    # 本地时区的发布日期，与 slug 一起构成唯一约束（文章网址中的年/月/日即取自该日期）
+    publish_date = models.DateField(null=True, editable=False, verbose_name="发布日期")
     
     class Meta:
         verbose_name = "文章"
         verbose_name_plural = verbose_name
         ordering = ('-publish',)
+        constraints = [
+            models.UniqueConstraint(fields=['publish_date', 'slug'], name='blog_post_unique_slug_per_day'),
+        ]
+        # 与列表页、侧边栏、订阅源的查询条件和排序（含分页用的 id）一一对应，避免全表扫描和临时排序
+        indexes = [
+            models.Index(fields=['status', '-publish', '-id'], name='blog_post_status_publish'),
+            models.Index(fields=['status', '-views'], name='blog_post_status_views'),
+            models.Index(fields=['status', 'updated'], name='blog_post_status_updated'),
+            models.Index(fields=['category', 'status', '-publish', '-id'], name='blog_post_cat_status_publish'),
+            models.Index(fields=['author', 'status', '-publish', '-id'], name='blog_post_author_status_pub'),
+            models.Index(fields=['author', 'status', '-updated', '-id'], name='blog_post_author_status_upd'),
+        ]
 
     def get_absolute_url(self):
         local_publish_time = timezone.localtime(self.publish)
@@ -70,47 +109,70 @@ class Post(models.Model):
             self.slug
         ])
 
+    def update_derived_fields(self):
+        """根据正文重新计算纯文本摘要、字数和阅读时长。"""
+        text = html_to_text(self.content)
+        self.excerpt = text[:EXCERPT_LENGTH]
+        self.word_count = count_words(text)
+        self.reading_time = max(1, -(-self.word_count // READING_SPEED))
+
     def save(self, *args, **kwargs):
-        # 自动生成 Slug (如果为空)
-        if not self.slug:
-            self.slug = slugify(self.title) or "post"
-        # 准备检查重复项
-        original_slug = self.slug
-        queryset = Post.objects.filter(
-            publish__date=self.publish.date(),
-            slug=self.slug
-        )
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'content' in update_fields:
+            # 后台已处理完的正文图片换成压缩后的地址
+            self.content = image_jobs.swap_finished_urls(self.content)
+            self.update_derived_fields()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'excerpt', 'word_count', 'reading_time'}
 
-        # 如果是更新现有文章，必须把自己排除在检查之外，避免与自身冲突
-        if self.pk:
-            queryset = queryset.exclude(pk=self.pk)
-
-        # 循环检查，直到 slug 变得唯一
-        counter = 1
-        while queryset.exists():
-            self.slug = f'{original_slug}-{counter}'
-            counter += 1
-            # 重新构建查询集以检查新的 slug
-            queryset = Post.objects.filter(
-                publish__date=self.publish.date(),
-                slug=self.slug
-            )
-            if self.pk:
-                queryset = queryset.exclude(pk=self.pk)
+        # 分配当天唯一的 Slug（只更新与 Slug/发布时间无关的字段时跳过）
+        if update_fields is None or {'slug', 'publish'} & set(update_fields):
+            self.publish_date = slugs.publish_date(self)
+            self.slug = slugs.allocate_slug(self)
+            if update_fields is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'slug', 'publish_date'}
         
-        # 调用我们之前的图片压缩逻辑
-        if self.image and hasattr(self.image.file, 'content_type'):
-            new_filename, compressed_image_file = compress_image(self.image.file)
-            self.image.file = compressed_image_file
-            base_name = os.path.splitext(self.image.name)[0]
-            self.image.name = f"{base_name}.jpg"
+        # 新上传的特色图片：默认先保存原图，保存后交给后台压缩；同步模式或积压过多时就地压缩。
+        # 启用去重且同样的图片已经处理过时，直接引用已有的文件，不保存原图也不压缩
+        defer_image = False
+        if self.image and not self.image._committed:
+            blob = media_store.find_processed(self.image.file)[0] if media_store.enabled() else None
+            if blob is not None:
+                self.image = blob.name
+            elif image_jobs.should_defer():
+                defer_image = True
+            elif media_store.enabled():
+                self.image = media_store.store_processed(self.image.file)
+            else:
+                new_filename, compressed_image_file = compress_image(self.image.file)
+                self.image.file = compressed_image_file
+                base_name = os.path.splitext(self.image.name)[0]
+                self.image.name = f"{base_name}.jpg"
 
-        # 调用父类的 save 方法
-        super().save(*args, **kwargs)
+        # 调用父类的 save 方法；放在事务中，使 post_save 信号里的计数器更新与文章写入一同提交。
+        # 并发发布同名文章时，数据库唯一约束会拒绝重复的 Slug，此时重新分配后重试
+        for attempt in range(SLUG_MAX_RETRIES):
+            try:
+                with transaction.atomic():
+                    super().save(*args, **kwargs)
+                    if defer_image:
+                        image_jobs.submit_post_image(self)
+                return
+            except IntegrityError:
+                conflict = Post.objects.filter(publish_date=self.publish_date, slug=self.slug).exclude(pk=self.pk)
+                if attempt == SLUG_MAX_RETRIES - 1 or not conflict.exists():
+                    raise
+                self.slug = slugs.allocate_slug(self)
 
     def __str__(self):
         return self.title
 
+# 评论树路径中每一段（即每个评论 ID）补零后的宽度，保证按字符串排序即为按树的先序遍历排序
+COMMENT_PATH_WIDTH = 10
+COMMENT_PATH_MAX_LENGTH = 255
+# 路径长度所能容纳的最深层级（顶层评论为第 0 层）
+COMMENT_MAX_DEPTH = (COMMENT_PATH_MAX_LENGTH + 1) // (COMMENT_PATH_WIDTH + 1) - 1
+
 class Comment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments', verbose_name="文章")
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='comments', verbose_name="用户")
@@ -118,11 +180,98 @@ class Comment(models.Model):
     content = models.TextField(verbose_name="评论内容")
     created_on = models.DateTimeField(verbose_name="评论时间", default=timezone.now)
     active = models.BooleanField(default=True, verbose_name="是否激活")
+    # 物化路径：祖先到自身的 ID 链，如 "0000000003/0000000007"
+    path = models.CharField(max_length=COMMENT_PATH_MAX_LENGTH, db_index=True, blank=True, editable=False, verbose_name="树路径")
+    depth = models.PositiveSmallIntegerField(default=0, editable=False, verbose_name="层级")
 
     class Meta:
         verbose_name = "评论"
         verbose_name_plural = verbose_name
         ordering = ['created_on']
+        # 评论区按文章筛选并按树路径排序
+        indexes = [
+            models.Index(fields=['post', 'path'], name='blog_comment_post_path'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 记住加载时的父评论，保存时据此判断评论是否被移动了
+        instance._loaded_parent_id = instance.__dict__.get('parent_id')
+        return instance
+
+    def build_path(self):
+        segment = str(self.pk).zfill(COMMENT_PATH_WIDTH)
+        if self.parent_id:
+            return f'{self.parent.path}/{segment}', self.parent.depth + 1
+        return segment, 0
+
+    def is_moved(self):
+        return bool(self.path) and getattr(self, '_loaded_parent_id', self.parent_id) != self.parent_id
+
+    def clean(self):
+        if self.is_moved():
+            self.validate_move()
+
+    def validate_move(self):
+        """移动已有评论时，新的父评论必须在同一篇文章下、不在自身的子树中，且移动后不超过最大层级。"""
+        if not self.parent_id:
+            return
+        parent = self.parent
+        if parent.post_id != self.post_id:
+            raise ValidationError({'parent': '父评论必须属于同一篇文章。'})
+        if parent.pk == self.pk or parent.path.startswith(f'{self.path}/'):
+            raise ValidationError({'parent': '不能把评论移动到它自己的回复下。'})
+        deepest = Comment.objects.filter(path__startswith=f'{self.path}/').aggregate(
+            deepest=models.Max('depth')
+        )['deepest'] or self.depth
+        if parent.depth + 1 + deepest - self.depth > COMMENT_MAX_DEPTH:
+            raise ValidationError({'parent': '移动后评论的层级过深。'})
+
+    def save(self, *args, **kwargs):
+        # 回复的层级超过路径所能容纳的深度时，挂到被回复评论的上一层，与其并列
+        if not self.path and self.parent_id and self.parent.depth >= COMMENT_MAX_DEPTH:
+            self.parent = self.parent.parent
+        moved = self.is_moved()
+        if moved:
+            self.validate_move()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            # 新评论插入后才有 ID，再补写物化路径
+            if not self.path:
+                self.path, self.depth = self.build_path()
+                Comment.objects.filter(pk=self.pk).update(path=self.path, depth=self.depth)
+            elif moved:
+                self.move_subtree()
+        self._loaded_parent_id = self.parent_id
+
+    def move_subtree(self):
+        """父评论改变后，重新计算自身及全部回复的路径和层级。"""
+        old_path, old_depth = self.path, self.depth
+        self.path, self.depth = self.build_path()
+        Comment.objects.filter(post_id=self.post_id, path__startswith=f'{old_path}/').update(
+            path=Concat(Value(self.path), Substr('path', len(old_path) + 1), output_field=models.CharField()),
+            depth=F('depth') + (self.depth - old_depth),
+        )
+        Comment.objects.filter(pk=self.pk).update(path=self.path, depth=self.depth)
+
+    @classmethod
+    def visible_thread(cls, post_id, root=None):
+        """
+        按树的先序遍历顺序返回某篇文章下可见的评论（或某条评论下的全部回复），
+        已连带查询用户资料。被隐藏的评论连同其整棵子树都不会返回。
+        """
+        hidden_ancestor = cls.objects.filter(
+            post_id=OuterRef('post_id'),
+            active=False,
+        ).filter(StartsWith(OuterRef('path'), Concat(F('path'), Value('/'))))
+
+        queryset = cls.objects.filter(post_id=post_id, active=True)
+        if root is not None:
+            queryset = queryset.filter(path__startswith=f'{root.path}/')
+        return queryset.exclude(Exists(hidden_ancestor)).select_related(
+            'user__profile', 'parent__user__profile'
+        ).order_by('path')
 
     def get_absolute_url(self):
         """
@@ -131,12 +280,153 @@ class Comment(models.Model):
         return f"{self.post.get_absolute_url()}#comment-{self.pk}"
 
     def get_all_replies(self):
-        replies = []
-        children = self.replies.filter(active=True).select_related('user__profile', 'parent__user__profile')
-        for child in children:
-            replies.append(child)
-            replies.extend(child.get_all_replies())
-        return replies
+        return list(Comment.visible_thread(self.post_id, root=self))
+
+    def __str__(self):
+        return f'对《{self.post.title}》的评论'
+
+class PostTerm(models.Model):
+    """文章的 TF-IDF 稀疏向量（每篇文章只保留权重最高的若干个词），用于计算相关文章。"""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='terms', verbose_name="文章")
+    term = models.CharField(max_length=64, db_index=True, verbose_name="词")
+    weight = models.FloatField(verbose_name="权重")
+
+    class Meta:
+        verbose_name = "文章词向量"
+        verbose_name_plural = verbose_name
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'term'], name='blog_postterm_unique_post_term'),
+        ]
+
+    def __str__(self):
+        return f'{self.post_id}: {self.term} ({self.weight:.3f})'
+
+
+class RelatedPost(models.Model):
+    """预先计算好的相关文章（每篇文章的前 K 个相似文章）。"""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='related_entries', verbose_name="文章")
+    related = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='+', verbose_name="相关文章")
+    score = models.FloatField(verbose_name="相似度")
+    rank = models.PositiveSmallIntegerField(verbose_name="排名")
+
+    class Meta:
+        verbose_name = "相关文章"
+        verbose_name_plural = verbose_name
+        ordering = ['post', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'rank'], name='blog_relatedpost_unique_post_rank'),
+        ]
+
+    def __str__(self):
+        return f'{self.post_id} -> {self.related_id} ({self.score:.3f})'
+
+
+class PostViewBucket(models.Model):
+    """按时间分桶的文章浏览量，近期按小时、较早的按天汇总。"""
+    GRANULARITY_CHOICES = (('hour', '小时'), ('day', '天'),)
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='view_buckets', verbose_name="文章")
+    granularity = models.CharField(max_length=4, choices=GRANULARITY_CHOICES, verbose_name="粒度")
+    bucket_start = models.DateTimeField(verbose_name="起始时间")
+    count = models.PositiveIntegerField(default=0, verbose_name="浏览量")
+
+    class Meta:
+        verbose_name = "浏览量统计"
+        verbose_name_plural = verbose_name
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'granularity', 'bucket_start'], name='blog_postviewbucket_unique_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['granularity', 'bucket_start'], name='blog_viewbucket_gran_start'),
+        ]
+
+    def __str__(self):
+        return f'{self.post_id} @ {self.bucket_start} ({self.get_granularity_display()}): {self.count}'
+
+
+class TrendingPost(models.Model):
+    """定时计算的热门文章排行（按时间衰减的浏览量得分）。"""
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, related_name='trending', verbose_name="文章")
+    score = models.FloatField(verbose_name="热度")
+    rank = models.PositiveSmallIntegerField(unique=True, verbose_name="排名")
+
+    class Meta:
+        verbose_name = "热门文章"
+        verbose_name_plural = verbose_name
+        ordering = ['rank']
+
+    def __str__(self):
+        return f'#{self.rank} {self.post_id} ({self.score:.2f})'
+
+
+class ImageJob(models.Model):
+    """上传图片的后台处理任务（压缩、重新编码），由 `blog.image_jobs` 调度。"""
+    KIND_CHOICES = (('inline', '正文图片'), ('post_image', '特色图片'),)
+    STATUS_CHOICES = (
+        ('pending', '等待处理'),
+        ('processing', '处理中'),
+        ('done', '已完成'),
+        ('failed', '失败'),
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default='inline', verbose_name="类型")
+    source = models.CharField(max_length=255, unique=True, verbose_name="原图路径")
+    result = models.CharField(max_length=255, blank=True, verbose_name="处理结果路径")
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, null=True, blank=True, related_name='image_jobs', verbose_name="文章"
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name="状态")
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="尝试次数")
+    error = models.TextField(blank=True, verbose_name="错误信息")
+    run_after = models.DateTimeField(default=timezone.now, verbose_name="最早执行时间")
+    created = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+    updated = models.DateTimeField(auto_now=True, verbose_name="更新时间")
+
+    class Meta:
+        verbose_name = "图片处理任务"
+        verbose_name_plural = verbose_name
+        indexes = [
+            # 取待处理任务、统计积压数量
+            models.Index(fields=['status', 'run_after'], name='blog_imagejob_status_run'),
+        ]
+
+    def __str__(self):
+        return f'{self.source} ({self.get_status_display()})'
+
+
+class MediaBlob(models.Model):
+    """按内容寻址保存的处理后图片，内容相同的上传只保存一份（见 `blog.media_store`）。"""
+    # 处理后文件内容的 SHA-256，文件名即由它生成
+    digest = models.CharField(max_length=64, unique=True, verbose_name="内容摘要")
+    # 第一次生成该文件的原图的 SHA-256，同样的原图再次上传时据此跳过压缩
+    source_digest = models.CharField(max_length=64, blank=True, db_index=True, verbose_name="原图摘要")
+    name = models.CharField(max_length=255, unique=True, verbose_name="文件路径")
+    # 引用该文件的文章数，由 PostMedia 的记录计算得出；为 0 时可由 cleanup_files 删除
+    refcount = models.PositiveIntegerField(default=0, verbose_name="引用数")
+    created = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+    last_used = models.DateTimeField(default=timezone.now, verbose_name="最近使用时间")
+
+    class Meta:
+        verbose_name = "媒体文件"
+        verbose_name_plural = verbose_name
+        indexes = [
+            # cleanup_files 查找无人引用的文件
+            models.Index(fields=['refcount', 'last_used'], name='blog_mediablob_refcount_used'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.refcount})'
+
+
+class PostMedia(models.Model):
+    """文章（特色图片或正文）对某个媒体文件的引用。"""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='media_refs', verbose_name="文章")
+    blob = models.ForeignKey(MediaBlob, on_delete=models.CASCADE, related_name='refs', verbose_name="媒体文件")
+
+    class Meta:
+        verbose_name = "文章媒体引用"
+        verbose_name_plural = verbose_name
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'blob'], name='blog_postmedia_unique_post_blob'),
+        ]
 
     def __str__(self):
-        return f'对《{self.post.title}》的评论'
\ No newline at end of file
+        return f'{self.post_id} -> {self.blob_id}'
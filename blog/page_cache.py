@@ -0,0 +1,154 @@
+"""
+面向匿名访客的整页缓存。
+
+缓存键由 URL 路径、页码（或分页游标）以及两级版本号组成：全站版本与“路径版本”。
+文章保存、删除或有新评论时，`blog.signals` 只递增受影响路径（文章详情页、所属分类页、
+作者页、文章列表页与首页）的版本号，其它页面的缓存不受影响。
+命中缓存的详情页仍会通过 `view_counter` 记录浏览量。
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.urls import reverse
+from django.utils.cache import patch_vary_headers
+
+from . import view_counter
+
+KEY_PREFIX = 'blog:pagecache'
+GLOBAL_VERSION_KEY = f'{KEY_PREFIX}:version'
+# 只有这些查询参数会参与缓存键，带有其它参数的请求不走缓存
+CACHEABLE_PARAMS = ('page', 'cursor')
+
+
+def is_enabled():
+    return getattr(settings, 'PAGE_CACHE_ENABLED', False)
+
+
+def _timeout():
+    return getattr(settings, 'PAGE_CACHE_TIMEOUT', 300)
+
+
+def _path_version_key(path):
+    return f'{KEY_PREFIX}:path:{hashlib.md5(path.encode()).hexdigest()}'
+
+
+def _get_versions(keys):
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # 版本键被淘汰后用时间戳重新起算，避免命中旧版本下残留的页面
+            cache.add(key, int(time.time() * 1000), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time() * 1000), timeout=None)
+
+
+def _is_cacheable(request):
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    # 静态预渲染的请求总是重新渲染，也不写入缓存
+    if getattr(request, 'prerender', False):
+        return False
+    if request.user.is_authenticated:
+        return False
+    if any(param not in CACHEABLE_PARAMS for param in request.GET):
+        return False
+    # 带有待显示的提示消息的页面因人而异，不能缓存
+    return len(get_messages(request)) == 0
+
+
+def _page_key(request):
+    path = request.path
+    global_version, path_version = _get_versions([GLOBAL_VERSION_KEY, _path_version_key(path)])
+    params = '&'.join(f'{name}={request.GET[name]}' for name in CACHEABLE_PARAMS if name in request.GET)
+    digest = hashlib.md5(f'{path}?{params}'.encode()).hexdigest()
+    return f'{KEY_PREFIX}:page:{digest}:{global_version}:{path_version}'
+
+
+def _count(outcome):
+    key = f'{KEY_PREFIX}:stats:{outcome}'
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+
+def get_stats():
+    """返回缓存命中/未命中次数。"""
+    values = cache.get_many([f'{KEY_PREFIX}:stats:hit', f'{KEY_PREFIX}:stats:miss'])
+    return {
+        'hits': values.get(f'{KEY_PREFIX}:stats:hit', 0),
+        'misses': values.get(f'{KEY_PREFIX}:stats:miss', 0),
+    }
+
+
+def reset_stats():
+    cache.delete_many([f'{KEY_PREFIX}:stats:hit', f'{KEY_PREFIX}:stats:miss'])
+
+
+def anonymous_page_cache(view_func):
+    """
+    视图装饰器：为匿名 GET 请求缓存完整的响应内容。
+    视图可在响应上设置 `page_cache_post_id`，命中缓存时据此继续记录浏览量。
+    """
+    @wraps(view_func)
+    def wrapped(request, *args, **kwargs):
+        if not is_enabled() or not _is_cacheable(request):
+            return view_func(request, *args, **kwargs)
+
+        key = _page_key(request)
+        entry = cache.get(key)
+        if entry is not None:
+            _count('hit')
+            if entry['post_id']:
+                view_counter.record_view(entry['post_id'])
+            response = HttpResponse(entry['content'], content_type=entry['content_type'])
+            # 与未命中时的响应一致：内容取决于是否登录，下游缓存需按 Cookie 区分
+            patch_vary_headers(response, ['Cookie'])
+            response['X-Page-Cache'] = 'HIT'
+            return response
+
+        _count('miss')
+        response = view_func(request, *args, **kwargs)
+        if hasattr(response, 'render') and callable(response.render):
+            response = response.render()
+        if response.status_code == 200 and not response.streaming:
+            cache.set(key, {
+                'content': response.content,
+                'content_type': response['Content-Type'],
+                'post_id': getattr(response, 'page_cache_post_id', None),
+            }, _timeout())
+        response['X-Page-Cache'] = 'MISS'
+        return response
+
+    return wrapped
+
+
+def purge_paths(paths):
+    for path in set(paths):
+        _bump(_path_version_key(path))
+
+
+def purge_all():
+    _bump(GLOBAL_VERSION_KEY)
+
+
+def post_paths(post, author_username=None):
+    """展示某篇文章的全部页面路径：详情页、分类页、作者页、文章列表页与首页。"""
+    paths = [post.get_absolute_url(), reverse('home'), reverse('blog:post_list')]
+    if post.category_id:
+        paths.append(post.category.get_absolute_url())
+    paths.append(reverse('blog:author_posts', args=[author_username or post.author.username]))
+    return paths
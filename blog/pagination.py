@@ -0,0 +1,144 @@
+"""
+文章列表的游标（keyset）分页。
+
+按 `(publish, id)` 这样的复合键倒序排列，翻页时以上一页首/尾记录的键值作为游标，
+用 `WHERE (publish, id) < (...)` 直接定位，不再需要 `OFFSET n` 扫描和每页一次的 `COUNT(*)`。
+总数只用于展示，取自带过期时间的缓存，是一个近似值。
+原有的 `?page=N` 网址仍然有效，以普通的 LIMIT/OFFSET 查询返回对应页。
+"""
+import base64
+import hashlib
+import json
+import math
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.http import Http404
+
+
+def _count_timeout():
+    return getattr(settings, 'PAGINATION_COUNT_CACHE_TIMEOUT', 60)
+
+
+class CachedCountPaginator:
+    """只提供总数与总页数的轻量分页器，总数按查询语句缓存。"""
+
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset
+        self.per_page = per_page
+        self._count = None
+
+    @property
+    def count(self):
+        if self._count is None:
+            sql = str(self.queryset.order_by().query)
+            key = f'blog:pagination:count:{hashlib.md5(sql.encode()).hexdigest()}'
+            self._count = cache.get_or_set(key, self.queryset.count, _count_timeout())
+        return self._count
+
+    @property
+    def num_pages(self):
+        return max(1, math.ceil(self.count / self.per_page))
+
+
+class KeysetPage:
+    def __init__(self, object_list, number, paginator, has_next, has_previous, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.number = number
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+
+class KeysetPaginationMixin:
+    """
+    ListView 混入类：以 `keyset_fields` 指定的字段倒序分页。
+    最后一个字段必须唯一（通常是 id），以保证游标的定位是确定的。
+    """
+    keyset_fields = ('publish', 'id')
+    cursor_kwarg = 'cursor'
+
+    def _encode_cursor(self, obj, direction, number):
+        # 不使用 DjangoJSONEncoder：它会把时间截断到毫秒，导致游标定位不准
+        values = [getattr(obj, field) for field in self.keyset_fields]
+        values = [value.isoformat() if hasattr(value, 'isoformat') else value for value in values]
+        raw = json.dumps([direction, number, values])
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def _decode_cursor(self, token):
+        try:
+            raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            direction, number, values = json.loads(raw)
+            if direction not in ('next', 'prev') or len(values) != len(self.keyset_fields):
+                raise ValueError
+            fields = [self.model._meta.get_field(name) for name in self.keyset_fields]
+            values = [field.to_python(value) for field, value in zip(fields, values)]
+            return direction, max(1, int(number)), values
+        except Exception:
+            raise Http404('无效的分页游标。')
+
+    def _seek(self, queryset, values, direction):
+        """构造 (f1, f2, ...) 严格小于（next）或大于（prev）游标值的条件。"""
+        lookup = 'lt' if direction == 'next' else 'gt'
+        condition = Q()
+        for i, field in enumerate(self.keyset_fields):
+            equal = {name: value for name, value in zip(self.keyset_fields[:i], values[:i])}
+            condition |= Q(**equal, **{f'{field}__{lookup}': values[i]})
+        return queryset.filter(condition)
+
+    def paginate_queryset(self, queryset, page_size):
+        descending = [f'-{field}' for field in self.keyset_fields]
+        ascending = list(self.keyset_fields)
+        paginator = CachedCountPaginator(queryset, page_size)
+
+        token = self.request.GET.get(self.cursor_kwarg)
+        if token:
+            direction, number, values = self._decode_cursor(token)
+            if direction == 'next':
+                rows = list(self._seek(queryset, values, 'next').order_by(*descending)[:page_size + 1])
+                has_next, has_previous = len(rows) > page_size, True
+                rows = rows[:page_size]
+            else:
+                rows = list(self._seek(queryset, values, 'prev').order_by(*ascending)[:page_size + 1])
+                has_next, has_previous = True, len(rows) > page_size
+                rows = rows[:page_size][::-1]
+        else:
+            page = self.request.GET.get(self.page_kwarg) or 1
+            try:
+                # 与 Django 的分页器一样接受 ?page=last
+                number = paginator.num_pages if page == 'last' else int(page)
+            except (TypeError, ValueError):
+                raise Http404('无效的页码。')
+            if number < 1:
+                raise Http404('无效的页码。')
+            offset = (number - 1) * page_size
+            rows = list(queryset.order_by(*descending)[offset:offset + page_size + 1])
+            if not rows and number > 1:
+                raise Http404('该页没有内容。')
+            has_next, has_previous = len(rows) > page_size, number > 1
+            rows = rows[:page_size]
+
+        page_obj = KeysetPage(
+            rows, number, paginator, has_next, has_previous,
+            next_cursor=self._encode_cursor(rows[-1], 'next', number + 1) if has_next and rows else None,
+            previous_cursor=self._encode_cursor(rows[0], 'prev', number - 1) if has_previous and rows else None,
+        )
+        return paginator, page_obj, rows, page_obj.has_other_pages()
@@ -0,0 +1,262 @@
+"""
+基于内容相似度的相关文章。
+
+每篇已发布文章被表示为一个 TF-IDF 稀疏向量（只保留权重最高的 `MAX_TERMS` 个词，存于 PostTerm 表），
+两篇文章的相似度为向量点积（余弦相似度），由数据库按共同的词做连接求和得到。
+每篇文章的前 K 个相似文章写入 RelatedPost 表，详情页只需一次索引查询即可读取。
+
+- 文章保存后由 `blog.signals` 调用 `schedule_update`，在后台增量更新该文章的向量和相关文章，
+  并把它合并进（或移出）其他文章的相关列表。相似度计算需要按共同的词连接整张词表，
+  默认放在本进程的后台线程中执行，不占用编辑者的请求（RELATED_POSTS_MODE）；
+- `rebuild_related_posts` 命令分批全量重建（重新统计词频，并刷新所有文章的相关列表）。
+  增量更新不会为其他文章补上因本文修改而空出的名次，进程重启时排队中的更新也会丢失，
+  因此仍需定期运行该命令。
+"""
+import logging
+import math
+import re
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Count, Q
+
+from .utils import CJK_CHARACTER_CLASS, html_to_text
+
+# 每篇文章保留的词数
+MAX_TERMS = 64
+# 出现在超过该比例文章中的词区分度太低，不参与计算
+MAX_DF_RATIO = 0.5
+# 标题中的词权重放大倍数
+TITLE_WEIGHT = 3
+
+_latin_re = re.compile(r'[a-z0-9][a-z0-9_+#.-]*[a-z0-9+#]|[a-z0-9]')
+_cjk_run_re = re.compile(CJK_CHARACTER_CLASS + '+')
+_stopwords = frozenset(
+    'a an and are as at be by for from has have in is it its of on or that the this to was were will with'.split()
+)
+
+
+# 合并到其他文章的相关列表时，每次读取的列表数
+_MERGE_CHUNK = 500
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _top_k():
+    return getattr(settings, 'RELATED_POSTS_TOP_K', 5)
+
+
+def _mode():
+    return getattr(settings, 'RELATED_POSTS_MODE', 'thread')
+
+
+def tokenize(text):
+    """英文等按单词切分；中日韩文字按相邻两字（bigram）切分。"""
+    text = text.lower()
+    tokens = [word for word in _latin_re.findall(text) if len(word) > 1 and word not in _stopwords]
+    for run in _cjk_run_re.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return [token[:64] for token in tokens]
+
+
+def term_counts(title, content):
+    counts = Counter(tokenize(html_to_text(content)))
+    for token in tokenize(title):
+        counts[token] += TITLE_WEIGHT
+    return counts
+
+
+def build_vector(counts, document_frequency, total_documents):
+    """根据词频和文档频率计算归一化的 TF-IDF 向量，只保留权重最高的词。"""
+    max_df = max(1, total_documents * MAX_DF_RATIO)
+    weights = {}
+    for term, count in counts.items():
+        df = document_frequency.get(term, 0)
+        if total_documents > 2 and df > max_df:
+            continue
+        idf = math.log((total_documents + 1) / (df + 1)) + 1
+        weights[term] = (1 + math.log(count)) * idf
+
+    top = sorted(weights.items(), key=lambda item: item[1], reverse=True)[:MAX_TERMS]
+    norm = math.sqrt(sum(weight * weight for _, weight in top)) or 1.0
+    return {term: weight / norm for term, weight in top}
+
+
+def _similarities(post_ids):
+    """在数据库中按共同词求点积，返回 {post_id: [(related_id, score), ...]}（按得分降序）。"""
+    from .models import Post, PostTerm
+
+    if not post_ids:
+        return {}
+    term_table = PostTerm._meta.db_table
+    post_table = Post._meta.db_table
+    placeholders = ', '.join(['%s'] * len(post_ids))
+    sql = (
+        f"SELECT a.post_id, b.post_id, SUM(a.weight * b.weight) AS score "
+        f"FROM {term_table} a "
+        f"INNER JOIN {term_table} b ON b.term = a.term AND b.post_id <> a.post_id "
+        f"INNER JOIN {post_table} p ON p.id = b.post_id AND p.status = 'published' "
+        f"WHERE a.post_id IN ({placeholders}) "
+        f"GROUP BY a.post_id, b.post_id"
+    )
+    results = {pk: [] for pk in post_ids}
+    with connection.cursor() as cursor:
+        cursor.execute(sql, list(post_ids))
+        for post_id, related_id, score in cursor.fetchall():
+            results[post_id].append((related_id, score))
+    for candidates in results.values():
+        candidates.sort(key=lambda item: (-item[1], -item[0]))
+    return results
+
+
+def _write_neighbors(similarities, top_k):
+    from .models import RelatedPost
+
+    rows = []
+    for post_id, candidates in similarities.items():
+        rows.extend(
+            RelatedPost(post_id=post_id, related_id=related_id, score=score, rank=rank)
+            for rank, (related_id, score) in enumerate(candidates[:top_k])
+        )
+    RelatedPost.objects.filter(post_id__in=list(similarities)).delete()
+    RelatedPost.objects.bulk_create(rows)
+
+
+def _merge_into_neighbors(post_id, scores, top_k):
+    """
+    把文章合并进其他文章的相关列表：已列出该文章的列表更新其得分（不再相似时移除），
+    与它有共同词的文章在它能排进前 K 名时加入。scores 为 {其他文章 ID: 相似度}。
+    """
+    from .models import RelatedPost
+
+    affected = set(RelatedPost.objects.filter(related_id=post_id).values_list('post_id', flat=True))
+    affected.update(scores)
+    affected = sorted(affected)
+    for start in range(0, len(affected), _MERGE_CHUNK):
+        chunk = affected[start:start + _MERGE_CHUNK]
+        current = {pk: [] for pk in chunk}
+        entries = RelatedPost.objects.filter(post_id__in=chunk).order_by('post_id', 'rank')
+        for owner, related_id, score in entries.values_list('post_id', 'related_id', 'score'):
+            current[owner].append((related_id, score))
+        changed = {}
+        for owner, neighbors in current.items():
+            merged = [entry for entry in neighbors if entry[0] != post_id]
+            if scores.get(owner):
+                merged.append((post_id, scores[owner]))
+            merged.sort(key=lambda item: (-item[1], -item[0]))
+            if merged[:top_k] != neighbors:
+                changed[owner] = merged
+        _write_neighbors(changed, top_k)
+
+
+def update_post(post):
+    """增量更新单篇文章的词向量和相关文章列表（文档频率取自现有 PostTerm 表），并合并进其他文章的列表。"""
+    from .models import Post, PostTerm, RelatedPost
+
+    with transaction.atomic():
+        PostTerm.objects.filter(post=post).delete()
+        if post.status != 'published':
+            RelatedPost.objects.filter(Q(post=post) | Q(related=post)).delete()
+            return
+
+        counts = term_counts(post.title, post.content)
+        total = Post.objects.filter(status='published').count()
+        document_frequency = dict(
+            PostTerm.objects.filter(term__in=list(counts))
+            .order_by()
+            .values_list('term')
+            .annotate(n=Count('pk'))
+        )
+        vector = build_vector(counts, document_frequency, total)
+        PostTerm.objects.bulk_create(PostTerm(post=post, term=term, weight=weight) for term, weight in vector.items())
+        top_k = _top_k()
+        similarities = _similarities([post.pk])
+        _write_neighbors(similarities, top_k)
+        _merge_into_neighbors(post.pk, dict(similarities[post.pk]), top_k)
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # 单个工作线程：更新按提交顺序依次执行，也不会同时占用多个数据库连接
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='related-posts')
+        return _executor
+
+
+def _update_by_id(post_id):
+    from .models import Post
+    post = Post.objects.filter(pk=post_id).first()
+    if post is not None:
+        update_post(post)
+
+
+def _run_in_thread(post_id):
+    close_old_connections()
+    try:
+        _update_by_id(post_id)
+    except Exception:
+        logger.exception('相关文章更新失败：%s', post_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_update(post_id):
+    """
+    在事务提交后更新文章的相关文章。处理方式由 RELATED_POSTS_MODE 决定：
+    thread（默认）交给本进程的后台线程；sync 在请求中执行；manual 不做增量更新，只靠定期全量重建。
+    """
+    mode = _mode()
+    if mode == 'thread':
+        transaction.on_commit(lambda: _get_executor().submit(_run_in_thread, post_id))
+    elif mode == 'sync':
+        transaction.on_commit(lambda: _update_by_id(post_id))
+
+
+def rebuild_all(batch_size=200, stdout=None):
+    """分批全量重建所有已发布文章的词向量与相关文章，返回处理的文章数。"""
+    from .models import Post, PostTerm, RelatedPost
+
+    published = Post.objects.filter(status='published').order_by('pk')
+    rows = published.values_list('pk', 'title', 'content')
+
+    # 第一遍：统计文档频率
+    document_frequency = Counter()
+    total = 0
+    for _, title, content in rows.iterator(chunk_size=batch_size):
+        document_frequency.update(term_counts(title, content).keys())
+        total += 1
+
+    # 第二遍：计算并写入词向量
+    with transaction.atomic():
+        PostTerm.objects.all().delete()
+        batch = []
+        for pk, title, content in rows.iterator(chunk_size=batch_size):
+            vector = build_vector(term_counts(title, content), document_frequency, total)
+            batch.extend(PostTerm(post_id=pk, term=term, weight=weight) for term, weight in vector.items())
+            if len(batch) >= batch_size * MAX_TERMS:
+                PostTerm.objects.bulk_create(batch, batch_size=1000)
+                batch = []
+        PostTerm.objects.bulk_create(batch, batch_size=1000)
+    del document_frequency
+
+    # 第三遍：分批计算相关文章
+    top_k = _top_k()
+    RelatedPost.objects.exclude(post__status='published').delete()
+    post_ids = list(published.values_list('pk', flat=True))
+    for start in range(0, len(post_ids), batch_size):
+        chunk = post_ids[start:start + batch_size]
+        with transaction.atomic():
+            _write_neighbors(_similarities(chunk), top_k)
+        if stdout:
+            stdout.write(f'已计算 {min(start + batch_size, len(post_ids))}/{len(post_ids)} 篇...')
+    return total
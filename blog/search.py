@@ -0,0 +1,254 @@
+"""
+基于 SQLite FTS5 的文章全文检索。
+
+索引表 `blog_post_fts` 以文章 ID 作为 rowid，只收录已发布文章去除 HTML 标签后的标题与正文，
+由 `blog.signals` 在文章保存/删除时同步维护，`rebuild_search_index` 命令可整体重建。
+使用 trigram 分词器，中文等不以空格分词的文本也能按子串匹配。
+
+trigram 只能匹配长度 >= 3 的词，而两个字的中文词是最常见的检索词，因此另建一张
+`blog_post_fts_short` 表，收录文本中相邻两个字组成的词（"性能优化" -> "性能 能优 优化"），
+两个字的检索词在这张表上同样走索引。只有单个字的词退化为 LIKE 匹配，
+并且有其他词时只在其他词已命中的文章中匹配。
+"""
+import re
+
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .utils import CJK_CHARACTER_CLASS, html_to_text
+
+FTS_TABLE = 'blog_post_fts'
+FTS_SHORT_TABLE = 'blog_post_fts_short'
+# trigram 分词器只能匹配长度 >= 3 的词，两个字的词查两字词索引，更短的词退化为对纯文本列的 LIKE 匹配
+MIN_TERM_LENGTH = 3
+# 标题命中的权重高于正文
+BM25_WEIGHTS = (10.0, 1.0)
+
+_HIGHLIGHT_START = '\x02'
+_HIGHLIGHT_END = '\x03'
+# 两字词只取自字母、数字组成的连续片段（与 unicode61 分词器的词字符一致，不含下划线）
+_WORD_RUN = re.compile(r'[^\W_]+')
+_CJK_RUN = re.compile(CJK_CHARACTER_CLASS + '+$')
+
+
+def is_supported(using='default'):
+    return connections[using].vendor == 'sqlite'
+
+
+def bigrams(text):
+    """把文本切成相互重叠的两字词，以空格分隔。"""
+    words = []
+    for run in _WORD_RUN.findall(text.lower()):
+        words.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return ' '.join(words)
+
+
+def sample_terms(post):
+    """
+    从文章中取出有代表性的搜索词（供基准测试和查询计划检查使用）：
+    返回 (走 trigram 索引的长词, 走两字词索引的中文词)，取不到的为 None。
+    """
+    words = _WORD_RUN.findall(html_to_text(f'{post.title} {post.content}'))
+    long_term = next((word for word in words if len(word) >= MIN_TERM_LENGTH), None)
+    short_term = next((word[:2] for word in words if len(word) >= 2 and _CJK_RUN.match(word)), None)
+    return long_term, short_term
+
+
+def _rows(pk, title, body):
+    """一篇文章在两张索引表中的行。"""
+    return (pk, title, body), (pk, bigrams(title), bigrams(body))
+
+
+def create_index(using='default', **kwargs):
+    """创建 FTS5 虚拟表（已存在时跳过）。作为 post_migrate 信号的处理函数使用。"""
+    if not is_supported(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+            f"USING fts5(title, body, tokenize='trigram')"
+        )
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_SHORT_TABLE} "
+            f"USING fts5(title, body, tokenize='unicode61 remove_diacritics 0')"
+        )
+
+
+def _insert(cursor, rows):
+    cursor.executemany(f"INSERT INTO {FTS_TABLE} (rowid, title, body) VALUES (%s, %s, %s)", [r[0] for r in rows])
+    cursor.executemany(f"INSERT INTO {FTS_SHORT_TABLE} (rowid, title, body) VALUES (%s, %s, %s)", [r[1] for r in rows])
+
+
+def index_post(post, using='default'):
+    """同步单篇文章：已发布则写入/覆盖索引，否则从索引中移除。"""
+    if not is_supported(using):
+        return
+    with connections[using].cursor() as cursor:
+        for table in (FTS_TABLE, FTS_SHORT_TABLE):
+            cursor.execute(f"DELETE FROM {table} WHERE rowid = %s", [post.pk])
+        if post.status == 'published':
+            _insert(cursor, [_rows(post.pk, post.title, html_to_text(post.content))])
+
+
+def remove_post(post_id, using='default'):
+    if not is_supported(using):
+        return
+    with connections[using].cursor() as cursor:
+        for table in (FTS_TABLE, FTS_SHORT_TABLE):
+            cursor.execute(f"DELETE FROM {table} WHERE rowid = %s", [post_id])
+
+
+def rebuild_index(batch_size=500, using='default'):
+    """清空并批量重建索引，返回收录的文章数。"""
+    from .models import Post
+
+    create_index(using)
+    rows = (
+        Post.objects.using(using)
+        .filter(status='published')
+        .order_by()
+        .values_list('pk', 'title', 'content')
+    )
+    total = 0
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        for table in (FTS_TABLE, FTS_SHORT_TABLE):
+            cursor.execute(f"DELETE FROM {table}")
+        batch = []
+        for pk, title, content in rows.iterator(chunk_size=batch_size):
+            batch.append(_rows(pk, title, html_to_text(content)))
+            if len(batch) >= batch_size:
+                _insert(cursor, batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            _insert(cursor, batch)
+            total += len(batch)
+        # 合并索引段，提升后续查询速度
+        for table in (FTS_TABLE, FTS_SHORT_TABLE):
+            cursor.execute(f"INSERT INTO {table} ({table}) VALUES ('optimize')")
+    return total
+
+
+def _highlight(snippet):
+    """转义片段中的 HTML，再把高亮标记替换为 <mark> 标签。"""
+    text = escape(snippet)
+    return mark_safe(text.replace(_HIGHLIGHT_START, '<mark>').replace(_HIGHLIGHT_END, '</mark>'))
+
+
+class SearchResults:
+    """
+    惰性的检索结果集，实现了 Paginator 所需的 count() 与切片接口，
+    统计与取页都在索引上以 LIMIT/OFFSET 完成。
+    """
+
+    def __init__(self, query, using='default'):
+        self.query = query
+        self.using = using
+        self.terms = query.split()
+        self._count = None
+
+    @staticmethod
+    def _phrases(terms):
+        # 每个词用双引号包裹为短语，避免用户输入被解析为 FTS5 查询语法
+        return ' '.join('"{}"'.format(term.replace('"', '""')) for term in terms)
+
+    def _query(self):
+        """
+        返回 (FROM 子句, WHERE 子句, 参数, 用于排序的索引表)。
+        长词在 trigram 表上 MATCH，两个字的词在两字词表上 MATCH，两张表按 rowid 连接；
+        单个字的词在已命中的行上做 LIKE 匹配（只有单字词时才需要扫描整张表）。
+        """
+        long_terms = [term for term in self.terms if len(term) >= MIN_TERM_LENGTH]
+        short_terms = [bigrams(term) for term in self.terms if len(term) < MIN_TERM_LENGTH and bigrams(term)]
+        like_terms = [term for term in self.terms if len(term) < MIN_TERM_LENGTH and not bigrams(term)]
+
+        tables, clauses, params = [], [], []
+        if long_terms:
+            tables.append(FTS_TABLE)
+            clauses.append(f"{FTS_TABLE} MATCH %s")
+            params.append(self._phrases(long_terms))
+        if short_terms:
+            tables.append(FTS_SHORT_TABLE)
+            clauses.append(f"{FTS_SHORT_TABLE} MATCH %s")
+            params.append(self._phrases(short_terms))
+        ranked = tables[0] if tables else None
+        if like_terms and FTS_TABLE not in tables:
+            tables.append(FTS_TABLE)
+        for term in like_terms:
+            pattern = '%{}%'.format(term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_'))
+            clauses.append(
+                f"({FTS_TABLE}.title LIKE %s ESCAPE '\\' OR {FTS_TABLE}.body LIKE %s ESCAPE '\\')"
+            )
+            params.extend([pattern, pattern])
+
+        main = tables[0]
+        joins = ''.join(f" JOIN {table} ON {table}.rowid = {main}.rowid" for table in tables[1:])
+        return f"{main}{joins}", ' AND '.join(clauses), params, ranked
+
+    def count(self):
+        if self._count is None:
+            if not self.terms:
+                self._count = 0
+                return 0
+            tables, where, params, _ = self._query()
+            with connections[self.using].cursor() as cursor:
+                cursor.execute(f"SELECT COUNT(*) FROM {tables} WHERE {where}", params)
+                self._count = cursor.fetchone()[0]
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        from .models import Post
+
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        offset = key.start or 0
+        limit = (key.stop if key.stop is not None else self.count()) - offset
+        if limit <= 0 or not self.terms:
+            return []
+
+        tables, where, params, ranked = self._query()
+        main = ranked or FTS_TABLE
+        if ranked == FTS_TABLE:
+            columns = (
+                f"{main}.rowid, snippet({FTS_TABLE}, 1, '{_HIGHLIGHT_START}', '{_HIGHLIGHT_END}', '…', 32)"
+            )
+        else:
+            # 两字词表中的文本是拆开的两字词，不适合做摘要片段
+            columns = f"{main}.rowid, NULL"
+        if ranked:
+            order = f"bm25({ranked}, {BM25_WEIGHTS[0]}, {BM25_WEIGHTS[1]})"
+        else:
+            order = f"{main}.rowid DESC"
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(
+                f"SELECT {columns} FROM {tables} WHERE {where} ORDER BY {order} LIMIT %s OFFSET %s",
+                params + [limit, offset],
+            )
+            rows = cursor.fetchall()
+
+        posts = Post.objects.using(self.using).filter(status='published').defer('content').in_bulk([pk for pk, _ in rows])
+        results = []
+        for pk, snippet in rows:
+            post = posts.get(pk)
+            if post is None:
+                continue
+            post.search_snippet = _highlight(snippet) if snippet else ''
+            results.append(post)
+        return results
+
+
+def search_posts(query, using='default'):
+    """返回可直接交给 Paginator 的检索结果；非 SQLite 数据库退化为 icontains 查询。"""
+    if is_supported(using):
+        return SearchResults(query, using)
+
+    from .models import Post
+    return Post.objects.using(using).filter(
+        Q(title__icontains=query) | Q(content__icontains=query),
+        status='published'
+    ).defer('content').order_by('-publish')
@@ -0,0 +1,76 @@
+"""
+侧边栏数据（分类文章数、热门文章）的版本化缓存。
+
+缓存键中带有一个“代数”（generation），文章或分类发生保存/删除时由 `blog.signals`
+递增代数，旧代数下的缓存条目自然失效，无需逐个删除。
+对外提供的都是惰性对象，只有模板真正渲染侧边栏时才会读取缓存或查询数据库。
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+
+GENERATION_KEY = 'blog:sidebar:generation'
+POPULAR_POSTS_LIMIT = 5
+
+
+def _timeout():
+    return getattr(settings, 'SIDEBAR_CACHE_TIMEOUT', 300)
+
+
+def get_generation():
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        # 代数键被淘汰后用时间戳重新起算，避免与旧缓存条目的代数重合
+        cache.add(GENERATION_KEY, int(time.time() * 1000), timeout=None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def bump_generation():
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, int(time.time() * 1000), timeout=None)
+
+
+def _cached(name, build):
+    key = f'blog:sidebar:{name}:{get_generation()}'
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, _timeout())
+    return value
+
+
+def get_categories():
+    """按已发布文章数量排序的全部分类。"""
+    from .models import Category
+    return _cached('categories', lambda: list(
+        Category.objects.order_by('-published_post_count', 'name')
+    ))
+
+
+def get_popular_posts():
+    """热门文章：读取定时计算的热门排行，排行尚未生成时退回按总浏览量排序。"""
+    from .models import Post, TrendingPost
+
+    def build():
+        # 排行表只有 TRENDING_SIZE 行，按排名顺序读取后再剔除已撤回的文章，查询可直接沿排名索引进行
+        entries = TrendingPost.objects.select_related('post').defer('post__content').order_by('rank')
+        posts = [entry.post for entry in entries if entry.post.status == 'published'][:POPULAR_POSTS_LIMIT]
+        if posts:
+            return posts
+        return list(
+            Post.objects.filter(status='published').defer('content').order_by('-views')[:POPULAR_POSTS_LIMIT]
+        )
+    return _cached('popular_posts', build)
+
+
+def lazy_categories(limit=None):
+    return SimpleLazyObject(lambda: get_categories()[:limit])
+
+
+def lazy_popular_posts(limit=POPULAR_POSTS_LIMIT):
+    return SimpleLazyObject(lambda: get_popular_posts()[:limit])
@@ -0,0 +1,210 @@
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+from django.urls import reverse
+from .models import Post, Category, Comment
+from . import feeds, media_store, page_cache, related, search, sidebar, sitemaps
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous_state(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    记录文章保存前在数据库中的分类、作者、状态、网址与特色图片，
+    供 post_save 调整计数器、清理页面缓存和删除被替换的图片。
+    """
+    instance._previous_state = None
+    if raw or instance._state.adding or not instance.pk:
+        return
+    if update_fields and not {'category', 'author', 'status', 'slug', 'publish', 'image'} & set(update_fields):
+        return
+    instance._previous_state = (
+        Post.objects.filter(pk=instance.pk)
+        .values('category_id', 'author_id', 'status', 'slug', 'publish', 'image')
+        .first()
+    )
+
+
+def _adjust_category_count(category_id, delta):
+    if category_id is None or delta == 0:
+        return
+    queryset = Category.objects.filter(pk=category_id)
+    if delta < 0:
+        queryset = queryset.filter(published_post_count__gte=-delta)
+    queryset.update(published_post_count=F('published_post_count') + delta)
+
+
+@receiver(post_save, sender=Post)
+def update_category_counts(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if created:
+        previous = None
+    else:
+        previous = getattr(instance, '_previous_state', None)
+        if previous is None:
+            return
+
+    old_category = previous['category_id'] if previous and previous['status'] == 'published' else None
+    new_category = instance.category_id if instance.status == 'published' else None
+    if old_category != new_category:
+        _adjust_category_count(old_category, -1)
+        _adjust_category_count(new_category, 1)
+
+
+@receiver(post_delete, sender=Post)
+def decrement_category_count(sender, instance, **kwargs):
+    if instance.status == 'published':
+        _adjust_category_count(instance.category_id, -1)
+
+
+@receiver(post_save, sender=Post)
+def update_media_references(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """同步文章对按内容保存的图片的引用，维护各文件的引用数。"""
+    if raw or (update_fields and not {'image', 'content'} & set(update_fields)):
+        return
+    media_store.sync_post(instance, created)
+
+
+@receiver(pre_delete, sender=Post)
+def remember_media_references(sender, instance, **kwargs):
+    # 引用记录随文章级联删除，先记下涉及的文件，删除后再重新计算引用数
+    instance._media_blob_ids = media_store.blob_ids(instance)
+
+
+@receiver(post_delete, sender=Post)
+def release_media_references(sender, instance, **kwargs):
+    media_store.recount(getattr(instance, '_media_blob_ids', None))
+
+
+def _delete_image_on_commit(name):
+    # 按内容保存的文件可能被其他文章共用，由 cleanup_files 按引用数清理
+    if name and not media_store.is_managed(name):
+        transaction.on_commit(lambda: default_storage.delete(name))
+
+
+@receiver(post_save, sender=Post)
+def delete_replaced_image(sender, instance, raw=False, **kwargs):
+    previous = getattr(instance, '_previous_state', None)
+    if raw or not previous or previous['image'] == instance.image.name:
+        return
+    _delete_image_on_commit(previous['image'])
+
+
+@receiver(post_delete, sender=Post)
+def delete_post_image(sender, instance, **kwargs):
+    _delete_image_on_commit(instance.image.name)
+
+
+@receiver(post_save, sender=Post)
+def update_search_index(sender, instance, raw=False, update_fields=None, **kwargs):
+    # 只更新浏览量等与检索无关的字段时，无需重建该文章的索引
+    if raw or (update_fields and not {'title', 'content', 'status'} & set(update_fields)):
+        return
+    search.index_post(instance, using=kwargs.get('using', 'default'))
+
+
+@receiver(post_save, sender=Post)
+def update_related_posts(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields and not {'title', 'content', 'status'} & set(update_fields)):
+        return
+    related.schedule_update(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def remove_from_search_index(sender, instance, **kwargs):
+    search.remove_post(instance.pk, using=kwargs.get('using', 'default'))
+
+
+# 侧边栏展示的文章字段（分类文章数取决于状态与分类，热门文章展示标题和链接、按浏览量排序）
+SIDEBAR_FIELDS = {'title', 'slug', 'publish', 'status', 'category', 'views'}
+
+
+@receiver([post_save, post_delete], sender=Post)
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_sidebar_cache(sender, update_fields=None, **kwargs):
+    # 只更新图片、正文等侧边栏不展示的字段时无需失效
+    if sender is Post and update_fields and not SIDEBAR_FIELDS & set(update_fields):
+        return
+    # 提交后再递增代数，避免并发请求在提交前把旧数据缓存到新代数下
+    transaction.on_commit(sidebar.bump_generation)
+
+
+@receiver(post_save, sender=Post)
+def invalidate_feeds_on_save(sender, instance, raw=False, **kwargs):
+    # 发布或修改会更新 MAX(updated)，订阅源自然换用新缓存；撤回发布、更换分类或作者则需要显式失效
+    previous = getattr(instance, '_previous_state', None)
+    if raw or not previous or previous['status'] != 'published':
+        return
+    if (
+        instance.status != 'published'
+        or previous['category_id'] != instance.category_id
+        or previous['author_id'] != instance.author_id
+    ):
+        transaction.on_commit(feeds.bump_generation)
+
+
+@receiver(post_delete, sender=Post)
+def invalidate_feeds_on_delete(sender, instance, **kwargs):
+    if instance.status == 'published':
+        transaction.on_commit(feeds.bump_generation)
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_category_feeds(sender, raw=False, **kwargs):
+    # 分类名称出现在分类订阅源的标题中
+    if not raw:
+        transaction.on_commit(feeds.bump_generation)
+
+
+# sitemap 中列出的文章字段（网址取决于 slug 和发布日期，lastmod 取自修改时间）
+SITEMAP_FIELDS = {'status', 'slug', 'publish', 'updated'}
+
+
+@receiver([post_save, post_delete], sender=Post)
+def invalidate_sitemap(sender, raw=False, update_fields=None, **kwargs):
+    # 只更新图片、浏览量等字段时修改时间不会写入数据库，分片索引无需失效
+    if raw or (update_fields and not SITEMAP_FIELDS & set(update_fields)):
+        return
+    transaction.on_commit(sitemaps.bump_generation)
+
+
+@receiver([post_save, post_delete], sender=Post)
+def purge_post_pages(sender, instance, raw=False, **kwargs):
+    if raw or not page_cache.is_enabled():
+        return
+    paths = page_cache.post_paths(instance)
+    previous = getattr(instance, '_previous_state', None)
+    if previous:
+        # 文章网址、分类或作者发生变化时，旧的详情页、旧分类页和原作者的文章页也要一并失效
+        old = Post(
+            slug=previous['slug'], publish=previous['publish'],
+            category_id=previous['category_id'], author_id=previous['author_id'],
+        )
+        paths.append(old.get_absolute_url())
+        if previous['category_id'] and previous['category_id'] != instance.category_id:
+            paths.append(old.category.get_absolute_url())
+        if previous['author_id'] != instance.author_id:
+            paths.append(reverse('blog:author_posts', args=[old.author.username]))
+    # 提交后再失效，避免并发请求在提交前把旧内容重新写入缓存
+    transaction.on_commit(lambda: page_cache.purge_paths(paths))
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def purge_comment_pages(sender, instance, raw=False, origin=None, **kwargs):
+    if raw or not page_cache.is_enabled():
+        return
+    # 级联删除时只需由发起删除的对象（文章或顶层评论）清理一次
+    if origin is not None and origin is not instance:
+        return
+    path = instance.post.get_absolute_url()
+    transaction.on_commit(lambda: page_cache.purge_paths([path]))
+
+
+@receiver([post_save, post_delete], sender=Category)
+def purge_all_pages(sender, raw=False, **kwargs):
+    # 每个页面的侧边栏都展示分类列表
+    if raw or not page_cache.is_enabled():
+        return
+    transaction.on_commit(page_cache.purge_all)
@@ -0,0 +1,121 @@
+"""
+分片的 sitemap.xml。
+
+已发布文章按主键区间切成若干分片（每片最多 `SITEMAP_SHARD_SIZE` 个网址，不超过协议上限 50000），
+`/sitemap.xml` 是分片索引，每个分片位于 `/sitemap-<n>.xml`。
+
+- 每个分片的文章数和最后修改时间由一次按分片分组的聚合查询得到，结果按“代数”缓存，
+  文章保存或删除时由 `blog.signals` 递增代数（与订阅源相同的做法），其余时间索引和分片都不必查询聚合；
+- 分片正文通过 `values_list(...).iterator()` 流式生成，不会把文章对象全部载入内存；
+- 分片正文按索引中该分片的（最后修改时间, 文章数）缓存，分片内的文章被修改、发布、撤回或删除时
+  二者之一必然变化，其他分片的缓存不受影响。
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, Max
+from django.http import Http404, HttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import escape
+
+from .models import Post
+
+GENERATION_KEY = 'blog:sitemap:generation'
+MAX_URLS_PER_SHARD = 50000
+
+
+def _shard_size():
+    return min(getattr(settings, 'SITEMAP_SHARD_SIZE', MAX_URLS_PER_SHARD), MAX_URLS_PER_SHARD)
+
+
+def _timeout():
+    return getattr(settings, 'SITEMAP_CACHE_TIMEOUT', 86400)
+
+
+def _lastmod(value):
+    return timezone.localtime(value).isoformat(timespec='seconds')
+
+
+def get_generation():
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, int(time.time() * 1000), timeout=None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def bump_generation():
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, int(time.time() * 1000), timeout=None)
+
+
+def _published():
+    return Post.objects.filter(status='published').order_by()
+
+
+def _shard_states(size):
+    """各分片编号到（最后修改时间, 文章数）的映射，按分片编号排序。"""
+    key = f'blog:sitemap:index:{size}:{get_generation()}'
+    states = cache.get(key)
+    if states is None:
+        states = {
+            row['shard']: (row['lastmod'], row['count'])
+            for row in (
+                _published()
+                .annotate(shard=F('pk') / size)
+                .values('shard')
+                .annotate(lastmod=Max('updated'), count=Count('pk'))
+                .order_by('shard')
+            )
+        }
+        cache.set(key, states, _timeout())
+    return states
+
+
+def sitemap_index(request):
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">',
+    ]
+    for shard, (lastmod, _) in _shard_states(_shard_size()).items():
+        location = request.build_absolute_uri(reverse('sitemap_shard', args=[shard]))
+        lines.append(
+            f'<sitemap><loc>{escape(location)}</loc><lastmod>{_lastmod(lastmod)}</lastmod></sitemap>'
+        )
+    lines.append('</sitemapindex>')
+    return HttpResponse('\n'.join(lines), content_type='application/xml')
+
+
+def sitemap_shard(request, shard):
+    size = _shard_size()
+    state = _shard_states(size).get(shard)
+    if state is None:
+        raise Http404('该分片中没有文章。')
+
+    lastmod, count = state
+    key = f'blog:sitemap:{request.get_host()}:{size}:{shard}:{lastmod.timestamp():.6f}:{count}'
+    content = cache.get(key)
+    if content is None:
+        posts = _published().filter(pk__gte=shard * size, pk__lt=(shard + 1) * size)
+        content = _render_shard(request, posts)
+        cache.set(key, content, _timeout())
+    return HttpResponse(content, content_type='application/xml')
+
+
+def _render_shard(request, posts):
+    base = request.build_absolute_uri('/')[:-1]
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">',
+    ]
+    rows = posts.order_by('pk').values_list('publish', 'slug', 'updated')
+    for publish, slug, updated in rows.iterator(chunk_size=2000):
+        local = timezone.localtime(publish)
+        path = reverse('blog:post_detail', args=[local.year, local.month, local.day, slug])
+        lines.append(f'<url><loc>{escape(base + path)}</loc><lastmod>{_lastmod(updated)}</lastmod></url>')
+    lines.append('</urlset>')
+    return '\n'.join(lines)
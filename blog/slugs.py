@@ -0,0 +1,91 @@
+"""
+文章 Slug 的分配。
+
+同一天发布的文章 Slug 不能重复（由数据库唯一约束 `(publish_date, slug)` 保证）。
+冲突时在基础 Slug 后追加最小的可用序号 `-1`、`-2`……，已占用的序号通过一次前缀查询取得，
+不再逐个序号地查询是否存在。
+"""
+import re
+from collections import defaultdict
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.text import slugify
+
+# 为 "-序号" 后缀预留的长度
+_SUFFIX_RESERVE = 10
+# 批量分配时，每次前缀查询包含的基础 Slug 数量
+_PREFIX_CHUNK = 100
+
+
+def publish_date(post):
+    """文章网址中使用的（本地时区的）发布日期。"""
+    return timezone.localdate(post.publish) if timezone.is_aware(post.publish) else post.publish.date()
+
+
+def _max_base_length():
+    from .models import Post
+    return Post._meta.get_field('slug').max_length - _SUFFIX_RESERVE
+
+
+def _fit(base):
+    """截短基础 Slug，为 "-序号" 后缀留出长度。"""
+    return base[:_max_base_length()].strip('-') or 'post'
+
+
+def base_slug(post):
+    # 已有（或手工填写）的 Slug 原样保留，只有需要追加序号时才截短；由标题生成时直接截短
+    return post.slug or _fit(slugify(post.title) or 'post')
+
+
+def _next_free(base, taken):
+    if base not in taken:
+        return base
+    base = _fit(base)
+    pattern = re.compile(rf'^{re.escape(base)}-(\d+)$')
+    used = {int(match.group(1)) for match in map(pattern.match, taken) if match}
+    counter = 1
+    while counter in used:
+        counter += 1
+    return f'{base}-{counter}'
+
+
+def allocate_slug(post, base=None):
+    """为单篇文章分配当天唯一的 Slug（一次前缀查询）。"""
+    from .models import Post
+
+    base = base or base_slug(post)
+    # 按截短后的前缀查询，追加序号时截短的基础 Slug 也在结果之内
+    queryset = Post.objects.filter(publish_date=publish_date(post), slug__startswith=_fit(base))
+    if post.pk:
+        queryset = queryset.exclude(pk=post.pk)
+    return _next_free(base, set(queryset.values_list('slug', flat=True)))
+
+
+def allocate_slugs(posts):
+    """
+    为一批（尚未保存的）文章分配 Slug，并同时设置 publish_date。
+    已占用的 Slug 按每 100 个基础 Slug 一次查询取得，批次内部的重复也会被错开。
+    """
+    from .models import Post
+
+    by_date = defaultdict(set)
+    for post in posts:
+        post.publish_date = publish_date(post)
+        post._base_slug = base_slug(post)
+        by_date[post.publish_date].add(post._base_slug)
+
+    pairs = [(day, base) for day, bases in by_date.items() for base in bases]
+    taken = defaultdict(set)
+    for start in range(0, len(pairs), _PREFIX_CHUNK):
+        condition = Q()
+        for day, base in pairs[start:start + _PREFIX_CHUNK]:
+            condition |= Q(publish_date=day, slug__startswith=_fit(base))
+        for day, slug in Post.objects.filter(condition).values_list('publish_date', 'slug'):
+            taken[day].add(slug)
+
+    for post in posts:
+        post.slug = _next_free(post._base_slug, taken[post.publish_date])
+        taken[post.publish_date].add(post.slug)
+        del post._base_slug
+    return posts
@@ -0,0 +1,83 @@
+import re
+
+from django import template
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+
+from blog.image_jobs import ORIGINALS_DIR, source_from_url
+from myblog.image_utils import VARIANT_DIR, VARIANT_FORMATS, image_size, variant_name, variant_plan
+
+register = template.Library()
+
+IMG_TAG = re.compile(r'<img\b[^>]*>', re.IGNORECASE)
+SRC_ATTR = re.compile(r'\ssrc="([^"]+)"', re.IGNORECASE)
+
+
+def _sizes(sizes=None):
+    return sizes or getattr(
+        settings, 'IMAGE_VARIANT_SIZES', '(min-width: 1400px) 870px, (min-width: 992px) 66vw, 100vw'
+    )
+
+
+def _srcsets(name):
+    """返回 {格式: srcset}；原图尚在后台处理或无法读取时返回 None。"""
+    if f'/{ORIGINALS_DIR}/' in f'/{name}' or name.startswith(f'{VARIANT_DIR}/'):
+        return None
+    plan = variant_plan(name)
+    if not plan:
+        return None
+    # 原图不比最大的一档宽时，最大的一档就是原图尺寸，直接使用原图；
+    # 原图更宽时（例如 2560px 的原图、1920px 的最大档）仍使用缩小后的变体
+    original_is_largest = plan[-1][1] == image_size(name)[0]
+    srcsets = {}
+    for fmt in VARIANT_FORMATS:
+        entries = [f'{default_storage.url(variant_name(name, bucket, fmt))} {width}w' for bucket, width in plan]
+        if fmt == 'jpg' and original_is_largest:
+            entries[-1] = f'{default_storage.url(name)} {plan[-1][1]}w'
+        srcsets[fmt] = ', '.join(entries)
+    return srcsets
+
+
+@register.simple_tag
+def responsive_image(image, alt='', css_class='', sizes=None, style='', loading='lazy'):
+    """
+    为 ImageField 输出 <picture>：WebP 与 JPEG 两组按宽度分档的 srcset，浏览器按显示宽度选择。
+    用法：{% responsive_image post.image post.title 'card-img-top' %}
+    首屏大图可传 loading='eager'。
+    """
+    if not image:
+        return ''
+    srcsets = _srcsets(image.name)
+    if srcsets is None:
+        return format_html(
+            '<img src="{}" class="{}" alt="{}" style="{}" loading="{}">', image.url, css_class, alt, style, loading
+        )
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" class="{}" alt="{}" style="{}" loading="{}"></picture>',
+        srcsets['webp'], _sizes(sizes), image.url, srcsets['jpg'], _sizes(sizes), css_class, alt, style, loading,
+    )
+
+
+@register.filter
+def responsive_images(html, sizes=None):
+    """
+    给正文中引用本站媒体文件的 <img> 加上 srcset/sizes，并包一层带 WebP 来源的 <picture>。
+    用法：{{ post.content|responsive_images }}（结果已标记为安全，不必再加 |safe）。
+    """
+    def replace(match):
+        tag = match.group(0)
+        src = SRC_ATTR.search(tag)
+        name = source_from_url(src.group(1)) if src else None
+        if not name or 'srcset=' in tag.lower():
+            return tag
+        srcsets = _srcsets(name)
+        if srcsets is None:
+            return tag
+        img = tag[:-1].rstrip(' /') + format_html(' srcset="{}" sizes="{}"', srcsets['jpg'], _sizes(sizes))
+        img += '>' if 'loading=' in tag.lower() else ' loading="lazy">'
+        return format_html('<picture><source type="image/webp" srcset="{}" sizes="{}">', srcsets['webp'], _sizes(sizes)) + img + '</picture>'
+
+    return mark_safe(IMG_TAG.sub(replace, str(html or '')))
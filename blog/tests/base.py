@@ -0,0 +1,145 @@
+"""
+各应用测试共用的数据工厂和查询预算测试基类。
+"""
+import shutil
+import tempfile
+from io import BytesIO
+from itertools import count
+
+from PIL import Image
+from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from accounts.models import Profile
+from blog import view_counter
+from blog.models import Post, Comment
+
+# 关闭页面缓存和侧边栏缓存，每次请求都真正执行全部查询；浏览量不在请求中写回
+QUERY_BUDGET_SETTINGS = {
+    'CACHES': {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+    'PAGE_CACHE_ENABLED': False,
+    'VIEW_COUNTER_USE_CACHE': False,
+    'VIEW_COUNTER_FLUSH_INTERVAL': 3600,
+    'VIEW_COUNTER_MAX_PENDING': 10 ** 9,
+    'PERFORMANCE_INSTRUMENTATION': False,
+    # 测试中提交回调是在测试事务内执行的，后台线程读不到这些数据
+    'RELATED_POSTS_MODE': 'sync',
+}
+
+_serial = count(1)
+
+
+def make_user():
+    n = next(_serial)
+    user = User.objects.create_user(username=f'user{n}', password='password')
+    # 资料由信号创建，昵称唯一，需要逐个设置（同时更新 user 上缓存的 profile，之后保存 user 时不会被覆盖）
+    user.profile.nickname = f'用户{n}'
+    Profile.objects.filter(user=user).update(nickname=user.profile.nickname)
+    return user
+
+
+def make_png(size=(400, 300)):
+    """生成一张内容随机（不会与其他图片重复）的 PNG 图片，返回其字节。"""
+    buffer = BytesIO()
+    Image.effect_noise(size, 50).convert('RGB').save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def _reset_storage():
+    for attr in ('base_location', 'location'):
+        default_storage.__dict__.pop(attr, None)
+
+
+def use_temp_media(test, **overrides):
+    """
+    在测试期间把 MEDIA_ROOT 切换到临时目录，可同时覆盖其他设置。
+    用户资料的默认头像取自真正的 MEDIA_ROOT，需要在切换之前创建用户。
+    """
+    media_root = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, media_root)
+    settings_override = override_settings(MEDIA_ROOT=media_root, **overrides)
+    settings_override.enable()
+    test.addCleanup(settings_override.disable)
+    # default_storage 缓存了 MEDIA_ROOT，切换前后都要让它重新读取
+    _reset_storage()
+    test.addCleanup(_reset_storage)
+    return media_root
+
+
+def make_post(author, **fields):
+    """创建一篇已发布的文章，未指定的标题、正文取不重复的默认值。"""
+    n = next(_serial)
+    fields.setdefault('title', f'Test post {n}')
+    fields.setdefault('content', f'<p>test content {n}</p>')
+    fields.setdefault('status', 'published')
+    return Post.objects.create(author=author, **fields)
+
+
+def seed_blog(authors, categories, posts_per_author, comments_per_post=0, depth=3, status='published'):
+    """
+    为每位作者生成一批文章，每篇文章带一棵多层评论树（评论者为不同用户）。
+    返回创建的文章列表。
+    """
+    posts = []
+    commenters = [make_user() for _ in range(3)]
+    for author in authors:
+        for _ in range(posts_per_author):
+            n = next(_serial)
+            post = make_post(
+                author,
+                title=f'Query budget post {n}',
+                slug=f'query-budget-post-{n}',
+                content=f'<p>performance tuning notes {n}</p>',
+                status=status,
+                category=categories[n % len(categories)] if categories else None,
+            )
+            posts.append(post)
+            parent = None
+            for i in range(comments_per_post):
+                # 每 depth 条评论组成一条回复链，形成多层嵌套
+                if i % depth == 0:
+                    parent = None
+                parent = Comment.objects.create(
+                    post=post,
+                    user=commenters[i % len(commenters)],
+                    content=f'comment {i}',
+                    parent=parent,
+                )
+    return posts
+
+
+@override_settings(**QUERY_BUDGET_SETTINGS)
+class QueryBudgetTestCase(TestCase):
+    """
+    查询预算测试的基类：统计请求某个页面执行的查询数，
+    检查其不超过预算，并且在数据量增加后保持不变（防止 N+1 查询回归）。
+    """
+
+    def tearDown(self):
+        # 丢弃请求中记录、尚未写回的浏览量，否则进程退出时会写入测试库之外的数据库
+        view_counter._collect()
+        super().tearDown()
+
+    def count_queries(self, url, user=None):
+        if user is not None:
+            self.client.force_login(user)
+        else:
+            self.client.logout()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return len(queries)
+
+    def assertQueryBudget(self, budget, url, grow, user=None):
+        """`grow` 用于追加更多数据，追加前后查询数都不得超过预算且必须相同。"""
+        before = self.count_queries(url, user)
+        self.assertLessEqual(before, budget, f'{url} 执行了 {before} 条查询，超出预算 {budget}')
+        grow()
+        after = self.count_queries(url, user)
+        self.assertEqual(
+            before, after,
+            f'{url} 的查询数随数据量从 {before} 增长到 {after}，可能存在 N+1 查询'
+        )
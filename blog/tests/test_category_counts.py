@@ -0,0 +1,64 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from blog.models import Category
+from .base import make_post, make_user
+
+
+class CategoryCountTests(TestCase):
+    """分类的已发布文章数随文章的发布、撤回、换分类和删除变化。"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = make_user()
+        cls.first = Category.objects.create(name='第一', slug='first')
+        cls.second = Category.objects.create(name='第二', slug='second')
+
+    def counts(self):
+        return [
+            Category.objects.get(pk=category.pk).published_post_count
+            for category in (self.first, self.second)
+        ]
+
+    def test_only_published_posts_are_counted(self):
+        make_post(self.author, category=self.first)
+        draft = make_post(self.author, category=self.first, status='draft')
+        self.assertEqual(self.counts(), [1, 0])
+        draft.status = 'published'
+        draft.save()
+        self.assertEqual(self.counts(), [2, 0])
+        draft.status = 'draft'
+        draft.save()
+        self.assertEqual(self.counts(), [1, 0])
+
+    def test_changing_category_moves_the_count(self):
+        post = make_post(self.author, category=self.first)
+        post.category = self.second
+        post.save()
+        self.assertEqual(self.counts(), [0, 1])
+        post.category = None
+        post.save()
+        self.assertEqual(self.counts(), [0, 0])
+
+    def test_delete_decrements(self):
+        post = make_post(self.author, category=self.first)
+        make_post(self.author, category=self.first, status='draft').delete()
+        self.assertEqual(self.counts(), [1, 0])
+        post.delete()
+        self.assertEqual(self.counts(), [0, 0])
+
+    def test_unrelated_saves_do_not_touch_counts(self):
+        post = make_post(self.author, category=self.first)
+        post.title = 'Renamed'
+        post.save()
+        post.save(update_fields=['content'])
+        self.assertEqual(self.counts(), [1, 0])
+
+    def test_reconcile_fixes_drift(self):
+        make_post(self.author, category=self.first)
+        Category.objects.filter(pk=self.first.pk).update(published_post_count=7)
+        Category.objects.filter(pk=self.second.pk).update(published_post_count=3)
+        call_command('reconcile_category_counts', stdout=StringIO())
+        self.assertEqual(self.counts(), [1, 0])
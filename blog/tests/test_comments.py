@@ -0,0 +1,71 @@
+from django.core.exceptions import ValidationError
+from django.test import TestCase
+
+from blog.models import Comment, COMMENT_MAX_DEPTH
+from .base import make_post, make_user
+
+
+class CommentPathTests(TestCase):
+    """评论树以物化路径保存，按路径排序即为先序遍历顺序。"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user()
+        cls.post = make_post(cls.user)
+
+    def comment(self, parent=None, **fields):
+        return Comment.objects.create(post=self.post, user=self.user, content='c', parent=parent, **fields)
+
+    def thread(self, **kwargs):
+        return [c.pk for c in Comment.visible_thread(self.post.pk, **kwargs)]
+
+    def test_thread_is_in_preorder(self):
+        a = self.comment()
+        b = self.comment()
+        a1 = self.comment(a)
+        b1 = self.comment(b)
+        a2 = self.comment(a)
+        a11 = self.comment(a1)
+        self.assertEqual(self.thread(), [a.pk, a1.pk, a11.pk, a2.pk, b.pk, b1.pk])
+        self.assertEqual(self.thread(root=a), [a1.pk, a11.pk, a2.pk])
+        self.assertEqual(Comment.objects.get(pk=a11.pk).depth, 2)
+
+    def test_hidden_comment_hides_its_subtree(self):
+        a = self.comment()
+        a1 = self.comment(a, active=False)
+        self.comment(a1)
+        a2 = self.comment(a)
+        self.assertEqual(self.thread(), [a.pk, a2.pk])
+
+    def test_replies_beyond_max_depth_are_flattened(self):
+        parent = None
+        for _ in range(COMMENT_MAX_DEPTH + 1):
+            parent = self.comment(parent)
+        self.assertEqual(parent.depth, COMMENT_MAX_DEPTH)
+        reply = self.comment(parent)
+        self.assertEqual(reply.depth, COMMENT_MAX_DEPTH)
+        self.assertEqual(reply.parent_id, parent.parent_id)
+        self.assertLessEqual(len(reply.path), Comment._meta.get_field('path').max_length)
+
+    def test_changing_parent_moves_the_subtree(self):
+        a = self.comment()
+        b = self.comment()
+        b1 = self.comment(b)
+        b11 = self.comment(b1)
+        b = Comment.objects.get(pk=b.pk)
+        b.parent = a
+        b.save()
+        self.assertEqual(self.thread(), [a.pk, b.pk, b1.pk, b11.pk])
+        moved = Comment.objects.get(pk=b11.pk)
+        self.assertEqual(moved.depth, 3)
+        self.assertTrue(moved.path.startswith(f'{a.path}/'))
+
+    def test_cannot_move_under_own_reply(self):
+        a = self.comment()
+        a1 = self.comment(a)
+        a = Comment.objects.get(pk=a.pk)
+        a.parent = a1
+        with self.assertRaises(ValidationError):
+            a.full_clean()
+        with self.assertRaises(ValidationError):
+            a.save()
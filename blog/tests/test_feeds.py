@@ -0,0 +1,37 @@
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .base import make_post, make_user
+
+
+@override_settings(PAGE_CACHE_ENABLED=False, PERFORMANCE_INSTRUMENTATION=False, RELATED_POSTS_MODE='sync')
+class ConditionalFeedTests(TestCase):
+    """订阅源支持条件请求，文章修改后 ETag 随之变化。"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = make_user()
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.post = make_post(cls.author)
+
+    def fetch(self, **headers):
+        return self.client.get(reverse('blog:author_feed', args=[self.author.username]), headers=headers)
+
+    def test_if_none_match_returns_304(self):
+        response = self.fetch()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.fetch(if_none_match=response['ETag']).status_code, 304)
+
+    def test_if_modified_since_returns_304(self):
+        response = self.fetch()
+        self.assertEqual(self.fetch(if_modified_since=response['Last-Modified']).status_code, 304)
+
+    def test_etag_changes_after_edit(self):
+        etag = self.fetch()['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.title = 'Edited title'
+            self.post.save()
+        response = self.fetch(if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertContains(response, 'Edited title')
@@ -0,0 +1,127 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from blog import image_jobs
+from blog.models import ImageJob, Post
+from .base import make_png, make_post, make_user, use_temp_media
+
+
+class ImageJobTests(TestCase):
+    """上传的图片登记为任务，由 process_image_jobs（queue 模式）或本进程线程池（thread 模式）处理。"""
+
+    def setUp(self):
+        self.author = make_user()
+        use_temp_media(
+            self, IMAGE_PIPELINE_MODE='queue', RELATED_POSTS_MODE='sync', PERFORMANCE_INSTRUMENTATION=False,
+            IMAGE_PIPELINE_MAX_ATTEMPTS=2, IMAGE_PIPELINE_RETRY_DELAY=10,
+        )
+
+    def upload(self):
+        return self.client.post(
+            reverse('ckeditor_upload_view'), {'upload': SimpleUploadedFile('photo.png', make_png())}
+        )
+
+    def status(self, url):
+        return self.client.get(reverse('ckeditor_upload_status'), {'url': url})
+
+    def job(self, source, **fields):
+        return ImageJob.objects.create(source=source, **fields)
+
+    def test_upload_returns_original_until_processed(self):
+        response = self.upload()
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['status'], 'pending')
+        self.assertIn(f'/{image_jobs.ORIGINALS_DIR}/', data['url'])
+        self.assertEqual(self.status(data['url']).json()['status'], 'pending')
+
+        job = ImageJob.objects.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(image_jobs.run_job(job.pk), 'done')
+        status = self.status(data['url']).json()
+        self.assertEqual(status['status'], 'done')
+        self.assertTrue(status['url'].endswith('.jpg'))
+        self.assertFalse(default_storage.exists(job.source))
+
+    def test_status_of_unknown_image_is_404(self):
+        self.assertEqual(self.status('/media/posts/originals/missing.png').status_code, 404)
+        self.assertEqual(self.status('https://example.com/other.png').status_code, 404)
+
+    def test_backpressure_rejects_uploads_with_retry_after(self):
+        self.job('posts/originals/queued.png')
+        with self.settings(IMAGE_PIPELINE_MAX_PENDING=1):
+            response = self.upload()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertEqual(ImageJob.objects.count(), 1)
+
+    def test_claim_returns_due_jobs_and_reclaims_stale_ones(self):
+        now = timezone.now()
+        due = self.job('a.png')
+        self.job('b.png', run_after=now + timedelta(minutes=5))
+        stale = self.job('c.png', status='processing')
+        fresh = self.job('d.png', status='processing')
+        self.job('e.png', status='done')
+        ImageJob.objects.filter(pk=stale.pk).update(updated=now - timedelta(hours=1))
+
+        self.assertEqual(sorted(image_jobs.claim_pending(10)), sorted([due.pk, stale.pk]))
+        self.assertEqual(ImageJob.objects.get(pk=stale.pk).status, 'pending')
+        self.assertEqual(ImageJob.objects.get(pk=fresh.pk).status, 'processing')
+        self.assertEqual(image_jobs.claim_pending(1), [due.pk])
+
+    def test_job_is_only_run_once(self):
+        job = self.job('posts/originals/claimed.png', status='processing')
+        self.assertIsNone(image_jobs.run_job(job.pk))
+        self.assertEqual(ImageJob.objects.get(pk=job.pk).attempts, 0)
+
+    def test_failures_back_off_then_fail(self):
+        job = self.job('posts/originals/missing.png')
+        with self.assertLogs('blog.image_jobs', 'ERROR'):
+            self.assertEqual(image_jobs.run_job(job.pk), 'pending')
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 1)
+        self.assertTrue(job.error)
+        delay = (job.run_after - timezone.now()).total_seconds()
+        self.assertTrue(8 < delay <= 10, delay)
+        # 退避期间不会被取出
+        self.assertEqual(image_jobs.claim_pending(10), [])
+
+        ImageJob.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        with self.assertLogs('blog.image_jobs', 'ERROR'):
+            self.assertEqual(image_jobs.run_job(job.pk), 'failed')
+        self.assertEqual(ImageJob.objects.get(pk=job.pk).attempts, 2)
+        self.assertEqual(image_jobs.claim_pending(10), [])
+
+    def test_finished_job_swaps_urls_in_posts(self):
+        url = self.upload().json()['url']
+        post = make_post(self.author, content=f'<p><img src="{url}"></p>')
+        job = ImageJob.objects.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            image_jobs.run_job(job.pk)
+        job.refresh_from_db()
+        post.refresh_from_db()
+        self.assertIn(default_storage.url(job.result), post.content)
+        self.assertNotIn(url, post.content)
+
+        # 编辑器在处理完成前取到的原图地址，保存文章时换成处理结果
+        later = make_post(self.author, content=f'<p><img src="{url}"></p>')
+        self.assertIn(default_storage.url(job.result), Post.objects.get(pk=later.pk).content)
+
+    def test_thread_mode_recovers_due_jobs(self):
+        due = self.job('posts/originals/lost.png')
+        image_jobs._last_recovery = None
+        self.addCleanup(setattr, image_jobs, '_last_recovery', None)
+        with self.settings(IMAGE_PIPELINE_MODE='thread'), mock.patch.object(image_jobs, '_submit') as submit:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(self.status(default_storage.url(due.source)).status_code, 200)
+            submit.assert_called_once_with(due.pk)
+            # 间隔时间内不再重复接管
+            with self.captureOnCommitCallbacks(execute=True):
+                image_jobs.recover_due_jobs()
+            submit.assert_called_once_with(due.pk)
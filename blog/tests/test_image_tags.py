@@ -0,0 +1,49 @@
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase
+
+from blog.templatetags.image_tags import _srcsets, responsive_images
+from myblog.image_utils import variant_name
+from .base import make_png, use_temp_media
+
+
+class ResponsiveImageTests(TestCase):
+    """srcset 按档位列出各宽度的变体，最大的一档在原图不更宽时直接使用原图。"""
+
+    def setUp(self):
+        use_temp_media(self, IMAGE_VARIANT_WIDTHS=(320, 640, 1280))
+        # 原图尺寸按文件名缓存，各测试的临时目录中可能出现同名文件
+        cache.clear()
+
+    def save(self, name, size):
+        return default_storage.save(name, ContentFile(make_png(size)))
+
+    def entries(self, srcset):
+        return [entry.rsplit(' ', 1) for entry in srcset.split(', ')]
+
+    def test_original_is_used_for_the_largest_bucket(self):
+        name = self.save('posts/small.png', (1000, 20))
+        srcsets = _srcsets(name)
+        self.assertEqual(self.entries(srcsets['jpg']), [
+            [default_storage.url(variant_name(name, 320, 'jpg')), '320w'],
+            [default_storage.url(variant_name(name, 640, 'jpg')), '640w'],
+            [default_storage.url(name), '1000w'],
+        ])
+        self.assertEqual(self.entries(srcsets['webp'])[-1], [default_storage.url(variant_name(name, 1280, 'webp')), '1000w'])
+
+    def test_wider_original_keeps_the_largest_variant(self):
+        name = self.save('posts/wide.png', (1600, 20))
+        entries = self.entries(_srcsets(name)['jpg'])
+        self.assertEqual(entries[-1], [default_storage.url(variant_name(name, 1280, 'jpg')), '1280w'])
+        self.assertNotIn(default_storage.url(name), _srcsets(name)['jpg'])
+
+    def test_content_images_get_picture_elements(self):
+        name = self.save('posts/inline.png', (800, 20))
+        pending = 'posts/originals/pending.png'
+        html = str(responsive_images(
+            f'<p><img src="{default_storage.url(name)}"><img src="{default_storage.url(pending)}"></p>'
+        ))
+        self.assertEqual(html.count('<picture>'), 1)
+        self.assertIn('type="image/webp"', html)
+        self.assertIn(f'<img src="{default_storage.url(pending)}">', html)
@@ -0,0 +1,107 @@
+from io import BytesIO
+from unittest import mock
+
+from PIL import Image, ImageFile
+from PIL.JpegImagePlugin import JpegImageFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, override_settings
+
+from myblog import image_utils
+from myblog.image_utils import ImageTooLarge, check_image_limits, compress_image, crop_image, load_image
+from myblog.instrumentation import RequestMetrics, _current
+
+
+def image_file(size, fmt='PNG', name='photo.png'):
+    buffer = BytesIO()
+    Image.effect_noise(size, 60).convert('RGB').save(buffer, fmt)
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+def decoded_size(encoded):
+    encoded.seek(0)
+    return Image.open(encoded).size
+
+
+@override_settings(IMAGE_MAX_DIMENSION=800, IMAGE_QUALITY_TOLERANCE=5)
+class CompressImageTests(SimpleTestCase):
+    """先缩小到最长边上限，再二分查找满足大小要求的最高质量。"""
+
+    def encode_calls(self, *args, **kwargs):
+        with mock.patch.object(image_utils, 'encode_image', wraps=image_utils.encode_image) as encode:
+            name, encoded = compress_image(*args, **kwargs)
+        return name, encoded, [call.kwargs['quality'] for call in encode.call_args_list]
+
+    def test_large_images_are_scaled_down(self):
+        name, encoded = compress_image(image_file((2000, 500)))
+        self.assertEqual(name, 'photo.jpg')
+        self.assertEqual(decoded_size(encoded), (800, 200))
+
+    def test_small_enough_result_is_encoded_once(self):
+        _, encoded, qualities = self.encode_calls(image_file((200, 200)))
+        self.assertEqual(qualities, [90])
+        self.assertEqual(decoded_size(encoded), (200, 200))
+
+    def test_quality_is_binary_searched_to_fit_the_target(self):
+        target_mb = 0.15
+        _, encoded, qualities = self.encode_calls(image_file((600, 600)), target_mb=target_mb)
+        self.assertLessEqual(encoded.size, target_mb * 1024 * 1024)
+        # 原先按 5 个质量点逐级下降最多要编码 14 次
+        self.assertLessEqual(len(qualities), 8)
+        self.assertEqual(qualities[0], 90)
+        self.assertEqual(len(set(qualities)), len(qualities))
+
+    def test_lowest_quality_is_returned_when_nothing_fits(self):
+        _, encoded, qualities = self.encode_calls(image_file((600, 600)), target_mb=0.0001)
+        self.assertEqual(min(qualities), 20)
+        self.assertGreater(encoded.size, 0)
+        self.assertEqual(decoded_size(encoded), (600, 600))
+
+    def test_jpeg_sources_are_decoded_in_draft_mode(self):
+        with mock.patch.object(JpegImageFile, 'draft', autospec=True, side_effect=JpegImageFile.draft) as draft:
+            _, encoded = compress_image(image_file((3200, 1600), 'JPEG', 'camera.jpg'))
+        draft.assert_called_once()
+        self.assertEqual(decoded_size(encoded), (800, 400))
+
+
+@override_settings(IMAGE_MAX_DIMENSION=800, IMAGE_MAX_PIXELS=1_000_000)
+class BoundedDecodingTests(SimpleTestCase):
+    """解码前检查文件大小和像素数；输出比原图小时按缩小后的分辨率解码。"""
+
+    def test_limits_are_checked_before_decoding(self):
+        too_many_pixels, too_many_bytes = image_file((1200, 1000)), image_file((100, 100))
+        with mock.patch.object(ImageFile.ImageFile, 'load') as load:
+            with self.assertRaises(ImageTooLarge):
+                check_image_limits(too_many_pixels)
+            with self.settings(IMAGE_MAX_UPLOAD_MB=0.001), self.assertRaises(ImageTooLarge):
+                check_image_limits(too_many_bytes)
+        load.assert_not_called()
+        check_image_limits(image_file((900, 900)))
+
+    def test_jpeg_draft_decoding_stays_within_pixel_limit(self):
+        # 全尺寸超出像素数上限，但按 1/2 解码后在上限之内
+        upload = image_file((1600, 1000), 'JPEG', 'camera.jpg')
+        image = load_image(upload, max_width=800)
+        self.assertEqual(image.size, (800, 500))
+        with self.assertRaises(ImageTooLarge):
+            load_image(image_file((1600, 1000)), max_width=800)
+
+    def test_crop_outputs_requested_size(self):
+        image_format, encoded = crop_image(image_file((1600, 1000), 'JPEG', 'avatar.jpg'), (400, 200, 600, 600), 300)
+        self.assertEqual(image_format, 'JPEG')
+        self.assertEqual(decoded_size(encoded), (300, 300))
+        image_format, encoded = crop_image(image_file((600, 400)), (100, 0, 400, 400), 100)
+        self.assertEqual(image_format, 'PNG')
+        self.assertEqual(decoded_size(encoded), (100, 100))
+
+    def test_peak_memory_is_reported(self):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            compress_image(image_file((900, 900)))
+        finally:
+            _current.reset(token)
+        entry = metrics.extra['image']
+        self.assertGreater(entry['peak_mb'], 0)
+        # 缩小后的像素缓冲区（800×800×4 字节）与原图缓冲区短暂并存
+        self.assertLess(entry['peak_mb'], 900 * 900 * 4 * 3 / 1024 / 1024)
+        self.assertIn('dur', entry)
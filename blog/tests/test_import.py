@@ -0,0 +1,122 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from blog.models import Category, ImageJob, MediaBlob, Post, RelatedPost
+from blog.search import search_posts
+from .base import make_png, make_post, make_user, use_temp_media
+
+
+class ImportCommandMixin:
+
+    def write_jsonl(self, *lines):
+        fd, path = tempfile.mkstemp(suffix='.jsonl')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            for line in lines:
+                f.write((line if isinstance(line, str) else json.dumps(line, ensure_ascii=False)) + '\n')
+        self.addCleanup(os.remove, path)
+        return path
+
+    def run_import(self, *lines, **options):
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command(
+                'import_posts', self.write_jsonl(*lines),
+                default_author=self.author.username, stdout=out, **options
+            )
+        return out.getvalue()
+
+
+@override_settings(RELATED_POSTS_MODE='sync', IMAGE_PIPELINE_MODE='sync')
+class ImportPostsTests(ImportCommandMixin, TestCase):
+
+    def setUp(self):
+        self.author = make_user()
+
+    def test_records_are_imported_and_bad_lines_skipped(self):
+        out = self.run_import(
+            {'title': 'Same title', 'category': 'notes', 'category_name': '笔记'},
+            {'title': 'Same title', 'category': 'notes', 'markdown': 'hello'},
+            {'title': 'Draft', 'category': 'notes', 'status': 'draft'},
+            '[1, 2]',
+            '{bad json',
+            {'content': '<p>no title</p>'},
+        )
+        self.assertIn('共 3 篇', out)
+        self.assertIn('第 4 行不是 JSON 对象', out)
+        self.assertIn('第 5 行不是合法的 JSON', out)
+        self.assertIn('缺少标题', out)
+        posts = Post.objects.order_by('pk')
+        self.assertEqual([p.slug for p in posts], ['same-title', 'same-title-1', 'draft'])
+        self.assertEqual(posts[1].content, '<p>hello</p>')
+        self.assertEqual(Category.objects.get(slug='notes').published_post_count, 2)
+
+    def test_only_imported_posts_are_indexed(self):
+        existing = make_post(self.author, title='Existing', content='<p>kubernetes</p>')
+        # 出现在半数以上文章中的词不参与相似度计算，先放几篇无关的文章
+        for topic in ('gardening tips', 'sourdough baking', 'marathon training', 'watercolor painting'):
+            make_post(self.author, title=topic.title(), content=f'<p>{topic}</p>')
+        self.run_import(
+            {'title': 'Kubernetes scheduling', 'content': '<p>kubernetes cluster scheduling</p>'},
+            {'title': 'Kubernetes networking', 'content': '<p>kubernetes cluster networking</p>'},
+            {'title': 'Kubernetes draft', 'status': 'draft'},
+        )
+        imported = list(Post.objects.filter(title__startswith='Kubernetes').order_by('pk'))
+        results = search_posts('kubernetes')
+        self.assertEqual(
+            sorted(post.pk for post in results[:results.count()]),
+            sorted([existing.pk, imported[0].pk, imported[1].pk])
+        )
+        self.assertTrue(RelatedPost.objects.filter(post=imported[0], related=imported[1]).exists())
+        self.assertFalse(RelatedPost.objects.filter(post=imported[2]).exists())
+
+    def test_skip_post_process(self):
+        self.run_import({'title': 'Skipped', 'content': '<p>kubernetes</p>'}, skip_post_process=True)
+        results = search_posts('kubernetes')
+        self.assertEqual(results.count(), 0)
+
+
+@override_settings(RELATED_POSTS_MODE='sync', IMAGE_PIPELINE_MODE='sync')
+class ImportImagesTests(ImportCommandMixin, TestCase):
+    """导入文章的特色图片与网站上传的图片走同一套处理流程。"""
+
+    def setUp(self):
+        self.author = make_user()
+        use_temp_media(self, MEDIA_DEDUP_ENABLED=True)
+
+    def save_image(self, name, data):
+        return default_storage.save(name, ContentFile(data))
+
+    def test_images_are_processed_through_image_jobs(self):
+        png = make_png()
+        first = self.save_image('posts/first.png', png)
+        second = self.save_image('posts/second.png', png)
+        out = self.run_import(
+            {'title': 'First', 'image': first},
+            {'title': 'Second', 'image': second},
+            {'title': 'Missing', 'image': 'posts/missing.png'},
+        )
+        self.assertIn('共处理了 2 张图片', out)
+        self.assertIn('图片不存在，已跳过: posts/missing.png', out)
+        self.assertEqual(set(ImageJob.objects.values_list('status', flat=True)), {'done'})
+        a, b = Post.objects.filter(title__in=['First', 'Second']).order_by('pk')
+        # 内容相同的两张图片只保存一份，按引用计数
+        self.assertEqual(a.image.name, b.image.name)
+        self.assertEqual(MediaBlob.objects.get(name=a.image.name).refcount, 2)
+        self.assertFalse(default_storage.exists(first))
+        self.assertFalse(default_storage.exists(second))
+
+    def test_existing_posts_are_untouched(self):
+        name = self.save_image('posts/existing.png', make_png())
+        existing = make_post(self.author, title='Existing')
+        Post.objects.filter(pk=existing.pk).update(image=name)
+        self.run_import({'title': 'Imported', 'image': self.save_image('posts/new.png', make_png())})
+        self.assertEqual(Post.objects.get(pk=existing.pk).image.name, name)
+        self.assertTrue(default_storage.exists(name))
+        self.assertEqual(ImageJob.objects.count(), 1)
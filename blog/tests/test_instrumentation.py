@@ -0,0 +1,53 @@
+import json
+
+from django.contrib.auth.models import User
+from django.template import base as template_base
+from django.test import TestCase, override_settings
+
+from .base import QUERY_BUDGET_SETTINGS, make_post, make_user
+
+INSTRUMENTED = {**QUERY_BUDGET_SETTINGS, 'PERFORMANCE_INSTRUMENTATION': True}
+
+
+@override_settings(**INSTRUMENTED)
+class InstrumentationTests(TestCase):
+    """请求指标写入日志；Server-Timing 默认关闭，开启后也只发给工作人员和内部地址。"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = make_user()
+        make_post(cls.author)
+        cls.staff = User.objects.create_user(username='staff', password='password', is_staff=True)
+
+    def get(self, **extra):
+        with self.assertLogs('myblog.performance', 'INFO') as self.logs:
+            return self.client.get('/', **extra)
+
+    def test_metrics_are_logged(self):
+        self.get()
+        data = json.loads(self.logs.records[-1].getMessage())
+        self.assertEqual(data['view'], 'home')
+        self.assertGreater(data['db_queries'], 0)
+        self.assertGreater(data['template_ms'], 0)
+        self.assertGreater(data['context_processor_ms'], 0)
+
+    def test_template_class_is_not_patched(self):
+        self.get()
+        self.assertEqual(template_base.Template.render.__module__, 'django.template.base')
+
+    def test_server_timing_is_off_by_default(self):
+        self.client.force_login(self.staff)
+        self.assertNotIn('Server-Timing', self.get())
+
+    @override_settings(PERFORMANCE_SERVER_TIMING=True)
+    def test_server_timing_only_for_staff(self):
+        self.assertNotIn('Server-Timing', self.get())
+        self.client.force_login(self.author)
+        self.assertNotIn('Server-Timing', self.get())
+        self.client.force_login(self.staff)
+        self.assertIn('db;dur=', self.get()['Server-Timing'])
+
+    @override_settings(PERFORMANCE_SERVER_TIMING=True, INTERNAL_IPS=['10.0.0.8'])
+    def test_server_timing_for_internal_ips(self):
+        self.assertIn('tpl;dur=', self.get(REMOTE_ADDR='10.0.0.8')['Server-Timing'])
+        self.assertNotIn('Server-Timing', self.get(REMOTE_ADDR='10.0.0.9'))
@@ -0,0 +1,62 @@
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+
+from blog.models import MediaBlob, PostMedia
+from .base import make_png, make_post, make_user, use_temp_media
+
+
+class MediaDedupTests(TestCase):
+    """相同的上传图片只保存一份，引用数随文章的保存和删除变化。"""
+
+    def setUp(self):
+        self.author = make_user()
+        use_temp_media(self, MEDIA_DEDUP_ENABLED=True, IMAGE_PIPELINE_MODE='sync', RELATED_POSTS_MODE='sync')
+        self.png = make_png()
+
+    def create_post(self, content=''):
+        return make_post(self.author, content=content, image=SimpleUploadedFile('cover.png', self.png))
+
+    def test_identical_uploads_share_one_file(self):
+        first = self.create_post()
+        url = default_storage.url(first.image.name)
+        second = self.create_post(content=f'<p><img src="{url}"></p>')
+        self.assertEqual(first.image.name, second.image.name)
+        blob = MediaBlob.objects.get()
+        self.assertEqual(blob.refcount, 2)
+        self.assertEqual(PostMedia.objects.filter(blob=blob).count(), 2)
+
+    def test_refcount_drops_when_references_go_away(self):
+        first = self.create_post()
+        second = self.create_post()
+        second.image = None
+        second.save()
+        self.assertEqual(MediaBlob.objects.get().refcount, 1)
+        first.delete()
+        self.assertEqual(MediaBlob.objects.get().refcount, 0)
+
+    def test_shared_file_survives_deleting_one_post(self):
+        # 删除文件的操作在提交后执行，需要真正运行 on_commit 回调才能发现误删
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.create_post()
+            second = self.create_post()
+        name = first.image.name
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertTrue(default_storage.exists(name))
+        with self.captureOnCommitCallbacks(execute=True):
+            first.image = None
+            first.save()
+        self.assertTrue(default_storage.exists(name))
+        self.assertEqual(MediaBlob.objects.get().refcount, 0)
+
+    def test_replaced_image_is_deleted_without_dedup(self):
+        with override_settings(MEDIA_DEDUP_ENABLED=False):
+            with self.captureOnCommitCallbacks(execute=True):
+                post = self.create_post()
+            old_name = post.image.name
+            with self.captureOnCommitCallbacks(execute=True):
+                post.image = SimpleUploadedFile('new.png', self.png)
+                post.save()
+        self.assertFalse(default_storage.exists(old_name))
+        self.assertTrue(default_storage.exists(post.image.name))
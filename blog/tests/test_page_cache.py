@@ -0,0 +1,90 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from blog import view_counter
+from blog.models import Comment
+from .base import make_post, make_user
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'page-cache-tests'}},
+    PAGE_CACHE_ENABLED=True,
+    PERFORMANCE_INSTRUMENTATION=False,
+    VIEW_COUNTER_USE_CACHE=False,
+    VIEW_COUNTER_FLUSH_INTERVAL=0,
+    VIEW_COUNTER_MAX_PENDING=10 ** 9,
+    RELATED_POSTS_MODE='sync',
+)
+class AnonymousPageCacheTests(TestCase):
+    """匿名访客的整页缓存：命中时仍记录浏览量，文章或评论变化后相关页面失效。"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = make_user()
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.post = make_post(cls.author)
+
+    def setUp(self):
+        cache.clear()
+        view_counter._collect()
+        self.addCleanup(view_counter._collect)
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_hit_records_views(self):
+        url = self.post.get_absolute_url()
+        self.assertEqual(self.get(url)['X-Page-Cache'], 'MISS')
+        response = self.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'HIT')
+        self.assertIn('Cookie', response['Vary'])
+        self.assertEqual(view_counter.pending_views(self.post.pk), 2)
+
+    def test_cached_page_has_no_csrf_token(self):
+        url = self.post.get_absolute_url()
+        self.get(url)
+        response = self.get(url)
+        self.assertNotContains(response, 'csrfmiddlewaretoken')
+        self.assertContains(response, reverse('accounts:login'))
+
+    def test_logged_in_users_bypass_cache(self):
+        self.client.force_login(self.author)
+        url = self.post.get_absolute_url()
+        self.get(url)
+        response = self.get(url)
+        self.assertNotIn('X-Page-Cache', response)
+        self.assertContains(response, 'csrfmiddlewaretoken')
+
+    def test_saving_post_purges_its_pages(self):
+        urls = [self.post.get_absolute_url(), reverse('blog:post_list'), reverse('home')]
+        for url in urls:
+            self.get(url)
+            self.assertEqual(self.get(url)['X-Page-Cache'], 'HIT')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.title = 'Edited title'
+            self.post.save()
+        for url in urls:
+            response = self.get(url)
+            self.assertEqual(response['X-Page-Cache'], 'MISS', url)
+            self.assertContains(response, 'Edited title')
+
+    def test_new_comment_purges_detail_page(self):
+        url = self.post.get_absolute_url()
+        self.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(post=self.post, user=self.author, content='fresh comment')
+        response = self.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        self.assertContains(response, 'fresh comment')
+
+    def test_other_posts_stay_cached(self):
+        other = make_post(self.author)
+        url = other.get_absolute_url()
+        self.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.title = 'Edited title'
+            self.post.save()
+        self.assertEqual(self.get(url)['X-Page-Cache'], 'HIT')
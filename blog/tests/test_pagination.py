@@ -0,0 +1,64 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from blog.models import Post
+from .base import make_post, make_user
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+    PAGE_CACHE_ENABLED=False,
+    PERFORMANCE_INSTRUMENTATION=False,
+)
+class KeysetPaginationTests(TestCase):
+    """沿游标前后翻页时，各页首尾相接，既不漏掉也不重复文章。"""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = make_user()
+        start = timezone.now() - timedelta(days=1)
+        # 每三篇文章的发布时间相同，翻页必须依靠 id 区分它们
+        for i in range(17):
+            make_post(author, publish=start + timedelta(minutes=i // 3))
+        make_post(author, status='draft')
+        cls.expected = list(
+            Post.objects.filter(status='published').order_by('-publish', '-id').values_list('pk', flat=True)
+        )
+
+    def get_page(self, **params):
+        response = self.client.get(reverse('blog:post_list'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.context['page_obj']
+
+    def test_cursor_round_trip(self):
+        pages = [self.get_page()]
+        while pages[-1].next_cursor:
+            pages.append(self.get_page(cursor=pages[-1].next_cursor))
+        self.assertEqual([post.pk for page in pages for post in page], self.expected)
+        self.assertEqual([page.number for page in pages], list(range(1, len(pages) + 1)))
+        self.assertFalse(pages[-1].has_next())
+
+        # 从最后一页沿 previous_cursor 往回翻，每一页都与向后翻时看到的相同
+        page = pages[-1]
+        for expected in reversed(pages[:-1]):
+            page = self.get_page(cursor=page.previous_cursor)
+            self.assertEqual([post.pk for post in page], [post.pk for post in expected])
+            self.assertEqual(page.number, expected.number)
+        self.assertFalse(page.has_previous())
+
+    def test_page_number_matches_cursor(self):
+        second = self.get_page(cursor=self.get_page().next_cursor)
+        self.assertEqual([post.pk for post in self.get_page(page=2)], [post.pk for post in second])
+
+    def test_last_page(self):
+        last = self.get_page(page='last')
+        self.assertEqual(last.number, 3)
+        self.assertEqual([post.pk for post in last], self.expected[12:])
+        self.assertFalse(last.has_next())
+
+    def test_invalid_cursor_is_404(self):
+        response = self.client.get(reverse('blog:post_list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,61 @@
+from django.urls import reverse
+
+from blog.models import Category, Comment
+from .base import QueryBudgetTestCase, make_user, seed_blog
+
+
+class BlogQueryBudgetTests(QueryBudgetTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = make_user()
+        cls.other_author = make_user()
+        cls.categories = [
+            Category.objects.create(name=f'分类{i}', slug=f'category-{i}') for i in range(2)
+        ]
+        # 数据量足以让各个列表页都有多页
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.posts = seed_blog([cls.author, cls.other_author], cls.categories, 10, comments_per_post=4)
+            seed_blog([cls.author], cls.categories, 12, status='draft')
+        cls.post = cls.posts[0]
+
+    def grow(self, comments_per_post=0):
+        with self.captureOnCommitCallbacks(execute=True):
+            extra_authors = [make_user() for _ in range(2)]
+            seed_blog([self.author, *extra_authors], self.categories, 8, comments_per_post)
+            seed_blog([self.author], self.categories, 8, status='draft')
+            # 给被测文章追加更深、更多的评论
+            parent = None
+            for i in range(12):
+                parent = Comment.objects.create(
+                    post=self.post, user=extra_authors[i % 2], content=f'extra {i}', parent=parent
+                )
+
+    def test_home(self):
+        self.assertQueryBudget(4, reverse('home'), self.grow)
+
+    def test_post_list(self):
+        self.assertQueryBudget(5, reverse('blog:post_list'), self.grow)
+
+    def test_author_posts(self):
+        self.assertQueryBudget(8, reverse('blog:author_posts', args=[self.author.username]), self.grow)
+
+    def test_category_posts(self):
+        self.assertQueryBudget(6, self.post.category.get_absolute_url(), self.grow)
+
+    def test_draft_list(self):
+        self.assertQueryBudget(9, reverse('blog:draft_list'), self.grow, user=self.author)
+
+    def test_post_detail_with_nested_comments(self):
+        self.assertQueryBudget(7, self.post.get_absolute_url(), lambda: self.grow(comments_per_post=6))
+
+    def test_post_detail_logged_in(self):
+        self.assertQueryBudget(
+            11, self.post.get_absolute_url(), lambda: self.grow(comments_per_post=6), user=self.other_author
+        )
+
+    def test_post_comments_fragment(self):
+        self.assertQueryBudget(3, reverse('blog:post_comments', args=[self.post.pk]), self.grow)
+
+    def test_search(self):
+        self.assertQueryBudget(6, reverse('blog:search') + '?query=performance', self.grow)
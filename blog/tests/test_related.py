@@ -0,0 +1,57 @@
+from django.test import TestCase, override_settings
+
+from blog import related
+from blog.models import RelatedPost
+from .base import make_post, make_user
+
+
+@override_settings(RELATED_POSTS_MODE='sync', RELATED_POSTS_TOP_K=2)
+class RelatedPostsTests(TestCase):
+    """文章保存后更新自己的相关文章，并合并进其他文章的相关列表。"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = make_user()
+
+    def create(self, title, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            return make_post(self.author, title=title, content=f'<p>{content}</p>')
+
+    def neighbors(self, post):
+        return list(RelatedPost.objects.filter(post=post).order_by('rank').values_list('related_id', flat=True))
+
+    def test_new_post_joins_existing_lists(self):
+        python = self.create('Python caching', 'redis memcached cache invalidation')
+        unrelated = self.create('Mountain hiking', 'trail boots summit weather')
+        self.assertEqual(self.neighbors(python), [])
+        newer = self.create('Cache invalidation', 'memcached redis cache keys')
+        self.assertEqual(self.neighbors(newer), [python.pk])
+        # 较早的文章无需全量重建就能看到新文章
+        self.assertEqual(self.neighbors(python), [newer.pk])
+        self.assertEqual(self.neighbors(unrelated), [])
+
+    def test_unpublished_post_leaves_other_lists(self):
+        first = self.create('Python caching', 'redis memcached cache invalidation')
+        second = self.create('Cache invalidation', 'memcached redis cache keys')
+        with self.captureOnCommitCallbacks(execute=True):
+            second.status = 'draft'
+            second.save()
+        self.assertEqual(self.neighbors(first), [])
+        self.assertEqual(self.neighbors(second), [])
+
+    def test_incremental_update_matches_rebuild_for_new_posts(self):
+        posts = [
+            self.create('Python caching', 'redis memcached cache invalidation'),
+            self.create('Cache invalidation', 'memcached redis cache keys'),
+            self.create('Redis streams', 'redis streams consumer groups'),
+            self.create('Mountain hiking', 'trail boots summit weather'),
+        ]
+        incremental = {post.pk: self.neighbors(post) for post in posts}
+        related.rebuild_all()
+        self.assertEqual({post.pk: self.neighbors(post) for post in posts}, incremental)
+
+    @override_settings(RELATED_POSTS_MODE='manual')
+    def test_manual_mode_skips_incremental_updates(self):
+        self.create('Python caching', 'redis memcached cache invalidation')
+        self.create('Cache invalidation', 'memcached redis cache keys')
+        self.assertFalse(RelatedPost.objects.exists())
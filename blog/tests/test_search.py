@@ -0,0 +1,61 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from blog.search import sample_terms, search_posts
+from .base import make_post, make_user
+
+
+class SearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = make_user()
+        cls.in_body = make_post(author, title='Weekly notes', content='<p>tuning the database cache</p>')
+        cls.in_title = make_post(author, title='Database tuning', content='<p>weekly notes</p>')
+        cls.draft = make_post(author, title='Database draft', status='draft')
+        cls.short = make_post(author, title='性能', content='<p>读写分离</p>')
+
+    def pks(self, query):
+        results = search_posts(query)
+        return [post.pk for post in results[:results.count()]]
+
+    def test_title_matches_rank_first(self):
+        self.assertEqual(self.pks('database'), [self.in_title.pk, self.in_body.pk])
+
+    def test_all_terms_must_match(self):
+        self.assertEqual(self.pks('database weekly'), [self.in_title.pk, self.in_body.pk])
+        self.assertEqual(self.pks('database missing'), [])
+
+    def test_matches_are_highlighted(self):
+        post = search_posts('cache')[0]
+        self.assertEqual(post, self.in_body)
+        self.assertIn('<mark>cache</mark>', post.search_snippet)
+
+    def test_two_character_terms_use_bigram_index(self):
+        # trigram 索引匹配不了两个字的词，改由两字词索引匹配，不再扫描整张表
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.pks('性能'), [self.short.pk])
+        self.assertTrue(all('LIKE' not in query['sql'] for query in queries))
+        self.assertEqual(self.pks('分离'), [self.short.pk])
+        self.assertEqual(self.pks('能读'), [])
+        self.assertEqual(self.pks('db'), [])
+
+    def test_mixed_terms(self):
+        self.assertEqual(self.pks('database 性能'), [])
+        self.assertEqual(self.pks('性能 读写'), [self.short.pk])
+        # 单个字的词只在其他词已命中的文章中做子串匹配
+        self.assertEqual(self.pks('性能 写'), [self.short.pk])
+        self.assertEqual(self.pks('database c'), [self.in_body.pk])
+        self.assertEqual(self.pks('写'), [self.short.pk])
+
+    def test_unpublished_posts_are_removed_from_index(self):
+        self.in_title.status = 'draft'
+        self.in_title.save()
+        self.assertEqual(self.pks('database'), [self.in_body.pk])
+        self.in_body.delete()
+        self.assertEqual(self.pks('database'), [])
+
+    def test_sample_terms(self):
+        self.assertEqual(sample_terms(self.in_title), ('Database', None))
+        self.assertEqual(sample_terms(self.short), ('读写分离', '性能'))
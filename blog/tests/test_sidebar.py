@@ -0,0 +1,41 @@
+from django.test import TestCase, override_settings
+
+from blog import sidebar
+from blog.models import Category
+from .base import make_post, make_user
+
+
+@override_settings(RELATED_POSTS_MODE='sync')
+class SidebarCacheTests(TestCase):
+    """侧边栏缓存的代数在提交后才递增，只更新侧边栏不展示的字段时不失效。"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = make_user()
+        cls.post = make_post(cls.author)
+
+    def test_generation_is_bumped_on_commit(self):
+        generation = sidebar.get_generation()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.title = 'Renamed'
+            self.post.save()
+            self.assertEqual(sidebar.get_generation(), generation)
+        self.assertGreater(sidebar.get_generation(), generation)
+
+    def test_unrelated_field_updates_keep_cache(self):
+        generation = sidebar.get_generation()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.save(update_fields=['content'])
+        self.assertEqual(sidebar.get_generation(), generation)
+
+    def test_cached_categories_refresh_after_publish(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            category = Category.objects.create(name='侧边栏', slug='sidebar')
+        self.assertEqual(
+            next(c.published_post_count for c in sidebar.get_categories() if c.pk == category.pk), 0
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            make_post(self.author, category=category)
+        self.assertEqual(
+            next(c.published_post_count for c in sidebar.get_categories() if c.pk == category.pk), 1
+        )
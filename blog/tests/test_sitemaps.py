@@ -0,0 +1,64 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .base import make_post, make_user
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'sitemap-tests'}},
+    PAGE_CACHE_ENABLED=False, PERFORMANCE_INSTRUMENTATION=False, RELATED_POSTS_MODE='sync', SITEMAP_SHARD_SIZE=2,
+)
+class SitemapTests(TestCase):
+    """分片索引按代数缓存，文章保存或删除后才重新统计。"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = make_user()
+
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.posts = [make_post(self.author) for _ in range(3)]
+
+    def shard(self, post):
+        return post.pk // 2
+
+    def test_index_and_shards_are_served_from_cache(self):
+        self.client.get(reverse('sitemap_index'))
+        with self.assertNumQueries(0):
+            index = self.client.get(reverse('sitemap_index'))
+        for shard in sorted({self.shard(post) for post in self.posts}):
+            self.assertContains(index, reverse('sitemap_shard', args=[shard]))
+            self.client.get(reverse('sitemap_shard', args=[shard]))
+            with self.assertNumQueries(0):
+                self.assertEqual(self.client.get(reverse('sitemap_shard', args=[shard])).status_code, 200)
+
+    def test_saving_a_post_refreshes_its_shard(self):
+        post = self.posts[0]
+        url = reverse('sitemap_shard', args=[self.shard(post)])
+        self.assertContains(self.client.get(url), post.slug)
+        with self.captureOnCommitCallbacks(execute=True):
+            post.slug = 'renamed-post'
+            post.save()
+        self.assertContains(self.client.get(url), 'renamed-post')
+
+    def test_unpublished_shard_is_404(self):
+        shard = self.shard(self.posts[-1])
+        url = reverse('sitemap_shard', args=[shard])
+        self.assertEqual(self.client.get(url).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            for post in self.posts:
+                if self.shard(post) == shard:
+                    post.status = 'draft'
+                    post.save()
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertNotContains(self.client.get(reverse('sitemap_index')), url)
+
+    def test_image_only_updates_keep_the_index(self):
+        post = self.posts[0]
+        self.client.get(reverse('sitemap_index'))
+        with self.captureOnCommitCallbacks(execute=True):
+            post.save(update_fields=['image'])
+        with self.assertNumQueries(0):
+            self.client.get(reverse('sitemap_index'))
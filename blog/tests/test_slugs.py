@@ -0,0 +1,81 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.db import IntegrityError
+from django.test import TestCase
+
+from blog import slugs
+from blog.models import Post
+from .base import make_post, make_user
+
+
+class SlugAllocationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = make_user()
+
+    def test_same_day_titles_get_suffixes(self):
+        posts = [make_post(self.author, title='Hello World') for _ in range(3)]
+        self.assertEqual([post.slug for post in posts], ['hello-world', 'hello-world-1', 'hello-world-2'])
+
+    def test_smallest_free_suffix_is_reused(self):
+        posts = [make_post(self.author, title='Hello World') for _ in range(3)]
+        posts[1].delete()
+        self.assertEqual(make_post(self.author, title='Hello World').slug, 'hello-world-1')
+
+    def test_other_days_do_not_conflict(self):
+        first = make_post(self.author, title='Hello World')
+        other = make_post(self.author, title='Hello World', publish=first.publish - timedelta(days=2))
+        self.assertEqual(other.slug, 'hello-world')
+
+    def test_resaving_keeps_own_slug(self):
+        post = make_post(self.author, title='Hello World')
+        post.title = 'Renamed'
+        post.save()
+        self.assertEqual(post.slug, 'hello-world')
+
+    def test_long_existing_slug_is_kept_on_resave(self):
+        slug = 'a' * 200
+        post = make_post(self.author, title='Long', slug=slug)
+        self.assertEqual(post.slug, slug)
+        post.title = 'Renamed'
+        post.save()
+        self.assertEqual(Post.objects.get(pk=post.pk).slug, slug)
+
+    def test_long_slug_is_shortened_only_to_fit_a_suffix(self):
+        make_post(self.author, title='Long', slug='a' * 200)
+        other = make_post(self.author, title='Long', slug='a' * 200)
+        self.assertEqual(other.slug, 'a' * 190 + '-1')
+        third = make_post(self.author, title='Long', slug='a' * 200)
+        self.assertEqual(third.slug, 'a' * 190 + '-2')
+
+    def test_long_titles_leave_room_for_suffix(self):
+        first = make_post(self.author, title='b' * 250)
+        second = make_post(self.author, title='b' * 250)
+        self.assertEqual(first.slug, 'b' * 190)
+        self.assertEqual(second.slug, 'b' * 190 + '-1')
+
+    def test_retries_after_concurrent_insert(self):
+        make_post(self.author, title='Hello World')
+        allocate = slugs.allocate_slug
+        calls = []
+
+        def stale_then_real(post, base=None):
+            # 第一次分配时还没看到并发写入的同名文章，返回已被占用的 Slug
+            calls.append(post.slug)
+            return 'hello-world' if len(calls) == 1 else allocate(post, base)
+
+        with mock.patch('blog.slugs.allocate_slug', side_effect=stale_then_real):
+            post = make_post(self.author, title='Hello World')
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(post.slug, 'hello-world-1')
+        self.assertEqual(Post.objects.filter(slug__startswith='hello-world').count(), 2)
+
+    def test_other_integrity_errors_are_not_retried(self):
+        post = make_post(self.author, title='Hello World')
+        duplicate = Post(pk=post.pk, title='Other', author=self.author, status='published')
+        with mock.patch('blog.slugs.allocate_slug', wraps=slugs.allocate_slug) as allocate:
+            with self.assertRaises(IntegrityError):
+                duplicate.save(force_insert=True)
+        self.assertEqual(allocate.call_count, 1)
@@ -0,0 +1,73 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from blog import trending
+from blog.models import PostViewBucket, TrendingPost
+from .base import make_post, make_user
+
+
+class TrendingTests(TestCase):
+    """浏览量按小时分桶累加，过期的小时桶合并成天桶，排行按时间衰减的浏览量计算。"""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = make_user()
+        cls.old, cls.recent, cls.draft = make_post(author), make_post(author), make_post(author, status='draft')
+
+    def setUp(self):
+        self.now = timezone.now().replace(minute=30, second=0, microsecond=0)
+
+    def bucket(self, post, hours_ago, count, granularity='hour'):
+        start = trending._hour_start(self.now - timedelta(hours=hours_ago))
+        return PostViewBucket.objects.create(post=post, granularity=granularity, bucket_start=start, count=count)
+
+    def counts(self, granularity):
+        return dict(
+            PostViewBucket.objects.filter(granularity=granularity).values_list('post_id', 'count')
+        )
+
+    def test_record_views_accumulates_in_current_hour(self):
+        trending.record_views({self.old.pk: 2, self.recent.pk: 1}, now=self.now)
+        trending.record_views({self.old.pk: 3, 10 ** 6: 5}, now=self.now)
+        self.assertEqual(self.counts('hour'), {self.old.pk: 5, self.recent.pk: 1})
+        bucket = PostViewBucket.objects.get(post=self.old)
+        self.assertEqual(bucket.bucket_start, trending._hour_start(self.now))
+
+    def test_compact_merges_old_hours_into_days(self):
+        merge_day = timezone.localtime(self.now - timedelta(days=4)).replace(hour=12)
+        hours_ago = (self.now - merge_day).total_seconds() / 3600
+        self.bucket(self.old, hours_ago, 4)
+        self.bucket(self.old, hours_ago + 1, 6)
+        self.bucket(self.old, 1, 7)
+        self.bucket(self.recent, 24 * 200, 9, granularity='day')
+
+        merged, expired = trending.compact(now=self.now)
+        self.assertEqual((merged, expired), (2, 1))
+        self.assertEqual(self.counts('hour'), {self.old.pk: 7})
+        self.assertEqual(self.counts('day'), {self.old.pk: 10})
+
+        # 再次合并到已有的天桶时累加
+        self.bucket(self.old, hours_ago + 2, 5)
+        trending.compact(now=self.now)
+        self.assertEqual(self.counts('day'), {self.old.pk: 15})
+
+    def test_rankings_decay_with_age(self):
+        # 三天前的 100 次浏览经过 3 个半衰期只相当于 12.5 次，低于刚刚的 20 次
+        self.bucket(self.old, 72, 100)
+        self.bucket(self.recent, 1, 20)
+        self.bucket(self.draft, 1, 1000)
+        self.bucket(self.recent, 24 * 10, 10 ** 6, granularity='day')
+        self.assertEqual(trending.update_rankings(now=self.now), 2)
+        ranking = list(TrendingPost.objects.values_list('post_id', flat=True))
+        self.assertEqual(ranking, [self.recent.pk, self.old.pk])
+        self.assertAlmostEqual(TrendingPost.objects.get(post=self.old).score, 100 * 0.5 ** (72.5 / 24), places=3)
+
+    def test_rankings_replace_previous_results(self):
+        self.bucket(self.old, 1, 5)
+        trending.update_rankings(now=self.now)
+        PostViewBucket.objects.all().delete()
+        self.bucket(self.recent, 1, 5)
+        trending.update_rankings(now=self.now)
+        self.assertEqual(list(TrendingPost.objects.values_list('post_id', 'rank')), [(self.recent.pk, 1)])
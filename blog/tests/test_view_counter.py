@@ -0,0 +1,80 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db.models.query import QuerySet
+from django.test import TestCase, override_settings
+
+from blog import view_counter
+from blog.models import Post, PostViewBucket
+from .base import make_post, make_user
+
+
+@override_settings(VIEW_COUNTER_FLUSH_INTERVAL=0, VIEW_COUNTER_MAX_PENDING=10 ** 9)
+class ViewCounterTests(TestCase):
+    """浏览量先在缓冲区累积，flush 时批量写回数据库和按小时分桶的统计。"""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = make_user()
+        cls.posts = [make_post(author) for _ in range(3)]
+
+    def setUp(self):
+        # 丢弃其他测试留在进程内缓冲区中的计数
+        view_counter._collect()
+
+    def record_and_flush(self):
+        first, second, third = self.posts
+        view_counter.record_view(first.pk)
+        view_counter.record_view(first.pk, 2)
+        view_counter.record_view(second.pk, 3)
+        self.assertEqual(view_counter.pending_views(first.pk), 3)
+        self.assertEqual(Post.objects.get(pk=first.pk).views, 0)
+
+        self.assertEqual(view_counter.flush(), 6)
+        views = dict(Post.objects.filter(pk__in=[p.pk for p in self.posts]).values_list('pk', 'views'))
+        self.assertEqual(views, {first.pk: 3, second.pk: 3, third.pk: 0})
+        self.assertEqual(view_counter.pending_views(first.pk), 0)
+        buckets = dict(PostViewBucket.objects.values_list('post_id', 'count'))
+        self.assertEqual(buckets, {first.pk: 3, second.pk: 3})
+        # 缓冲区已清空，再次写回不会重复计数
+        self.assertEqual(view_counter.flush(), 0)
+        self.assertEqual(Post.objects.get(pk=first.pk).views, 3)
+
+    @override_settings(VIEW_COUNTER_USE_CACHE=False)
+    def test_flush_in_process_buffer(self):
+        self.record_and_flush()
+
+    @override_settings(
+        VIEW_COUNTER_USE_CACHE=True,
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'views'}},
+    )
+    def test_flush_shared_cache(self):
+        self.record_and_flush()
+
+    @override_settings(VIEW_COUNTER_USE_CACHE=False)
+    def test_failed_write_is_kept_for_retry(self):
+        post = self.posts[0]
+        view_counter.record_view(post.pk, 4)
+        with mock.patch.object(QuerySet, 'update', side_effect=RuntimeError('database unavailable')):
+            with self.assertRaises(RuntimeError):
+                view_counter.flush()
+        self.assertEqual(view_counter.pending_views(post.pk), 4)
+        self.assertEqual(view_counter.flush(), 4)
+        self.assertEqual(Post.objects.get(pk=post.pk).views, 4)
+
+    @override_settings(
+        VIEW_COUNTER_USE_CACHE=True,
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'views'}},
+    )
+    def test_concurrent_flushes_do_not_double_count(self):
+        post = self.posts[0]
+        view_counter.record_view(post.pk, 5)
+        # 另一个进程在本进程扣减之前读到了同样的计数
+        stale = cache.get_many([view_counter._cache_key(post.pk)])
+        self.assertEqual(view_counter.flush(), 5)
+        view_counter._dirty.add(post.pk)
+        with mock.patch.object(view_counter.cache, 'get_many', return_value=stale):
+            self.assertEqual(view_counter.flush(), 0)
+        self.assertEqual(Post.objects.get(pk=post.pk).views, 5)
+        self.assertEqual(view_counter.pending_views(post.pk), 0)
+        self.assertEqual(cache.get(view_counter._cache_key(post.pk)), 0)
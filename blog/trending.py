@@ -0,0 +1,129 @@
+"""
+按时间分桶的浏览统计与热门排行。
+
+`view_counter` 每次写回浏览量时调用 `record_views`，把增量累加到当前小时的桶中；
+`update_trending` 命令定时运行：先把过期的小时桶合并成天桶、删除过旧的天桶，
+再按半衰期对各桶的浏览量做指数衰减求和，把得分最高的文章写入 TrendingPost。
+侧边栏和首页只读取这张很小的排行表。
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, FloatField, Sum, Value, When
+from django.db.models.functions import TruncDay
+from django.utils import timezone
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _hour_start(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def record_views(increments, now=None):
+    """把 {post_id: n} 累加到当前小时的浏览量桶中。"""
+    from .models import Post, PostViewBucket
+
+    if not increments:
+        return
+    bucket_start = _hour_start(now or timezone.now())
+    post_ids = set(Post.objects.filter(pk__in=list(increments)).values_list('pk', flat=True))
+    if not post_ids:
+        return
+
+    # 先确保桶存在（已存在则忽略），再统一做原子累加，并发写回时也不会丢失计数
+    PostViewBucket.objects.bulk_create(
+        [PostViewBucket(post_id=pk, granularity='hour', bucket_start=bucket_start) for pk in post_ids],
+        ignore_conflicts=True,
+    )
+    groups = defaultdict(list)
+    for pk in post_ids:
+        groups[increments[pk]].append(pk)
+    for n, ids in groups.items():
+        PostViewBucket.objects.filter(
+            post_id__in=ids, granularity='hour', bucket_start=bucket_start
+        ).update(count=F('count') + n)
+
+
+def compact(now=None):
+    """把超过保留期的小时桶合并为天桶，并删除超过保留期的天桶。返回 (合并的小时桶数, 删除的天桶数)。"""
+    from .models import PostViewBucket
+
+    now = now or timezone.now()
+    hourly_cutoff = _hour_start(now - timedelta(hours=_setting('VIEW_BUCKET_HOURLY_RETENTION_HOURS', 48)))
+    daily_cutoff = now - timedelta(days=_setting('VIEW_BUCKET_DAILY_RETENTION_DAYS', 90))
+
+    with transaction.atomic():
+        old_hours = PostViewBucket.objects.filter(granularity='hour', bucket_start__lt=hourly_cutoff)
+        totals = {
+            (row['post_id'], row['day']): row['total']
+            for row in old_hours.annotate(day=TruncDay('bucket_start'))
+            .values('post_id', 'day')
+            .annotate(total=Sum('count'))
+            .order_by()
+        }
+        if totals:
+            existing = {
+                (bucket.post_id, bucket.bucket_start): bucket
+                for bucket in PostViewBucket.objects.filter(
+                    granularity='day',
+                    post_id__in={post_id for post_id, _ in totals},
+                    bucket_start__in={day for _, day in totals},
+                )
+            }
+            to_update, to_create = [], []
+            for (post_id, day), total in totals.items():
+                bucket = existing.get((post_id, day))
+                if bucket is None:
+                    to_create.append(PostViewBucket(post_id=post_id, granularity='day', bucket_start=day, count=total))
+                else:
+                    bucket.count += total
+                    to_update.append(bucket)
+            PostViewBucket.objects.bulk_update(to_update, ['count'], batch_size=500)
+            PostViewBucket.objects.bulk_create(to_create, batch_size=500)
+        merged, _ = old_hours.delete()
+        expired, _ = PostViewBucket.objects.filter(granularity='day', bucket_start__lt=daily_cutoff).delete()
+    return merged, expired
+
+
+def update_rankings(now=None):
+    """重新计算热门排行，返回上榜文章数。"""
+    from .models import PostViewBucket, TrendingPost
+    from . import sidebar
+
+    now = now or timezone.now()
+    half_life = _setting('TRENDING_HALF_LIFE_HOURS', 24)
+    window_start = now - timedelta(days=_setting('TRENDING_WINDOW_DAYS', 7))
+    size = _setting('TRENDING_SIZE', 20)
+
+    buckets = PostViewBucket.objects.filter(bucket_start__gte=window_start, post__status='published')
+    starts = buckets.order_by().values_list('bucket_start', flat=True).distinct()
+    # 窗口内不同的桶起始时间只有几十个，为每个时间点预先算好衰减系数，在数据库中加权求和
+    decay = Case(
+        *[
+            When(bucket_start=start, then=Value(0.5 ** ((now - start).total_seconds() / 3600 / half_life)))
+            for start in starts
+        ],
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+    rows = []
+    if starts:
+        rows = list(
+            buckets.values('post_id')
+            .annotate(score=Sum(F('count') * decay, output_field=FloatField()))
+            .order_by('-score', '-post_id')[:size]
+        )
+
+    with transaction.atomic():
+        TrendingPost.objects.all().delete()
+        TrendingPost.objects.bulk_create(
+            TrendingPost(post_id=row['post_id'], score=row['score'], rank=rank)
+            for rank, row in enumerate(rows, start=1)
+        )
+    sidebar.bump_generation()
+    return len(rows)
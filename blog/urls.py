@@ -1,5 +1,9 @@
 from django.urls import path
 from . import views
+from .feeds import (
+    cached_feed, LatestPostsFeed, LatestPostsAtomFeed, CategoryPostsFeed, CategoryPostsAtomFeed,
+    AuthorPostsFeed, AuthorPostsAtomFeed,
+)
 
 app_name = 'blog'
 
@@ -12,6 +16,13 @@ urlpatterns = [
     path('author/<str:username>/', views.AuthorPostListView.as_view(), name='author_posts'),
     path('category/<slug:slug>/', views.CategoryPostListView.as_view(), name='category_posts'),
     path('search/', views.search, name='search'),
+    path('feed/rss/', cached_feed(LatestPostsFeed), name='latest_feed'),
+    path('feed/atom/', cached_feed(LatestPostsAtomFeed), name='latest_atom_feed'),
+    path('category/<slug:slug>/feed/rss/', cached_feed(CategoryPostsFeed), name='category_feed'),
+    path('category/<slug:slug>/feed/atom/', cached_feed(CategoryPostsAtomFeed), name='category_atom_feed'),
+    path('author/<str:username>/feed/rss/', cached_feed(AuthorPostsFeed), name='author_feed'),
+    path('author/<str:username>/feed/atom/', cached_feed(AuthorPostsAtomFeed), name='author_atom_feed'),
     path('drafts/', views.DraftListView.as_view(), name='draft_list'),
     path('comment/<int:pk>/delete/', views.delete_comment, name='delete_comment'),
+    path('post/<int:pk>/comments/', views.post_comments, name='post_comments'),
 ]
\ No newline at end of file
@@ -0,0 +1,24 @@
+import html
+import re
+from django.utils.html import strip_tags
+
+_whitespace_re = re.compile(r'\s+')
+
+
+def html_to_text(value):
+    """把 CKEditor 生成的 HTML 正文转换为压缩空白后的纯文本。"""
+    if not value:
+        return ''
+    text = html.unescape(strip_tags(value))
+    return _whitespace_re.sub(' ', text).strip()
+
+
+# 中日韩文字按单字计数，其余按空白分隔的单词计数
+CJK_CHARACTER_CLASS = r'[぀-ヿ㐀-䶿一-鿿豈-﫿가-힯]'
+_cjk_re = re.compile(CJK_CHARACTER_CLASS)
+_word_re = re.compile(r'[A-Za-z0-9_À-ɏ]+(?:[\'’-][A-Za-z0-9_À-ɏ]+)*')
+
+
+def count_words(text):
+    """统计纯文本的字数：汉字（及日韩文字）每字计一，其它语言按单词计数。"""
+    return len(_cjk_re.findall(text)) + len(_word_re.findall(text))
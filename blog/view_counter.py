@@ -0,0 +1,191 @@
+"""
+文章浏览量计数器。
+
+详情页不再在每次请求中写数据库，而是把浏览量先累积在内存里（可选地放在共享缓存中），
+再由后台定时器、进程退出钩子或 `flush_views` 管理命令批量写回，
+写回时使用 `F('views') + n` 原子更新，并发请求下不会丢失计数。
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.db.models import F
+
+from . import trending
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY_PREFIX = 'blog:views:'
+
+_lock = threading.Lock()
+_pending = Counter()      # 本进程内尚未写回的增量 {post_id: n}
+_dirty = set()            # 共享缓存模式下，本进程写过计数的文章 ID
+_flusher = None
+
+
+def _flush_interval():
+    return getattr(settings, 'VIEW_COUNTER_FLUSH_INTERVAL', 10)
+
+
+def _use_cache():
+    return getattr(settings, 'VIEW_COUNTER_USE_CACHE', False)
+
+
+def _max_pending():
+    return getattr(settings, 'VIEW_COUNTER_MAX_PENDING', 1000)
+
+
+def _cache_key(post_id):
+    return f'{CACHE_KEY_PREFIX}{post_id}'
+
+
+def record_view(post_id, count=1):
+    """记录一次（或多次）浏览，不产生任何数据库写入。"""
+    if _use_cache():
+        key = _cache_key(post_id)
+        cache.add(key, 0, timeout=None)
+        try:
+            cache.incr(key, count)
+        except ValueError:
+            # 键在 add 与 incr 之间被淘汰，重新写入即可
+            cache.set(key, count, timeout=None)
+        with _lock:
+            _dirty.add(post_id)
+            backlog = len(_dirty)
+    else:
+        with _lock:
+            _pending[post_id] += count
+            backlog = len(_pending)
+
+    _ensure_flusher()
+    # 积压过多（例如定时器被禁用）时，就地写回一次，避免内存无限增长
+    if backlog >= _max_pending():
+        flush()
+
+
+def pending_views(post_id):
+    """返回某篇文章尚未写回数据库的浏览量，用于页面展示。"""
+    if _use_cache():
+        # 并发写回时计数可能短暂为负
+        return max(0, cache.get(_cache_key(post_id)) or 0)
+    with _lock:
+        return _pending.get(post_id, 0)
+
+
+def _collect():
+    """取出待写回的增量，返回 {post_id: n}。"""
+    if not _use_cache():
+        with _lock:
+            increments = dict(_pending)
+            _pending.clear()
+        return increments
+
+    with _lock:
+        post_ids = list(_dirty)
+        _dirty.clear()
+    if not post_ids:
+        return {}
+    values = cache.get_many([_cache_key(pk) for pk in post_ids])
+    increments = {}
+    for pk in post_ids:
+        n = values.get(_cache_key(pk)) or 0
+        if n <= 0:
+            continue
+        # 只扣减本次读到的数量，读取之后新到的浏览量留给下一次写回。
+        # 其他进程可能同时读到同样的数量并先扣减了，以 decr 的结果为准：
+        # 计数被扣成负数时，只取实际扣到的部分，多扣的加回去
+        try:
+            remaining = cache.decr(_cache_key(pk), n)
+        except ValueError:
+            continue
+        if remaining < 0:
+            n += remaining
+            try:
+                cache.incr(_cache_key(pk), -remaining)
+            except ValueError:
+                pass
+        if n > 0:
+            increments[pk] = n
+    return increments
+
+
+def _restore(increments):
+    """写回失败时把增量放回缓冲区，等待下一次重试。"""
+    if _use_cache():
+        for pk, n in increments.items():
+            key = _cache_key(pk)
+            cache.add(key, 0, timeout=None)
+            cache.incr(key, n)
+        with _lock:
+            _dirty.update(increments)
+    else:
+        with _lock:
+            _pending.update(increments)
+
+
+def flush():
+    """把累积的浏览量批量写回数据库，返回写回的浏览次数。"""
+    from .models import Post
+
+    increments = _collect()
+    if not increments:
+        return 0
+
+    # 相同增量的文章合并成一条 UPDATE
+    groups = defaultdict(list)
+    for pk, n in increments.items():
+        groups[n].append(pk)
+    written = set()
+    for n, post_ids in groups.items():
+        try:
+            Post.objects.filter(pk__in=post_ids).update(views=F('views') + n)
+        except Exception:
+            # 只放回尚未写入的部分，已成功的分组不会被重复计数
+            _restore({pk: increments[pk] for pk in increments if pk not in written})
+            raise
+        written.update(post_ids)
+
+    # 同时累加到按小时分桶的浏览统计中，供热门排行使用
+    try:
+        trending.record_views(increments)
+    except Exception:
+        logger.exception('浏览量分桶统计写入失败')
+    return sum(increments.values())
+
+
+def _run_flusher(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            flush()
+        except Exception:
+            logger.exception('浏览量写回失败')
+        finally:
+            close_old_connections()
+
+
+def _ensure_flusher():
+    """按需启动后台写回线程（每个进程一个）。"""
+    global _flusher
+    interval = _flush_interval()
+    if _flusher is not None or not interval:
+        return
+    with _lock:
+        if _flusher is None:
+            _flusher = threading.Thread(
+                target=_run_flusher, args=(interval,), name='view-counter-flusher', daemon=True
+            )
+            _flusher.start()
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        flush()
+    except Exception:
+        logger.exception('进程退出时写回浏览量失败')
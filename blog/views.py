@@ -5,58 +5,60 @@ from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.messages.views import SuccessMessageMixin
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.urls import reverse_lazy
-from django.db.models import Count, Q
-from django.http import HttpResponseRedirect
-from .models import Post, Comment, Category
+from django.urls import reverse, reverse_lazy
+from django.http import FileResponse, Http404, HttpResponseRedirect
+from .models import Post, Comment, Category, RelatedPost, ImageJob
 from .forms import CommentForm, SearchForm, PostForm
 from django.contrib.auth.models import User
 from django.utils import timezone
-from django.core.files.storage import default_storage
 from django.views.decorators.csrf import csrf_exempt
-import uuid
+from django.utils.decorators import method_decorator
+from django.core.files.storage import default_storage
+from myblog.image_utils import (
+    AVATAR_WIDTHS, VARIANT_FORMATS, ImageTooLarge, check_image_limits, make_variant, parse_variant, variant_widths,
+)
 import os
 from django.http import JsonResponse
-from myblog.image_utils import compress_image
+from . import image_jobs, sidebar, view_counter
+from .page_cache import anonymous_page_cache
+from .pagination import KeysetPaginationMixin
+from .search import search_posts
 # 首页视图
+@anonymous_page_cache
 def home(request):
     """博客首页，显示最新发布的文章"""
-    posts = Post.objects.filter(status='published').order_by('-publish')[:6]
-    categories = Category.objects.annotate(post_count=Count('posts')).order_by('-post_count')[:5]
-    popular_posts = Post.objects.filter(status='published').order_by('-views')[:4]
+    posts = Post.objects.filter(status='published').defer('content').order_by('-publish')[:6]
     
     context = {
         'posts': posts,
-        'categories': categories,
-        'popular_posts': popular_posts,
+        'categories': sidebar.lazy_categories(5),
+        'popular_posts': sidebar.lazy_popular_posts(4),
     }
     return render(request, 'blog/home.html', context)
 
 # 搜索视图
 def search(request):
-    """文章搜索功能"""
+    """文章搜索功能（全文索引 + BM25 排序 + 分页）"""
     form = SearchForm(request.GET or None)
     query = None
-    results = []
+    page_obj = None
     
     if 'query' in request.GET and form.is_valid():
         query = form.cleaned_data['query']
-        results = Post.objects.filter(
-            Q(title__icontains=query) | 
-            Q(content__icontains=query),
-            status='published'
-        ).order_by('-publish')
+        paginator = Paginator(search_posts(query), 10)
+        page_obj = paginator.get_page(request.GET.get('page'))
     
     context = {
         'form': form,
         'query': query,
-        'results': results,
-        'categories': Category.objects.annotate(post_count=Count('posts')).order_by('-post_count'),
+        'results': page_obj or [],
+        'page_obj': page_obj,
     }
     return render(request, 'blog/search_results.html', context)
 
 # 文章列表视图
-class PostListView(ListView):
+@method_decorator(anonymous_page_cache, name='dispatch')
+class PostListView(KeysetPaginationMixin, ListView):
     """显示所有已发布的文章，支持分页"""
     model = Post
     template_name = 'blog/post_list.html'
@@ -65,7 +67,7 @@ class PostListView(ListView):
     
     def get_queryset(self):
         # ==================== 核心修改：只显示已发布的文章 ====================
-        queryset = super().get_queryset().filter(status='published')
+        queryset = super().get_queryset().filter(status='published').defer('content')
         # =====================================================================
         
         category_slug = self.kwargs.get('category_slug')
@@ -80,13 +82,19 @@ class PostListView(ListView):
             queryset = queryset.filter(author=author)
             
         return queryset
-    
-    def get_context_data(self,** kwargs):
-        context = super().get_context_data(**kwargs)
-        context['categories'] = Category.objects.annotate(post_count=Count('posts')).order_by('-post_count')
-        return context
+
+def paginate_comments(post, page):
+    # 评论按物化路径排序即为树的先序遍历，分页直接在 SQL 中完成
+    paginator = Paginator(Comment.visible_thread(post.pk), 5)
+    try:
+        return paginator.page(page)
+    except PageNotAnInteger:
+        return paginator.page(1)
+    except EmptyPage:
+        return paginator.page(paginator.num_pages)
 
 # 文章详情视图
+@method_decorator(anonymous_page_cache, name='dispatch')
 class PostDetailView(DetailView):
     """文章详情页视图，处理文章显示和评论提交"""
     model = Post
@@ -99,8 +107,9 @@ class PostDetailView(DetailView):
         day = self.kwargs.get('day')
         post_slug = self.kwargs.get('post')
         
+        # 作者资料和分类随文章一起查询，模板中使用时不再单独查询
         return get_object_or_404(
-            Post,
+            Post.objects.select_related('author__profile', 'category'),
             slug=post_slug,
             status='published',
             publish__year=year,
@@ -110,44 +119,38 @@ class PostDetailView(DetailView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        post = self.get_object()
-        post.views += 1
-        post.save(update_fields=['views'])
-        root_comments = post.comments.filter(active=True, parent=None).order_by('created_on')
-        # 定义一个函数，用于递归地将评论树“压平”成一个带层级的列表
-        def flatten_comments(comments, level=0):
-            result = []
-            for comment in comments:
-                comment.level = level  # 为每个评论对象动态添加一个 level 属性
-                result.append(comment)
-                # 获取该评论的所有回复
-                replies = comment.replies.filter(active=True).order_by('created_on')
-                if replies:
-                    # 将回复的压平结果追加到当前列表中
-                    result.extend(flatten_comments(replies, level + 1))
-            return result
-
-        # 生成最终的、扁平化的评论列表
-        comment_list = flatten_comments(root_comments)
-
-        paginator = Paginator(comment_list, 5)
-        page = self.request.GET.get('page')
+        post = self.object
+        if getattr(self.request, 'prerender', False):
+            # 预渲染为静态文件时不计浏览量，评论改由页面加载后请求评论片段
+            context['defer_comments'] = True
+        else:
+            # 浏览量先累积在内存中，由计数器批量写回，详情页本身不产生写操作
+            view_counter.record_view(post.pk)
+            context['comment_form'] = CommentForm()
+            context['comments'] = paginate_comments(post, self.request.GET.get('page'))
+        post.views += view_counter.pending_views(post.pk)
+        context['related_posts'] = self.get_related_posts(post)
+        return context
 
-        try:
-            comments = paginator.page(page)
-        except PageNotAnInteger:
-            comments = paginator.page(1)
-        except EmptyPage:
-            comments = paginator.page(paginator.num_pages)
-
-        context['comment_form'] = CommentForm()
-        context['comments'] = comments
-        context['related_posts'] = Post.objects.filter(
+    def get_related_posts(self, post, limit=3):
+        # 优先使用预先计算好的内容相似文章，尚未计算时退回同分类的最新文章
+        entries = RelatedPost.objects.filter(
+            post=post,
+            related__status='published'
+        ).select_related('related').defer('related__content').order_by('rank')[:limit]
+        related_posts = [entry.related for entry in entries]
+        if related_posts:
+            return related_posts
+        return Post.objects.filter(
             category=post.category,
             status='published'
-        ).exclude(id=post.id).order_by('-publish')[:3]
-        context['categories'] = Category.objects.annotate(post_count=Count('posts')).order_by('-post_count')
-        return context
+        ).exclude(id=post.id).defer('content').order_by('-publish')[:limit]
+
+    def render_to_response(self, context, **response_kwargs):
+        response = super().render_to_response(context, **response_kwargs)
+        # 供页面缓存在命中时继续记录浏览量
+        response.page_cache_post_id = self.object.pk
+        return response
 
     def post(self, request, *args, **kwargs):
         self.object = self.get_object()
@@ -165,7 +168,7 @@ class PostDetailView(DetailView):
             parent_id = request.POST.get('parent_id')
             if parent_id:
                 try:
-                    comment.parent = Comment.objects.get(id=parent_id)
+                    comment.parent = Comment.objects.get(id=parent_id, post=self.object)
                 except Comment.DoesNotExist:
                     pass
 
@@ -181,6 +184,19 @@ class PostDetailView(DetailView):
             
         return HttpResponseRedirect(self.object.get_absolute_url())
 
+# 评论片段视图（预渲染的静态详情页通过它加载评论）
+def post_comments(request, pk):
+    post = get_object_or_404(Post, pk=pk, status='published')
+    # 静态页面不经过 Django，浏览量在首次加载评论时记录
+    if request.GET.get('record_view'):
+        view_counter.record_view(post.pk)
+    context = {
+        'post': post,
+        'comments': paginate_comments(post, request.GET.get('page')),
+        'comment_form': CommentForm(),
+    }
+    return render(request, 'blog/partials/comments_section.html', context)
+
 # 创建文章视图
 class PostCreateView(LoginRequiredMixin, SuccessMessageMixin, CreateView):
     model = Post
@@ -284,7 +300,8 @@ class PostDeleteView(LoginRequiredMixin, UserPassesTestMixin, SuccessMessageMixi
         return super(PostDeleteView, self).delete(request, *args, **kwargs)
 
 # 作者文章列表视图
-class AuthorPostListView(ListView):
+@method_decorator(anonymous_page_cache, name='dispatch')
+class AuthorPostListView(KeysetPaginationMixin, ListView):
     model = Post
     template_name = 'blog/author_posts.html'
     context_object_name = 'posts'
@@ -295,16 +312,16 @@ class AuthorPostListView(ListView):
         return Post.objects.filter(
             author=self.author,
             status='published'
-        ).order_by('-publish')
+        ).defer('content').order_by('-publish')
     
     def get_context_data(self,** kwargs):
         context = super().get_context_data(**kwargs)
         context['author'] = self.author
-        context['categories'] = Category.objects.annotate(post_count=Count('posts')).order_by('-post_count')
         return context
 
 # 分类文章列表视图
-class CategoryPostListView(ListView):
+@method_decorator(anonymous_page_cache, name='dispatch')
+class CategoryPostListView(KeysetPaginationMixin, ListView):
     model = Post
     template_name = 'blog/category_posts.html'
     context_object_name = 'posts'
@@ -312,12 +329,11 @@ class CategoryPostListView(ListView):
     
     def get_queryset(self):
         self.category = get_object_or_404(Category, slug=self.kwargs['slug'])
-        return Post.objects.filter(category=self.category, status='published').order_by('-publish')
+        return Post.objects.filter(category=self.category, status='published').defer('content').order_by('-publish')
     
     def get_context_data(self,** kwargs):
         context = super().get_context_data(**kwargs)
         context['category'] = self.category
-        context['categories'] = Category.objects.annotate(post_count=Count('posts')).order_by('-post_count')
         return context
 
 # 删除评论视图
@@ -361,9 +377,10 @@ def delete_comment(request, pk):
 def ckeditor_upload_view(request):
     """
     一个自定义的、安全的 CKEditor 图片上传视图，整合了：
-    1. 图片压缩功能。
-    2. 基于 UUID 的唯一、安全文件名生成。
-    3.严格的文件类型白名单检查。
+    1. 基于 UUID 的唯一、安全文件名生成。
+    2.严格的文件类型白名单检查。
+    3. 原图保存后立即返回，压缩交给后台处理（见 blog.image_jobs），
+       编辑器轮询处理状态，完成后换成压缩后的地址。
     """
     if request.method == 'POST' and request.FILES.get('upload'):
         uploaded_file = request.FILES['upload']
@@ -378,23 +395,29 @@ def ckeditor_upload_view(request):
                     'error': {'message': '不支持的文件类型。'}
                 }, status=400)
 
-            # 调用我们的压缩函数 ---
-            _, compressed_file = compress_image(uploaded_file)
-            
-            # 生成基于 UUID 的安全文件名 (借鉴自您的函数) ---
-            safe_filename = f"{uuid.uuid4().hex}.jpg"
-            
-            # 保存压缩后的图片 ---
-            save_path = os.path.join('posts', safe_filename)
-            
-            # 使用 Django 的文件存储 API 保存文件
-            actual_filename = default_storage.save(save_path, compressed_file)
-            
-            # 获取已保存文件的公共 URL
-            file_url = default_storage.url(actual_filename)
-
-            # 按 CKEditor 要求返回 JSON
-            return JsonResponse({'url': file_url})
+            # 解码前检查文件大小和像素数，超大的图片不保存也不进入处理队列
+            try:
+                check_image_limits(uploaded_file)
+            except ImageTooLarge as e:
+                return JsonResponse({'error': {'message': str(e)}}, status=413)
+
+            # 背压：待处理的图片过多时拒绝新的上传，让编辑器稍后重试
+            if image_jobs.is_async() and image_jobs.is_saturated():
+                response = JsonResponse({
+                    'error': {'message': '服务器正忙于处理其他图片，请稍后再试。'}
+                }, status=503)
+                response['Retry-After'] = '30'
+                return response
+
+            job = image_jobs.submit_inline(uploaded_file)
+            if job.pk:
+                job.refresh_from_db()
+
+            # 按 CKEditor 要求返回 JSON（处理完成前 url 为原图地址）
+            return JsonResponse({
+                **image_jobs.job_status(job),
+                'status_url': reverse('ckeditor_upload_status'),
+            })
 
         except Exception as e:
             print(f"--- 图片处理/保存时出错: {e} ---")
@@ -402,15 +425,43 @@ def ckeditor_upload_view(request):
 
     return JsonResponse({'error': {'message': '无效的请求或未上传文件。'}}, status=400)
 
-class DraftListView(LoginRequiredMixin, ListView):
+def image_variant(request, width, path):
+    """
+    按需生成响应式图片变体并返回。变体写入磁盘后由 Web 服务器直接提供，
+    只有文件尚不存在的请求才会转发到这里。
+    """
+    parsed = parse_variant(path)
+    if width not in (*variant_widths(), *AVATAR_WIDTHS) or parsed is None:
+        raise Http404
+    name, fmt = parsed
+    if not default_storage.exists(name):
+        raise Http404
+    target = make_variant(name, width, fmt)
+    response = FileResponse(default_storage.open(target), content_type=VARIANT_FORMATS[fmt][1])
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+def ckeditor_upload_status(request):
+    """查询上传图片的处理状态：?url=<编辑器中图片的地址>。"""
+    source = image_jobs.source_from_url(request.GET.get('url'))
+    job = ImageJob.objects.filter(source=source).first() if source else None
+    if job is None:
+        return JsonResponse({'error': {'message': '找不到该图片的处理任务。'}}, status=404)
+    if job.status == 'pending':
+        # 编辑器仍在等待时，顺带接管进程重启前丢失的重试
+        image_jobs.recover_due_jobs()
+    return JsonResponse(image_jobs.job_status(job))
+
+class DraftListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = Post
     template_name = 'blog/draft_list.html' 
     context_object_name = 'drafts'
     paginate_by = 10
+    keyset_fields = ('updated', 'id')
 
     def get_queryset(self):
         # 返回当前登录用户的、状态为'draft'的文章，按更新时间排序
         return Post.objects.filter(
             author=self.request.user, 
             status='draft'
-        ).order_by('-updated')
\ No newline at end of file
+        ).defer('content').order_by('-updated')
\ No newline at end of file
@@ -1,46 +1,283 @@
 # django-blog/myblog/image_utils.py
 
+import hashlib
+import logging
+import math
 import os
-from io import BytesIO
+import tempfile
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
 from PIL import Image
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import File
+from django.core.files.images import get_image_dimensions
+from django.core.files.storage import default_storage
 
-def compress_image(uploaded_image, target_mb=1, quality=90, min_quality=20):
+from .instrumentation import record
+
+logger = logging.getLogger(__name__)
+
+# 响应式图片变体保存在 MEDIA_ROOT/variants/<宽度>/<原图路径>.<格式>
+VARIANT_DIR = 'variants'
+VARIANT_FORMATS = {
+    'jpg': ('JPEG', 'image/jpeg'),
+    'webp': ('WEBP', 'image/webp'),
+}
+# 头像变体的固定宽度：导航栏 32px、评论区 60px、个人资料页（150px 的 2 倍）300px
+AVATAR_WIDTHS = (32, 60, 300)
+
+
+class ImageTooLarge(ValueError):
+    """上传的图片超出文件大小或像素数上限，在解码前拒绝。"""
+
+
+def _max_dimension():
+    return getattr(settings, 'IMAGE_MAX_DIMENSION', 2560)
+
+
+def _quality_tolerance():
+    return getattr(settings, 'IMAGE_QUALITY_TOLERANCE', 5)
+
+
+def _max_upload_bytes():
+    return getattr(settings, 'IMAGE_MAX_UPLOAD_MB', 20) * 1024 * 1024
+
+
+def _max_pixels():
+    return getattr(settings, 'IMAGE_MAX_PIXELS', 25_000_000)
+
+
+# --- 内存峰值估算 ---
+
+_memory = ContextVar('image_memory', default=None)
+
+
+class _MemoryTracker:
+    __slots__ = ('current', 'peak')
+
+    def __init__(self):
+        self.current = 0
+        self.peak = 0
+
+
+def _buffer_size(image):
+    # Pillow 的单通道模式每像素 1 字节，其余模式（RGB 也按 RGBX 存放）每像素 4 字节
+    return image.width * image.height * (1 if image.mode in ('1', 'L', 'P') else 4)
+
+
+def _track(released=0, allocated=0):
+    """记录一次缓冲区替换：新缓冲区分配时旧的还没有释放，两者短暂同时存在。"""
+    tracker = _memory.get()
+    if tracker is not None:
+        tracker.peak = max(tracker.peak, tracker.current + allocated)
+        tracker.current += allocated - released
+
+
+@contextmanager
+def measure_memory(name='image'):
+    """
+    估算块内图片处理的内存峰值（同时存在的像素缓冲区与内存中的编码结果之和），
+    计入当前请求的性能指标（`myblog.instrumentation`）。Pillow 的像素内存不经过
+    Python 的分配器，tracemalloc 统计不到，因此按图像尺寸和模式估算。嵌套时只由最外层汇报。
+    """
+    if _memory.get() is not None:
+        yield
+        return
+    tracker = _MemoryTracker()
+    token = _memory.set(tracker)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _memory.reset(token)
+        elapsed = (time.perf_counter() - start) * 1000
+        peak_mb = round(tracker.peak / (1024 * 1024), 2)
+        record(name, duration_ms=elapsed, peak_mb=peak_mb)
+        logger.debug('%s：内存峰值约 %.2f MB，用时 %.0f ms', name, peak_mb, elapsed)
+
+
+# --- 解码 ---
+
+def _check_bytes(source):
+    size = getattr(source, 'size', None)
+    if size is not None and size > _max_upload_bytes():
+        raise ImageTooLarge(
+            f'图片文件过大（{size / 1024 / 1024:.1f} MB），上限为 {_max_upload_bytes() // 1024 // 1024} MB。'
+        )
+
+
+def _open(source):
+    _check_bytes(source)
+    # 上传的文件可能已被表单校验或存储读过
+    source.seek(0)
+    try:
+        return Image.open(source)
+    except Image.DecompressionBombError as e:
+        raise ImageTooLarge(f'图片分辨率过高：{e}') from e
+
+
+def _prepare(image, box):
+    """
+    JPEG 按输出尺寸 box 设置 draft 模式，解码时直接按 1/2、1/4、1/8 缩小；
+    随后检查实际需要解码的像素数，超出 IMAGE_MAX_PIXELS 时抛出 ImageTooLarge。
+    """
+    scale = min(box[0] / image.width, box[1] / image.height)
+    if image.format == 'JPEG' and scale < 1:
+        image.draft('RGB', (math.ceil(image.width * scale), math.ceil(image.height * scale)))
+    if image.width * image.height > _max_pixels():
+        raise ImageTooLarge(
+            f'图片分辨率过高（{image.width}×{image.height}），像素数上限为 {_max_pixels()}。'
+        )
+    return image
+
+
+def open_image(source, box):
+    """只读取文件头打开图片，按输出尺寸 box 准备解码（见 `_prepare`），此时还没有解码像素。"""
+    return _prepare(_open(source), box)
+
+
+def check_image_limits(source):
+    """在保存或解码前检查上传图片的文件大小和像素数，只读取文件头；超出上限时抛出 ImageTooLarge。"""
+    max_dimension = _max_dimension()
+    open_image(source, (max_dimension, max_dimension))
+    source.seek(0)
+
+
+def _to_rgb(image):
+    # JPEG 只支持 RGB 和灰度（原先只转换了 RGBA/LA，调色板等模式会保存失败）
+    if image.mode in ('RGB', 'L'):
+        return image
+    converted = image.convert('RGB')
+    _track(_buffer_size(image), _buffer_size(converted))
+    return converted
+
+
+def load_image(source, max_dimension=None, max_width=None):
+    """
+    打开图片并缩小到最长边不超过 max_dimension（给出 max_width 时宽度也不超过它）。
+    超大的 JPEG 使用 draft 模式按缩小后的尺寸解码；其他格式先缩小再转换颜色模式，
+    全尺寸的像素只保留一份。
+    """
+    max_dimension = max_dimension or _max_dimension()
+    box = (min(max_width or max_dimension, max_dimension), max_dimension)
+    image = open_image(source, box)
+    image.load()
+    _track(allocated=_buffer_size(image))
+
+    # 调色板和二值图缩放时只能用最近邻插值，先转换；其余模式缩小后再转换，转换的是小图
+    if image.mode in ('1', 'P'):
+        image = _to_rgb(image)
+    if image.width > box[0] or image.height > box[1]:
+        # reducing_gap 让 Pillow 先整数倍快速缩小，再做高质量重采样
+        before = _buffer_size(image)
+        image.thumbnail(box, Image.LANCZOS, reducing_gap=3.0)
+        _track(before, _buffer_size(image))
+    return _to_rgb(image)
+
+
+# --- 编码 ---
+
+def _spool_size():
+    return getattr(settings, 'FILE_UPLOAD_MAX_MEMORY_SIZE', 2621440)
+
+
+def encode_image(image, image_format, name=None, **params):
+    """
+    把图片编码为文件对象，直接交给存储保存：较小的结果留在内存中，超过 FILE_UPLOAD_MAX_MEMORY_SIZE
+    时写入临时文件，不会产生额外的整份内存拷贝。
+    """
+    output = tempfile.SpooledTemporaryFile(max_size=_spool_size())
+    image.save(output, format=image_format, **params)
+    size = output.tell()
+    output.seek(0)
+    _track(allocated=min(size, _spool_size()))
+    encoded = File(output)
+    # 不让 File 从临时文件取名（写入磁盘后是文件描述符）
+    encoded.name = name
+    encoded.size = size
+    return encoded
+
+
+def _discard(encoded):
+    _track(released=min(encoded.size, _spool_size()))
+    encoded.close()
+
+
+def compress_image(uploaded_image, target_mb=1, quality=90, min_quality=20, max_dimension=None):
     """
     压缩图片至指定大小（MB）以下。
-    ... (此函数内容保持不变) ...
+    先把图片缩小到最长边不超过 IMAGE_MAX_DIMENSION，再用二分查找确定满足大小要求的最高质量，
+    相邻两次尝试的质量相差不超过 IMAGE_QUALITY_TOLERANCE 时停止。
+    最低质量仍超出目标大小时，返回最低质量的结果。
     """
     target_bytes = target_mb * 1024 * 1024
-    
-    image = Image.open(uploaded_image)
-
-    if image.mode in ('RGBA', 'LA'):
-        image = image.convert('RGB')
-
-    buffer = BytesIO()
-    image.save(buffer, format='JPEG', quality=quality)
-    
-    if buffer.tell() <= target_bytes:
-        filename_base = os.path.splitext(uploaded_image.name)[0]
-        new_filename = f"{filename_base}.jpg"
-        return new_filename, ContentFile(buffer.getvalue())
-
-    buffer = BytesIO()
-    current_quality = quality
-    while current_quality > min_quality:
-        buffer.seek(0)
-        buffer.truncate()
-        image.save(buffer, format='JPEG', quality=current_quality)
-        
-        if buffer.tell() <= target_bytes:
-            break
-        
-        current_quality -= 5
-
     filename_base = os.path.splitext(uploaded_image.name)[0]
     new_filename = f"{filename_base}.jpg"
-    
-    return new_filename, ContentFile(buffer.getvalue())
+
+    with measure_memory():
+        image = load_image(uploaded_image, max_dimension)
+        encoded = encode_image(image, 'JPEG', new_filename, quality=quality)
+        if encoded.size > target_bytes:
+            tolerance = _quality_tolerance()
+            best = None
+            low, high = min_quality, quality - 1
+            while low <= high:
+                current_quality = (low + high) // 2
+                if encoded is not best:
+                    _discard(encoded)
+                encoded = encode_image(image, 'JPEG', new_filename, quality=current_quality)
+                if encoded.size <= target_bytes:
+                    if best is not None:
+                        _discard(best)
+                    best = encoded
+                    if high - current_quality <= tolerance:
+                        break
+                    low = current_quality + 1
+                else:
+                    high = current_quality - 1
+            # 都不满足时 encoded 就是最后一次尝试的 min_quality 的结果
+            if best is not None and best is not encoded:
+                _discard(encoded)
+                encoded = best
+
+    return new_filename, encoded
+
+
+def crop_image(source, box, size):
+    """
+    从原图中裁出 box（原图坐标系下的 x, y, 宽, 高）并缩放为 size×size，返回 (格式, 编码后的文件)。
+    JPEG 按输出尺寸降低分辨率解码，裁剪与缩放一步完成，不保留全尺寸的中间结果。
+    """
+    x, y, width, height = box
+    width, height = max(width, 1), max(height, 1)
+    with measure_memory():
+        image = _open(source)
+        original_width = image.width
+        image_format = 'PNG' if image.format == 'PNG' else 'JPEG'
+        # 裁剪区域缩放到 size 即可，整张图按同样比例降低分辨率解码
+        image = _prepare(image, (math.ceil(image.width * size / width), math.ceil(image.height * size / height)))
+        image.load()
+        _track(allocated=_buffer_size(image))
+        # draft 模式下解码出的是缩小后的图片，裁剪框按同样比例换算
+        ratio = image.width / original_width
+        region = (x * ratio, y * ratio, (x + width) * ratio, (y + height) * ratio)
+        if image_format == 'JPEG':
+            image = _to_rgb(image)
+        elif image.mode in ('1', 'P'):
+            # 调色板图缩放时只能用最近邻插值，先裁出区域（只复制这一部分），再保留透明度转换为 RGBA
+            left, top = math.floor(region[0]), math.floor(region[1])
+            cropped = image.crop((left, top, math.ceil(region[2]), math.ceil(region[3])))
+            converted = cropped.convert('RGBA')
+            _track(_buffer_size(image), _buffer_size(cropped) + _buffer_size(converted))
+            image = converted
+            region = (region[0] - left, region[1] - top, region[2] - left, region[3] - top)
+        before = _buffer_size(image)
+        image = image.resize((size, size), Image.Resampling.LANCZOS, box=region, reducing_gap=3.0)
+        _track(before, _buffer_size(image))
+        encoded = encode_image(image, image_format, quality=90)
+    return image_format, encoded
 
 
 def ckeditor_image_processing(file, request):
@@ -48,4 +285,108 @@ def ckeditor_image_processing(file, request):
     CKEditor 5 的图片处理后端。
     """
     new_filename, compressed_file_obj = compress_image(file)
-    return new_filename, compressed_file_obj
\ No newline at end of file
+    return new_filename, compressed_file_obj
+
+
+# --- 响应式图片变体 ---
+
+def variant_widths():
+    return tuple(sorted(getattr(settings, 'IMAGE_VARIANT_WIDTHS', (320, 640, 960, 1280, 1920))))
+
+
+def _variant_quality():
+    return getattr(settings, 'IMAGE_VARIANT_QUALITY', 80)
+
+
+def variant_name(name, width, fmt):
+    return f'{VARIANT_DIR}/{width}/{name}.{fmt}'
+
+
+def parse_variant(path):
+    """variants 目录下的相对路径（不含宽度）-> (原图路径, 格式)，不是合法的变体时返回 None。"""
+    name, _, fmt = path.rpartition('.')
+    if fmt not in VARIANT_FORMATS or not name or name.startswith(f'{VARIANT_DIR}/'):
+        return None
+    return name, fmt
+
+
+def _size_key(name):
+    return f'image_utils:size:{hashlib.md5(name.encode()).hexdigest()}'
+
+
+def image_size(name):
+    """原图的 (宽, 高)，结果缓存起来，渲染页面时不必每次打开文件；文件不存在时返回 None。"""
+    key = _size_key(name)
+    size = cache.get(key)
+    if size is None:
+        try:
+            with default_storage.open(name) as f:
+                size = get_image_dimensions(f)
+        except OSError:
+            return None
+        if not size or None in size:
+            return None
+        cache.set(key, size, timeout=None)
+    return tuple(size)
+
+
+def variant_plan(name):
+    """
+    原图需要的变体 [(档位宽度, 实际宽度), ...]：比原图窄的档位，加上第一个不窄于原图的档位
+    （不放大，实际宽度即原图宽度）。
+    """
+    size = image_size(name)
+    if size is None:
+        return []
+    plan = []
+    for width in variant_widths():
+        if width < size[0]:
+            plan.append((width, width))
+        else:
+            plan.append((width, size[0]))
+            break
+    return plan
+
+
+def make_variant(name, width, fmt):
+    """生成（已存在时直接返回）某个变体，返回其存储路径。"""
+    target = variant_name(name, width, fmt)
+    if default_storage.exists(target):
+        return target
+    with measure_memory('image_variant'):
+        with default_storage.open(name) as f:
+            image = load_image(f, max_width=width)
+        encoded = encode_image(image, VARIANT_FORMATS[fmt][0], quality=_variant_quality())
+    saved = default_storage.save(target, encoded)
+    if saved != target:
+        # 并发请求已经生成了同一个变体，丢弃重复的文件
+        default_storage.delete(saved)
+    return target
+
+
+def delete_variants(name):
+    """
+    删除某个原图的全部变体并清除缓存的尺寸。文件名不是按内容生成的图片（如头像）被替换后，
+    新文件可能沿用旧的路径，需要先调用它，否则 make_variant 会把旧图的变体当作已生成。
+    """
+    for width in {*variant_widths(), *AVATAR_WIDTHS}:
+        for fmt in VARIANT_FORMATS:
+            target = variant_name(name, width, fmt)
+            if default_storage.exists(target):
+                default_storage.delete(target)
+    cache.delete(_size_key(name))
+
+
+def generate_variants(name, widths=None, formats=None):
+    """
+    上传处理完成后预先生成变体（默认为 variant_plan 中的全部档位和格式）；
+    失败不影响上传本身，缺失的变体会在首次请求时生成。
+    """
+    if widths is None:
+        widths = [width for width, _ in variant_plan(name)]
+    for width in widths:
+        for fmt in formats or VARIANT_FORMATS:
+            try:
+                make_variant(name, width, fmt)
+            except Exception:
+                logger.exception('生成图片变体失败：%s (%s, %s)', name, width, fmt)
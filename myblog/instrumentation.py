@@ -0,0 +1,217 @@
+# django-blog/myblog/instrumentation.py
+"""
+请求级性能埋点。
+
+`PerformanceMiddleware` 为每个请求统计：
+- SQL 查询次数与耗时（通过数据库连接的 `execute_wrapper`）；
+- 模板渲染耗时（最外层模板的 render，包含渲染期间惰性执行的查询和上下文处理器）；
+- 上下文处理器耗时；
+- 视图总耗时。
+
+模板与上下文处理器的计时由 `TimedDjangoTemplates` 模板后端完成（在 TEMPLATES 中替换默认后端），
+只包装经由该后端取得的模板，不修改 Django 的全局类。
+
+结果写入 `myblog.performance` 日志（每个请求一行 JSON）；超过阈值的慢查询会连同发起它的视图
+单独记录一条警告。开启 PERFORMANCE_SERVER_TIMING 后还会以 `Server-Timing` 响应头
+（浏览器开发者工具可直接查看）输出，但只发给工作人员和 INTERNAL_IPS 中的地址，
+数据库耗时等信息不会暴露给普通访客。其他模块可以通过 `record()` 附加自定义指标。
+
+统计数据保存在 contextvar 中，不在请求内（如后台线程）执行的代码不受影响；
+未启用时各个钩子只多一次 contextvar 读取，开销可以忽略。
+"""
+import json
+import logging
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger('myblog.performance')
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    __slots__ = ('view', 'queries', 'sql_ms', 'template_ms', 'template_depth', 'context_processor_ms', 'extra')
+
+    def __init__(self):
+        self.view = None
+        self.queries = 0
+        self.sql_ms = 0.0
+        self.template_ms = 0.0
+        self.template_depth = 0
+        self.context_processor_ms = 0.0
+        self.extra = {}
+
+
+def _enabled():
+    return getattr(settings, 'PERFORMANCE_INSTRUMENTATION', True)
+
+
+def _slow_query_ms():
+    return getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', 100)
+
+
+def record(name, duration_ms=None, **values):
+    """
+    为当前请求附加一项自定义指标。带 `duration_ms` 的指标会出现在 Server-Timing 头中，
+    其余字段只写入日志。不在请求内调用时什么也不做。
+    """
+    metrics = _current.get()
+    if metrics is None:
+        return
+    entry = metrics.extra.setdefault(name, {})
+    if duration_ms is not None:
+        entry['dur'] = entry.get('dur', 0.0) + duration_ms
+    entry.update(values)
+
+
+def _query_wrapper(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = (time.perf_counter() - start) * 1000
+        metrics.queries += 1
+        metrics.sql_ms += elapsed
+        if elapsed >= _slow_query_ms():
+            logger.warning(json.dumps({
+                'event': 'slow_query',
+                'view': metrics.view,
+                'duration_ms': round(elapsed, 2),
+                'sql': sql[:2000],
+            }, ensure_ascii=False))
+
+
+# --- 模板与上下文处理器的计时 ---
+
+class TimedTemplate(Template):
+
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return super().render(context, request)
+        # 模板标签中再次调用 render_to_string 等嵌套渲染只计入最外层，避免重复累加
+        metrics.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_depth -= 1
+            if metrics.template_depth == 0:
+                metrics.template_ms += (time.perf_counter() - start) * 1000
+
+
+def _timed_processor(processor):
+    def wrapper(request):
+        metrics = _current.get()
+        if metrics is None:
+            return processor(request)
+        start = time.perf_counter()
+        try:
+            return processor(request)
+        finally:
+            metrics.context_processor_ms += (time.perf_counter() - start) * 1000
+    wrapper.__wrapped__ = processor
+    return wrapper
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """
+    统计渲染耗时的 Django 模板后端，其余行为与 DjangoTemplates 相同。
+    {% include %}、{% extends %} 在模板引擎内部加载，不经过这里，不会被重复计时。
+    """
+
+    def __init__(self, params):
+        super().__init__(params)
+        # template_context_processors 是缓存属性，替换本后端引擎实例上的值即可
+        self.engine.template_context_processors = tuple(
+            _timed_processor(processor) for processor in self.engine.template_context_processors
+        )
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+def _show_server_timing(request):
+    """Server-Timing 只发给 INTERNAL_IPS 中的地址和已登录的工作人员。"""
+    if not getattr(settings, 'PERFORMANCE_SERVER_TIMING', False):
+        return False
+    if request.META.get('REMOTE_ADDR') in settings.INTERNAL_IPS:
+        return True
+    user = getattr(request, 'user', None)
+    return bool(user is not None and user.is_authenticated and user.is_staff)
+
+
+class PerformanceMiddleware:
+    """应放在 MIDDLEWARE 的最前面，使总耗时覆盖其余中间件。"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not _enabled():
+            return self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(_query_wrapper))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total_ms = (time.perf_counter() - start) * 1000
+
+        if _show_server_timing(request):
+            response['Server-Timing'] = self.server_timing(metrics, total_ms)
+        self.log(request, response, metrics, total_ms)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = _current.get()
+        if metrics is not None:
+            match = request.resolver_match
+            metrics.view = match.view_name if match else getattr(view_func, '__name__', None)
+
+    def server_timing(self, metrics, total_ms):
+        entries = [
+            f'db;dur={metrics.sql_ms:.1f};desc="{metrics.queries} queries"',
+            f'tpl;dur={metrics.template_ms:.1f}',
+            f'cp;dur={metrics.context_processor_ms:.1f}',
+        ]
+        entries.extend(
+            f'{name};dur={values["dur"]:.1f}' for name, values in metrics.extra.items() if 'dur' in values
+        )
+        entries.append(f'total;dur={total_ms:.1f}')
+        return ', '.join(entries)
+
+    def log(self, request, response, metrics, total_ms):
+        if not logger.isEnabledFor(logging.INFO):
+            return
+        data = {
+            'event': 'request',
+            'method': request.method,
+            'path': request.path,
+            'view': metrics.view,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 2),
+            'db_queries': metrics.queries,
+            'db_ms': round(metrics.sql_ms, 2),
+            'template_ms': round(metrics.template_ms, 2),
+            'context_processor_ms': round(metrics.context_processor_ms, 2),
+        }
+        if metrics.extra:
+            data['extra'] = metrics.extra
+        logger.info(json.dumps(data, ensure_ascii=False, default=str))
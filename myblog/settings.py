@@ -21,6 +21,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'myblog.instrumentation.PerformanceMiddleware', # 性能埋点，放在最前面以统计完整耗时
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -34,7 +35,7 @@ ROOT_URLCONF = 'myblog.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'myblog.instrumentation.TimedDjangoTemplates', # DjangoTemplates 加上渲染耗时统计（性能埋点）
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -154,4 +155,117 @@ CKEDITOR_5_CONFIGS = {
     },
 }
 
-# CKEDITOR_5_IMAGE_PROCESSING_BACKEND = "myblog.image_utils.ckeditor_image_processing"
\ No newline at end of file
+# CKEDITOR_5_IMAGE_PROCESSING_BACKEND = "myblog.image_utils.ckeditor_image_processing"
+
+# === 文章浏览量计数器 ===
+# 浏览量先在内存中累积，每隔 FLUSH_INTERVAL 秒批量写回数据库（0 表示关闭后台定时写回）
+VIEW_COUNTER_FLUSH_INTERVAL = 10
+# 多进程部署时可改为 True，使用共享缓存（如 Redis/Memcached）累积计数
+VIEW_COUNTER_USE_CACHE = False
+# 待写回的文章数达到该值时立即写回一次
+VIEW_COUNTER_MAX_PENDING = 1000
+
+# === 侧边栏缓存 ===
+# 分类文章数与热门文章的缓存时间（秒），文章/分类变动时会立即失效
+SIDEBAR_CACHE_TIMEOUT = 300
+
+# === 匿名访客整页缓存 ===
+# 为首页、文章列表、分类页、作者页和文章详情页缓存匿名访客看到的完整页面
+PAGE_CACHE_ENABLED = False
+PAGE_CACHE_TIMEOUT = 300
+
+# === 列表分页 ===
+# 列表页总数（仅用于展示“第 N / M 页”）的缓存时间（秒）
+PAGINATION_COUNT_CACHE_TIMEOUT = 60
+
+# === 相关文章 ===
+# 每篇文章预先计算并保存的相关文章数量
+RELATED_POSTS_TOP_K = 5
+# 文章保存后如何更新相关文章。thread：本进程的后台线程；sync：提交后在请求中执行；manual：不做增量更新。
+# 增量更新不会补齐其他文章因此空出的名次，进程重启时排队中的更新也会丢失，需定期运行 rebuild_related_posts
+RELATED_POSTS_MODE = 'thread'
+
+# === 热门文章排行 ===
+# 浏览量按半衰期（小时）做指数衰减，只统计最近 WINDOW_DAYS 天，排行保留前 SIZE 名
+TRENDING_HALF_LIFE_HOURS = 24
+TRENDING_WINDOW_DAYS = 7
+TRENDING_SIZE = 20
+# 小时桶保留的小时数（之后合并为天桶），天桶保留的天数
+VIEW_BUCKET_HOURLY_RETENTION_HOURS = 48
+VIEW_BUCKET_DAILY_RETENTION_DAYS = 90
+
+# === RSS / Atom 订阅源 ===
+# 订阅源正文的缓存时间（秒），文章发布、修改、撤回或删除时会自动换用新缓存
+FEED_CACHE_TIMEOUT = 3600
+# 为 True 时订阅源输出完整正文，否则只输出摘要
+FEED_FULL_CONTENT = False
+
+# === 站点地图 ===
+# 每个 sitemap 分片包含的最大网址数（不超过协议上限 50000），分片索引与分片正文的缓存时间（秒）
+SITEMAP_SHARD_SIZE = 50000
+SITEMAP_CACHE_TIMEOUT = 86400
+
+# === 静态预渲染 ===
+# prerender_static 命令输出静态 HTML 的目录（可由 Web 服务器直接提供给匿名访客）
+STATIC_PRERENDER_ROOT = os.path.join(BASE_DIR, 'prerendered')
+
+# === 性能埋点 ===
+# 统计每个请求的 SQL、模板、上下文处理器耗时，写入 myblog.performance 日志
+PERFORMANCE_INSTRUMENTATION = True
+# 是否输出 Server-Timing 响应头（含数据库耗时等内部信息）。开启后也只发给工作人员和 INTERNAL_IPS 中的地址；
+# 部署在同机反向代理之后时 REMOTE_ADDR 都是 127.0.0.1，不要把它加入 INTERNAL_IPS
+PERFORMANCE_SERVER_TIMING = False
+# 超过该耗时（毫秒）的查询会单独记录一条慢查询日志
+SLOW_QUERY_THRESHOLD_MS = 100
+
+# === 图片压缩 ===
+# 上传图片的最长边上限（像素），超出时先缩小再压缩
+IMAGE_MAX_DIMENSION = 2560
+# 二分查找压缩质量时的容差，找到的质量与最优值相差不超过该值即停止
+IMAGE_QUALITY_TOLERANCE = 5
+# 解码前检查的上限：上传文件大小（MB）与实际需要解码的像素数（JPEG 按缩小后的尺寸计算）
+IMAGE_MAX_UPLOAD_MB = 20
+IMAGE_MAX_PIXELS = 25_000_000
+
+# === 响应式图片 ===
+# 变体的宽度档位（像素），每档生成 JPEG 与 WebP 两种格式
+IMAGE_VARIANT_WIDTHS = (320, 640, 960, 1280, 1920)
+IMAGE_VARIANT_QUALITY = 80
+# <img sizes> 的默认值，对应正文栏在各断点下的显示宽度
+IMAGE_VARIANT_SIZES = '(min-width: 1400px) 870px, (min-width: 992px) 66vw, 100vw'
+
+# === 媒体去重 ===
+# 设为 True 时，处理后的上传图片按内容摘要命名保存，相同的图片只保存一份，按引用数清理
+MEDIA_DEDUP_ENABLED = False
+
+# === 图片后台处理 ===
+# thread：本进程内的线程池处理；queue：由 process_image_jobs 命令处理；sync：在请求中就地处理
+IMAGE_PIPELINE_MODE = 'thread'
+# 线程池大小（thread 模式）
+IMAGE_PIPELINE_WORKERS = 2
+# 未完成的任务达到该数量时拒绝新的上传（返回 503）
+IMAGE_PIPELINE_MAX_PENDING = 50
+# 最多尝试次数，第 n 次失败后等待 RETRY_DELAY * 2^(n-1) 秒再重试
+IMAGE_PIPELINE_MAX_ATTEMPTS = 3
+IMAGE_PIPELINE_RETRY_DELAY = 5
+# 处理中超过该秒数的任务视为处理者已退出，重新放回队列
+IMAGE_PIPELINE_STALE_SECONDS = 300
+# thread 模式下，每个进程至多每隔该秒数从数据库中接管一次到期或失联的任务（进程重启后丢失的重试）
+IMAGE_PIPELINE_RECOVER_INTERVAL = 60
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'myblog.performance': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
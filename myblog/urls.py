@@ -4,6 +4,8 @@ from django.conf import settings
 from django.conf.urls.static import static
 from blog.views import home
 from blog import views as blog_views
+from blog import sitemaps
+from myblog.image_utils import VARIANT_DIR
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -11,10 +13,15 @@ urlpatterns = [
     path('notifications/', include('notifications.urls')),
     path('', home, name='home'),
     path('blog/', include('blog.urls', namespace='blog')),
+    path('sitemap.xml', sitemaps.sitemap_index, name='sitemap_index'),
+    path('sitemap-<int:shard>.xml', sitemaps.sitemap_shard, name='sitemap_shard'),
     # CKEditor 5 自定义上传 URL - 必须在 django_ckeditor_5.urls 之前！
     path("ckeditor5/image_upload/", blog_views.ckeditor_upload_view, name="ckeditor_upload_view"),
+    path("ckeditor5/image_upload/status/", blog_views.ckeditor_upload_status, name="ckeditor_upload_status"),
     # 可以保留其他 ckeditor5 功能
     path('ckeditor5/', include('django_ckeditor_5.urls')),
+    # 响应式图片变体：磁盘上还没有的变体由 Django 生成（生产环境中 Web 服务器找不到文件时转发过来）
+    path(f'{settings.MEDIA_URL.lstrip("/")}{VARIANT_DIR}/<int:width>/<path:path>', blog_views.image_variant, name='image_variant'),
 ]
 
 if settings.DEBUG:
@@ -22,6 +22,12 @@ class Notification(models.Model):
         ordering = ('-timestamp',)
         verbose_name = "通知"
         verbose_name_plural = verbose_name
+        indexes = [
+            # 通知列表
+            models.Index(fields=['recipient', '-timestamp'], name='notif_recipient_timestamp'),
+            # 未读数量与“全部标为已读”
+            models.Index(fields=['recipient', 'read', '-timestamp'], name='notif_recipient_read_ts'),
+        ]
 
     def __str__(self):
         if self.target:
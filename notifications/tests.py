@@ -1,3 +1,35 @@
-from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from blog.models import Comment, Category
+from blog.tests.base import QueryBudgetTestCase, make_user, seed_blog
+
+
+class NotificationQueryBudgetTests(QueryBudgetTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = make_user()
+        cls.others = [make_user() for _ in range(3)]
+        cls.category = Category.objects.create(name='通知', slug='notifications')
+        cls.add_notifications(cls.reader, cls.others, cls.category, 12)
+
+    @staticmethod
+    def add_notifications(reader, others, category, count):
+        """为 reader 生成文章评论和评论回复两类通知，各 count 条左右，跨越多页。"""
+        posts = seed_blog([reader], [category], count // 4)
+        for i in range(count):
+            post = posts[i % len(posts)]
+            actor = others[i % len(others)]
+            # 别人评论了 reader 的文章
+            Comment.objects.create(post=post, user=actor, content=f'comment {i}')
+            # 别人回复了 reader 的评论
+            own = Comment.objects.create(post=post, user=reader, content=f'own {i}')
+            Comment.objects.create(post=post, user=actor, content=f'reply {i}', parent=own)
+
+    def grow(self):
+        self.add_notifications(self.reader, [*self.others, make_user()], self.category, 20)
+
+    def test_notification_list(self):
+        self.assertQueryBudget(
+            12, reverse('notifications:notification_list'), self.grow, user=self.reader
+        )
@@ -1,6 +1,8 @@
 from django.shortcuts import redirect
 from django.views.generic import ListView
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.contrib.contenttypes.prefetch import GenericPrefetch
+from blog.models import Post, Comment
 from .models import Notification
 from django.contrib.auth.decorators import login_required
 
@@ -11,8 +13,14 @@ class NotificationListView(LoginRequiredMixin, ListView):
     paginate_by = 10
 
     def get_queryset(self):
-        # 只获取当前登录用户的通知
-        return self.request.user.notifications.all()
+        # 只获取当前登录用户的通知；发起者资料和通知目标（文章或评论）一次性预取，避免逐条查询。
+        # 预取按主键取回后再与通知逐条对应，不需要模型默认的排序（去掉可省去一次临时排序）
+        return self.request.user.notifications.select_related('actor__profile').prefetch_related(
+            GenericPrefetch('target', [
+                Post.objects.defer('content').order_by(),
+                Comment.objects.select_related('post', 'parent').defer('post__content').order_by(),
+            ])
+        )
     
     def get(self, request, *args, **kwargs):
         # 当用户访问此页面时，将所有未读通知标记为已读
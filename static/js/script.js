@@ -81,55 +81,6 @@ document.addEventListener("DOMContentLoaded", function () {
         }, 3000);
     });
 
-    document.querySelectorAll('.reply-btn').forEach(button => {
-        button.addEventListener('click', function(event) {
-            event.preventDefault();
-
-            const commentId = this.dataset.commentId;
-            const username = this.dataset.username;
-            
-            // 直接通过 ID 找到对应的回复表单容器，这是最可靠的方式
-            const formContainer = document.querySelector(`#reply-form-container-${commentId}`);
-
-            // 获取主评论表单及其所有需要操作的元素
-            const mainFormContainer = document.querySelector('#main-comment-form-container');
-            const commentForm = document.querySelector('#commentForm');
-            const parentIdInput = document.querySelector('#parentId');
-            const commentTextarea = commentForm.querySelector('textarea');
-            const commentFormTitle = document.querySelector('#comment-form-title');
-
-            // 安全检查，确保所有元素都已找到
-            if (!formContainer || !mainFormContainer || !commentForm) {
-                console.error("评论表单或其容器未找到，无法执行回复操作。");
-                return;
-            }
-
-            // 判断是打开还是关闭回复框
-            const isAlreadyOpen = formContainer.style.display === 'block';
-
-            // 1. 先关闭所有已打开的回复框，并将主表单归位
-            document.querySelectorAll('.reply-form-container').forEach(container => {
-                if (container.style.display === 'block') {
-                    container.style.display = 'none';
-                    mainFormContainer.appendChild(commentForm);
-                    parentIdInput.value = '';
-                    commentFormTitle.textContent = '发表评论';
-                    commentTextarea.placeholder = '';
-                }
-            });
-
-            // 2. 如果刚才点击的回复框是关闭的，则打开它
-            if (!isAlreadyOpen) {
-                formContainer.appendChild(commentForm); // 将主表单移动到当前回复框
-                parentIdInput.value = commentId;        // 设置父评论ID
-                commentFormTitle.textContent = `回复 @${username}`; // 更新标题
-                commentTextarea.placeholder = `回复 @${username}...`; // 更新占位符
-                formContainer.style.display = 'block'; // 显示回复框
-                commentTextarea.focus(); // 自动聚焦
-            }
-        });
-    });
-
     // --- 头像裁剪和预览功能 ---
     const modalElement = document.getElementById('cropImageModal');
     if (modalElement) {
@@ -292,27 +243,150 @@ document.addEventListener("DOMContentLoaded", function () {
             }
         }, 100);
     }
+
+    // --- 评论区：回复与防重复提交（评论片段异步加载后需要重新绑定） ---
+    function initCommentSection(root) {
+        root.querySelectorAll('.reply-btn').forEach(button => {
+            button.addEventListener('click', function(event) {
+                event.preventDefault();
+
+                const commentId = this.dataset.commentId;
+                const username = this.dataset.username;
+            
+                // 直接通过 ID 找到对应的回复表单容器，这是最可靠的方式
+                const formContainer = document.querySelector(`#reply-form-container-${commentId}`);
+
+                // 获取主评论表单及其所有需要操作的元素
+                const mainFormContainer = document.querySelector('#main-comment-form-container');
+                const commentForm = document.querySelector('#commentForm');
+                const parentIdInput = document.querySelector('#parentId');
+                const commentFormTitle = document.querySelector('#comment-form-title');
+
+                // 安全检查，确保所有元素都已找到
+                if (!formContainer || !mainFormContainer || !commentForm) {
+                    console.error("评论表单或其容器未找到，无法执行回复操作。");
+                    return;
+                }
+                const commentTextarea = commentForm.querySelector('textarea');
+
+                // 判断是打开还是关闭回复框
+                const isAlreadyOpen = formContainer.style.display === 'block';
+
+                // 1. 先关闭所有已打开的回复框，并将主表单归位
+                document.querySelectorAll('.reply-form-container').forEach(container => {
+                    if (container.style.display === 'block') {
+                        container.style.display = 'none';
+                        mainFormContainer.appendChild(commentForm);
+                        parentIdInput.value = '';
+                        commentFormTitle.textContent = '发表评论';
+                        commentTextarea.placeholder = '';
+                    }
+                });
+
+                // 2. 如果刚才点击的回复框是关闭的，则打开它
+                if (!isAlreadyOpen) {
+                    formContainer.appendChild(commentForm); // 将主表单移动到当前回复框
+                    parentIdInput.value = commentId;        // 设置父评论ID
+                    commentFormTitle.textContent = `回复 @${username}`; // 更新标题
+                    commentTextarea.placeholder = `回复 @${username}...`; // 更新占位符
+                    formContainer.style.display = 'block'; // 显示回复框
+                    commentTextarea.focus(); // 自动聚焦
+                }
+            });
+        });
+
+        // 1. 找到评论表单
+        const commentForm = root.querySelector('#commentForm.prevent-double-submit');
     
-    // 1. 找到评论表单
-    const commentForm = document.querySelector('#commentForm.prevent-double-submit');
-    
-    // 2. 如果表单存在，则只为它绑定一次 'submit' 事件监听器
-    if (commentForm) {
-        commentForm.addEventListener('submit', function(e) {
-            // 找到表单内的提交按钮
-            const submitButton = commentForm.querySelector('.submit-btn');
+        // 2. 如果表单存在，则只为它绑定一次 'submit' 事件监听器
+        if (commentForm) {
+            commentForm.addEventListener('submit', function(e) {
+                // 找到表单内的提交按钮
+                const submitButton = commentForm.querySelector('.submit-btn');
             
-            // 如果按钮存在且已被禁用，则阻止本次提交
-            if (submitButton && submitButton.disabled) {
-                e.preventDefault();
-                return;
-            }
+                // 如果按钮存在且已被禁用，则阻止本次提交
+                if (submitButton && submitButton.disabled) {
+                    e.preventDefault();
+                    return;
+                }
+
+                // 如果按钮存在，则禁用它并更改文本
+                if (submitButton) {
+                    submitButton.disabled = true;
+                    submitButton.textContent = '提交中...';
+                }
+            });
+        }
+    }
+
+    // --- 编辑器：上传的图片在后台压缩，轮询处理状态，完成后换成压缩后的地址 ---
+    function watchUploadedImages(editor, statusUrl) {
+        const watching = new Set();
+
+        function replaceSrc(from, to) {
+            editor.model.change(writer => {
+                for (const { item } of writer.createRangeIn(editor.model.document.getRoot())) {
+                    if (item.is('element') && item.getAttribute('src') === from) {
+                        writer.setAttribute('src', to, item);
+                    }
+                }
+            });
+        }
+
+        function poll(src, delay) {
+            setTimeout(() => {
+                fetch(`${statusUrl}?${new URLSearchParams({ url: src })}`, { credentials: 'same-origin' })
+                    .then(response => response.ok ? response.json() : Promise.reject(response.status))
+                    .then(job => {
+                        if (job.status === 'done') {
+                            replaceSrc(src, job.url);
+                        } else if (job.status !== 'failed') {
+                            poll(src, Math.min(delay * 2, 10000));
+                            return;
+                        }
+                        watching.delete(src);
+                    })
+                    .catch(() => watching.delete(src));
+            }, delay);
+        }
 
-            // 如果按钮存在，则禁用它并更改文本
-            if (submitButton) {
-                submitButton.disabled = true;
-                submitButton.textContent = '提交中...';
+        function scan() {
+            for (const { item } of editor.model.createRangeIn(editor.model.document.getRoot())) {
+                const src = item.is('element') ? item.getAttribute('src') : null;
+                if (src && src.includes('/originals/') && !watching.has(src)) {
+                    watching.add(src);
+                    poll(src, 1000);
+                }
             }
-        });
+        }
+
+        editor.model.document.on('change:data', scan);
+        scan();
+    }
+
+    document.querySelectorAll('form[data-image-status-url] textarea[id]').forEach(textarea => {
+        const statusUrl = textarea.closest('form').dataset.imageStatusUrl;
+        if (window.editors && window.editors[textarea.id]) {
+            watchUploadedImages(window.editors[textarea.id], statusUrl);
+        } else if (window.ckeditorRegisterCallback) {
+            window.ckeditorRegisterCallback(textarea.id, editor => watchUploadedImages(editor, statusUrl));
+        }
+    });
+
+    const commentsPlaceholder = document.getElementById('comments-placeholder');
+    if (commentsPlaceholder) {
+        // 预渲染的静态页面：加载评论片段（同时记录一次浏览）
+        const page = new URLSearchParams(window.location.search).get('page');
+        const params = new URLSearchParams({ record_view: '1' });
+        if (page) params.set('page', page);
+        fetch(`${commentsPlaceholder.dataset.fragmentUrl}?${params}`, { credentials: 'same-origin' })
+            .then(response => response.ok ? response.text() : Promise.reject(response.status))
+            .then(html => {
+                commentsPlaceholder.innerHTML = html;
+                initCommentSection(commentsPlaceholder);
+            })
+            .catch(error => console.error('评论加载失败：', error));
+    } else {
+        initCommentSection(document);
     }
 });
\ No newline at end of file